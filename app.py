@@ -1,56 +1,91 @@
 import os
+import hmac
 import json
-import sqlite3
 import requests
 import time
-import re
-from urllib.parse import parse_qs
-from contextlib import contextmanager
 from flask import Flask, request, abort
-from linebot.v3 import WebhookHandler
 from linebot.v3.exceptions import InvalidSignatureError
 from linebot.v3.messaging import (
-    Configuration, ApiClient, MessagingApi,
-    ReplyMessageRequest, TextMessage, ImageMessage, PostbackAction,
+    ApiException, ReplyMessageRequest, TextMessage, PostbackAction,
     TemplateMessage, ButtonsTemplate, CarouselTemplate, CarouselColumn,
     QuickReply, QuickReplyItem
 )
 from linebot.v3.webhooks import MessageEvent, TextMessageContent, PostbackEvent, FollowEvent
+from models.book_content import BookContentManager, BookContentError
+from utils.db_pool import SQLitePool
+from utils.attempt_archive import AttemptArchive, default_archive_dir
+from init_db import (
+    ensure_summary_tables, ensure_job_table, ensure_push_tables, ensure_archive_tables, USERS_REMINDER_INDEX,
+    MAINTENANCE_RULES
+)
+from utils.render_cache import build_reply_body, build_quiz_messages
+from models.search_index import snippet
+from models.review_schedule import record_answer, due_items, due_count, next_due_at, remove_items
+from utils.line_client import LineClient
+from utils.webhook_dispatch import DispatchingWebhookHandler, event_user_key
+from utils.event_queue import EventQueue, QueueFullError
+from utils.dedup import create_deduplicator, ActionCounter
+from utils.idempotency import EventIdempotencyGuard
+from utils.write_behind import UserWriteBuffer
+from utils.command_router import build_default_router
+from utils.postback_codec import encode_postback, decode_postback
+from utils.metrics import MetricsRegistry, mark_error
+from utils.job_queue import JobQueue, PermanentJobError
+from utils.maintenance import MaintenanceScheduler
+from contextlib import contextmanager
 import threading
+import atexit
 from datetime import datetime, timedelta
 
 app = Flask(__name__)
-DATABASE_NAME = 'linebot.db'
-CONNECTION_POOL_SIZE = 10
-connection_pool = []
-pool_lock = threading.Lock()
+
+# 在 fork 前建立，所有 worker 的數據累加在同一塊共享記憶體
+METRICS_MAX_SERIES = int(os.environ.get('METRICS_MAX_SERIES', '256'))
+
+metrics = MetricsRegistry(max_series=METRICS_MAX_SERIES)
+handler_latency = metrics.histogram(
+    'linebot_handler_duration_seconds', '事件處理函式執行時間', ['handler'])
+db_latency = metrics.histogram(
+    'linebot_db_duration_seconds', '資料庫連線區塊執行時間 (含等待連線)', ['mode'])
+line_api_latency = metrics.histogram(
+    'linebot_line_api_duration_seconds', 'LINE Messaging API 呼叫時間', ['method', 'endpoint'])
+job_latency = metrics.histogram(
+    'linebot_job_duration_seconds', '背景工作執行時間', ['kind'])
+
+def instrumented(func):
+    return handler_latency.timed(handler=func.__name__)(func)
+
+def report_error(where, e):
+    # 處理函式自行捕捉的例外也計入錯誤次數
+    print(f"{where} error: {e}")
+    mark_error()
+
+# 由 gunicorn.conf.py 依 WORKER_PROFILE 設定；直接執行 app.py 時為單執行緒
+WORKER_CLASS = os.environ.get('WORKER_CLASS', 'sync')
+WORKER_CONCURRENCY = int(os.environ.get('WORKER_CONCURRENCY', '1'))
+
+DATABASE_NAME = os.environ.get('DATABASE_NAME', 'linebot.db')
+DB_WRITE_POOL_SIZE = int(os.environ.get('DB_WRITE_POOL_SIZE', '4'))
+DB_READ_POOL_SIZE = int(os.environ.get('DB_READ_POOL_SIZE', '8'))
+DB_COOPERATIVE = os.environ.get('DB_COOPERATIVE', '1' if WORKER_CLASS == 'gevent' else '0') == '1'
+
+# 超過 ATTEMPT_HOT_DAYS 天的作答紀錄由 `python init_db.py archive` 依月份搬到封存目錄
+ATTEMPT_ARCHIVE_DIR = os.environ.get('ATTEMPT_ARCHIVE_DIR') or default_archive_dir(DATABASE_NAME)
+ATTEMPT_HOT_DAYS = int(os.environ.get('ATTEMPT_HOT_DAYS', '90'))
+attempt_archive = AttemptArchive(ATTEMPT_ARCHIVE_DIR, ATTEMPT_HOT_DAYS)
+
+db_pool = SQLitePool(
+    DATABASE_NAME,
+    write_size=DB_WRITE_POOL_SIZE,
+    read_size=DB_READ_POOL_SIZE,
+    cooperative=DB_COOPERATIVE
+)
 
 @contextmanager
-def get_db_connection():
-    conn = None
-    try:
-        with pool_lock:
-            if connection_pool:
-                conn = connection_pool.pop()
-            else:
-                conn = sqlite3.connect(DATABASE_NAME, timeout=20.0)
-                conn.row_factory = sqlite3.Row
-        yield conn
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        raise e
-    finally:
-        if conn:
-            try:
-                conn.commit()
-                with pool_lock:
-                    if len(connection_pool) < CONNECTION_POOL_SIZE:
-                        connection_pool.append(conn)
-                    else:
-                        conn.close()
-            except:
-                conn.close()
+def get_db_connection(readonly=False):
+    with db_latency.time(mode='read' if readonly else 'write'):
+        with db_pool.connection(readonly=readonly) as conn:
+            yield conn
 
 def init_database():
     with get_db_connection() as conn:
@@ -95,62 +130,72 @@ def init_database():
                 timestamp REAL NOT NULL
             )
         ''')
+        ensure_archive_tables(conn)
+        ensure_summary_tables(conn, attempt_archive)
+        ensure_job_table(conn)
+        ensure_push_tables(conn)
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_actions_user_id ON user_actions(line_user_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_actions_timestamp ON user_actions(timestamp)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_bookmarks_user_id ON bookmarks(line_user_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_quiz_attempts_user_id ON quiz_attempts(line_user_id)')
+        cursor.execute(USERS_REMINDER_INDEX)
 
-def cleanup_old_actions():
-    current_time = time.time()
-    cutoff_time = current_time - 3600
-    try:
-        with get_db_connection() as conn:
-            conn.execute("DELETE FROM user_actions WHERE timestamp < ?", (cutoff_time,))
-    except Exception as e:
-        print(f"Cleanup error: {e}")
+def get_user_stats(conn, user_id):
+    stats = conn.execute(
+        "SELECT bookmark_count, attempt_count, correct_count FROM user_stats WHERE line_user_id = ?",
+        (user_id,)
+    ).fetchone()
+    if stats is None:
+        return {'bookmark_count': 0, 'attempt_count': 0, 'correct_count': 0}
+    return stats
 
-def is_duplicate_action(user_id, action_data, cooldown=2):
-    current_time = time.time()
-    try:
-        with get_db_connection() as conn:
-            conn.execute("DELETE FROM user_actions WHERE timestamp < ?", (current_time - cooldown * 2,))
-            recent_action = conn.execute(
-                "SELECT timestamp FROM user_actions WHERE line_user_id = ? AND action_data = ? AND timestamp > ?",
-                (user_id, action_data, current_time - cooldown)
-            ).fetchone()
-            if recent_action:
-                return True
-            conn.execute(
-                "INSERT INTO user_actions (line_user_id, action_data, timestamp) VALUES (?, ?, ?)",
-                (user_id, action_data, current_time)
-            )
-            return False
-    except Exception as e:
-        print(f"Duplicate check error: {e}")
-        return False
+MAINTENANCE_INTERVAL = float(os.environ.get('MAINTENANCE_INTERVAL', '300'))
+MAINTENANCE_BATCH_SIZE = int(os.environ.get('MAINTENANCE_BATCH_SIZE', '500'))
+MAINTENANCE_MAX_LOCK_MS = float(os.environ.get('MAINTENANCE_MAX_LOCK_MS', '50'))
+MAINTENANCE_VACUUM_PAGES = int(os.environ.get('MAINTENANCE_VACUUM_PAGES', '200'))
+MAINTENANCE_QUIET_SECONDS = float(os.environ.get('MAINTENANCE_QUIET_SECONDS', '30'))
+
+# 過期資料由背景執行緒分批刪除，空頁在沒有 webhook 事件時才歸還
+maintenance = MaintenanceScheduler(
+    get_db_connection,
+    MAINTENANCE_RULES,
+    interval=MAINTENANCE_INTERVAL,
+    batch_size=MAINTENANCE_BATCH_SIZE,
+    max_lock_ms=MAINTENANCE_MAX_LOCK_MS,
+    vacuum_pages=MAINTENANCE_VACUUM_PAGES,
+    quiet_after=MAINTENANCE_QUIET_SECONDS
+)
+
+# memory: 每個 worker 各自記錄；shared: 在 fork 前建立共享記憶體，所有 worker 共用
+DEDUP_BACKEND = os.environ.get('DEDUP_BACKEND', 'memory').lower()
+DEDUP_COOLDOWN = float(os.environ.get('DEDUP_COOLDOWN', '2'))
+DEDUP_MAX_ENTRIES = int(os.environ.get('DEDUP_MAX_ENTRIES', '10000'))
+
+action_deduplicator = create_deduplicator(DEDUP_BACKEND, DEDUP_COOLDOWN, DEDUP_MAX_ENTRIES)
+action_counter = ActionCounter()
+
+def is_duplicate_action(user_id, action_data):
+    action_counter.record(user_id)
+    return action_deduplicator.is_duplicate(user_id, action_data)
+
+WRITE_BEHIND_INTERVAL = float(os.environ.get('WRITE_BEHIND_INTERVAL', '1'))
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', '100'))
+
+# last_active 先合併在記憶體中，定時以單一交易寫入；閱讀位置直接寫入
+user_write_buffer = UserWriteBuffer(
+    get_db_connection,
+    interval=WRITE_BEHIND_INTERVAL,
+    batch_size=WRITE_BEHIND_BATCH_SIZE
+)
+atexit.register(user_write_buffer.flush)
 
 def update_user_activity(user_id):
-    try:
-        with get_db_connection() as conn:
-            conn.execute(
-                "UPDATE users SET last_active = CURRENT_TIMESTAMP WHERE line_user_id = ?",
-                (user_id,)
-            )
-    except:
-        pass
+    user_write_buffer.touch(user_id)
 
 def check_new_user_guidance(user_id):
-    try:
-        with get_db_connection() as conn:
-            action_count = conn.execute(
-                "SELECT COUNT(*) FROM user_actions WHERE line_user_id = ?", 
-                (user_id,)
-            ).fetchone()[0]
-        if action_count < 5:
-            return "\n\n🌟 小提示：輸入「1」快速開始第一章，「幫助」查看所有指令"
-        return ""
-    except:
-        return ""
+    if action_counter.count(user_id) < 5:
+        return "\n\n🌟 小提示：輸入「1」快速開始第一章，「幫助」查看所有指令"
+    return ""
 
 CHANNEL_SECRET = os.environ.get('CHANNEL_SECRET')
 CHANNEL_ACCESS_TOKEN = os.environ.get('CHANNEL_ACCESS_TOKEN')
@@ -161,38 +206,112 @@ if not all(required_env_vars):
     print("Missing required environment variables")
     exit(1)
 
-configuration = Configuration(access_token=CHANNEL_ACCESS_TOKEN)
-handler = WebhookHandler(CHANNEL_SECRET)
+LINE_API_HOST = os.environ.get('LINE_API_HOST', 'https://api.line.me')
+# 連線池小於同時處理的請求數時，多出的連線用完即關閉，每次都要重新建立 TLS 連線
+LINE_POOL_SIZE = int(os.environ.get('LINE_POOL_SIZE', str(max(10, WORKER_CONCURRENCY))))
+LINE_CONNECT_TIMEOUT = float(os.environ.get('LINE_CONNECT_TIMEOUT', '3'))
+LINE_READ_TIMEOUT = float(os.environ.get('LINE_READ_TIMEOUT', '10'))
 
-def load_book_data():
-    try:
-        with open('book.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return data
-    except Exception as e:
-        print(f"Load book.json failed: {e}")
-        return {"chapters": []}
+line_client = LineClient(
+    CHANNEL_ACCESS_TOKEN,
+    host=LINE_API_HOST,
+    pool_size=LINE_POOL_SIZE,
+    connect_timeout=LINE_CONNECT_TIMEOUT,
+    read_timeout=LINE_READ_TIMEOUT,
+    latency=line_api_latency
+)
+IDEMPOTENCY_CAPACITY = int(os.environ.get('IDEMPOTENCY_CAPACITY', '100000'))
+
+event_guard = EventIdempotencyGuard(capacity=IDEMPOTENCY_CAPACITY)
+handler = DispatchingWebhookHandler(CHANNEL_SECRET, idempotency_guard=event_guard)
 
-book_data = load_book_data()
+# sync: 在請求中處理事件；async: 驗證簽章後放入佇列並立即回應
+WEBHOOK_MODE = os.environ.get('WEBHOOK_MODE', 'sync').lower()
+EVENT_QUEUE_WORKERS = int(os.environ.get('EVENT_QUEUE_WORKERS', '4'))
+EVENT_QUEUE_SIZE = int(os.environ.get('EVENT_QUEUE_SIZE', '1000'))
+
+event_queue = EventQueue(
+    handler.dispatch,
+    event_user_key,
+    workers=EVENT_QUEUE_WORKERS,
+    maxsize=EVENT_QUEUE_SIZE
+)
+
+BOOK_PATH = os.environ.get('BOOK_PATH', 'book.json')
+BOOK_WATCH_INTERVAL = float(os.environ.get('BOOK_WATCH_INTERVAL', '5'))
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+SEARCH_RESULT_LIMIT = int(os.environ.get('SEARCH_RESULT_LIMIT', '5'))
+
+book_content = BookContentManager(BOOK_PATH, watch_interval=BOOK_WATCH_INTERVAL)
+book_content.load()
+command_router = build_default_router()
 init_database()
 
-def switch_rich_menu(user_id, rich_menu_id):
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', '5'))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '5'))
+JOB_CONCURRENCY = int(os.environ.get('JOB_CONCURRENCY', '4'))
+# LINE 批次連結圖文選單一次最多 500 位使用者
+RICH_MENU_LINK_BATCH_SIZE = min(500, int(os.environ.get('RICH_MENU_LINK_BATCH_SIZE', '500')))
+
+# 加入好友後的個人資料與圖文選單連結在背景執行，不延遲歡迎訊息
+job_queue = JobQueue(
+    get_db_connection,
+    poll_interval=JOB_POLL_INTERVAL,
+    max_attempts=JOB_MAX_ATTEMPTS,
+    concurrency=JOB_CONCURRENCY,
+    latency=job_latency
+)
+
+def line_job_error(e):
+    # 4xx (429 除外) 重試也不會成功
+    if e.status and 400 <= e.status < 500 and e.status != 429:
+        return PermanentJobError(f"LINE API {e.status} {e.reason}")
+    return e
+
+def fetch_profile_job(user_id):
     try:
-        headers = {'Authorization': f'Bearer {CHANNEL_ACCESS_TOKEN}'}
-        url = f'https://api.line.me/v2/bot/user/{user_id}/richmenu/{rich_menu_id}'
-        response = requests.post(url, headers=headers, timeout=10)
-        return response.status_code == 200
-    except Exception as e:
-        print(f"Rich menu switch error: {e}")
-        return False
+        profile = line_client.api.get_profile(user_id)
+    except ApiException as e:
+        raise line_job_error(e)
+    with get_db_connection() as conn:
+        conn.execute(
+            "UPDATE users SET display_name = ? WHERE line_user_id = ?",
+            (profile.display_name, user_id)
+        )
+
+def link_rich_menu_job(user_ids):
+    body = json.dumps({
+        "richMenuId": MAIN_RICH_MENU_ID,
+        "userIds": list(dict.fromkeys(user_ids)),
+    }).encode('utf-8')
+    try:
+        line_client.post('/v2/bot/richmenu/bulk/link', body)
+    except ApiException as e:
+        raise line_job_error(e)
+
+job_queue.register('fetch_profile', fetch_profile_job)
+job_queue.register('link_rich_menu', link_rich_menu_job, batch_size=RICH_MENU_LINK_BATCH_SIZE)
+
+def reply_rendered(reply_token, payload):
+    line_client.post('/v2/bot/message/reply', build_reply_body(reply_token, payload))
+
 @app.route("/callback", methods=['POST'])
 def callback():
+    maintenance.touch()
     signature = request.headers['X-Line-Signature']
     body = request.get_data(as_text=True)
     try:
-        handler.handle(body, signature)
+        if WEBHOOK_MODE == 'async':
+            payload = handler.parse(body, signature)
+            event_queue.submit(payload.events, payload.destination)
+        else:
+            handler.handle(body, signature)
     except InvalidSignatureError:
         abort(400)
+    except QueueFullError:
+        # 佇列已滿時回應 503，讓 LINE 平台稍後重新傳送
+        print("Callback rejected: event queue is full")
+        abort(503)
     except Exception as e:
         print(f"Callback error: {e}")
         abort(500)
@@ -200,8 +319,33 @@ def callback():
 
 @app.route("/health", methods=['GET'])
 def health_check():
-    cleanup_old_actions()
-    return {"status": "healthy", "chapters": len(book_data.get('chapters', []))}
+    content = book_content.stats()
+    status = {"status": "healthy", "chapters": content["chapters"]}
+    status["content"] = content
+    status["idempotency"] = event_guard.stats()
+    status["write_buffer"] = user_write_buffer.stats()
+    status["db_pool"] = db_pool.stats()
+    status["jobs"] = job_queue.stats()
+    status["maintenance"] = maintenance.stats()
+    if WEBHOOK_MODE == 'async':
+        status["event_queue"] = event_queue.stats()
+    return status
+
+@app.route("/metrics", methods=['GET'])
+def metrics_endpoint():
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@app.route("/admin/reload-book", methods=['POST'])
+def reload_book():
+    # 未設定 ADMIN_TOKEN 時不開放
+    token = request.headers.get('X-Admin-Token', '')
+    if not ADMIN_TOKEN or not hmac.compare_digest(token, ADMIN_TOKEN):
+        abort(404)
+    try:
+        changed = book_content.request_reload()
+    except BookContentError as e:
+        return {"reloaded": False, "error": str(e), "content": book_content.stats()}, 422
+    return {"reloaded": changed, "content": book_content.stats()}
 
 @app.route("/", methods=['GET'])
 def index():
@@ -212,61 +356,22 @@ def ping():
     return "pong"
 
 @handler.add(MessageEvent, message=TextMessageContent)
+@instrumented
 def handle_message(event):
     text = event.message.text.strip()
     user_id = event.source.user_id
-    line_api = MessagingApi(ApiClient(configuration))
+    line_api = line_client.api
     update_user_activity(user_id)
     
     try:
-        normalized_text = text.replace(' ', '').lower()
-        
-        if any(keyword in normalized_text for keyword in ['閱讀內容', '開始閱讀', '閱讀', 'read', 'start']):
-            handle_start_reading(user_id, event.reply_token, line_api)
-        elif any(keyword in normalized_text for keyword in ['章節選擇', '選擇章節', 'chapter', 'chapters']):
-            handle_show_chapter_carousel(user_id, event.reply_token, line_api)
-        elif any(keyword in normalized_text for keyword in ['我的書籤', '書籤', 'bookmark', 'bookmarks']):
-            handle_bookmarks(user_id, event.reply_token, line_api)
-        elif any(keyword in normalized_text for keyword in ['上次進度', '繼續閱讀', '進度', 'continue', 'resume']):
-            handle_resume_reading(user_id, event.reply_token, line_api)
-        elif any(keyword in normalized_text for keyword in ['本章測驗', '測驗題', '測驗', 'quiz', 'test']):
-            handle_chapter_quiz(user_id, event.reply_token, line_api)
-        elif any(keyword in normalized_text for keyword in ['錯誤分析', '分析', 'analytics', 'analysis']):
-            handle_error_analytics(user_id, event.reply_token, line_api)
-        elif text.isdigit() and 1 <= int(text) <= 7:
-            chapter_number = int(text)
-            handle_direct_chapter_selection(user_id, chapter_number, event.reply_token, line_api)
-        elif text.lower() in ['n', 'next', '下', '下一段', '下一']:
-            handle_quick_navigation(user_id, 'next', event.reply_token, line_api)
-        elif text.lower() in ['b', 'back', 'prev', '上', '上一段', '上一']:
-            handle_quick_navigation(user_id, 'prev', event.reply_token, line_api)
-        elif text.startswith('第') and text.endswith('章') and len(text) == 3:
-            try:
-                chapter_num = int(text[1])
-                if 1 <= chapter_num <= 7:
-                    handle_direct_chapter_selection(user_id, chapter_num, event.reply_token, line_api)
-                else:
-                    raise ValueError("章節號碼超出範圍")
-            except:
-                handle_unknown_command(user_id, event.reply_token, line_api, text)
-        elif '跳到' in normalized_text or '跳轉' in normalized_text:
-            match = re.search(r'第?(\d+)章.*?第?(\d+)段', text)
-            if match:
-                ch, sec = int(match.group(1)), int(match.group(2))
-                handle_navigation(user_id, ch, sec, event.reply_token, line_api)
-            else:
-                handle_unknown_command(user_id, event.reply_token, line_api, text)
-        elif any(keyword in normalized_text for keyword in ['學習進度', '我的進度', 'progress']):
-            handle_progress_inquiry(user_id, event.reply_token, line_api)
-        elif any(keyword in normalized_text for keyword in ['狀態', '資訊', 'status', 'info']):
-            handle_status_inquiry(user_id, event.reply_token, line_api)
-        elif any(keyword in normalized_text for keyword in ['幫助', '說明', '指令', 'help', 'command']):
-            handle_help_message(user_id, event.reply_token, line_api)
-        else:
+        route = command_router.route(text)
+        if route is None:
             handle_unknown_command(user_id, event.reply_token, line_api, text)
+        else:
+            COMMAND_HANDLERS[route.command](user_id, *route.args, event.reply_token, line_api)
             
     except Exception as e:
-        print(f"Handle message error: {e}")
+        report_error("Handle message", e)
         try:
             line_api.reply_message(
                 ReplyMessageRequest(
@@ -277,6 +382,7 @@ def handle_message(event):
         except:
             pass
 
+@instrumented
 def handle_help_message(user_id, reply_token, line_api):
     help_text = """📖 指令說明：
 
@@ -287,6 +393,8 @@ def handle_help_message(user_id, reply_token, line_api):
 • 上次進度 / 繼續閱讀 → 跳到上次位置
 • 本章測驗 → 練習當前章節測驗
 • 錯誤分析 → 查看答錯統計
+• 複習 → 依記憶曲線複習答過的測驗題
+• 搜尋 關鍵字 → 搜尋文法內容 (例：搜尋 according to)
 
 🔢 **數字快捷**
 • 直接輸入 1-7 → 快速跳到該章節
@@ -314,25 +422,22 @@ def handle_help_message(user_id, reply_token, line_api):
         )
     )
 
+@instrumented
 def handle_status_inquiry(user_id, reply_token, line_api):
     try:
-        with get_db_connection() as conn:
+        with get_db_connection(readonly=True) as conn:
             user = conn.execute(
-                "SELECT current_chapter_id, current_section_id, display_name FROM users WHERE line_user_id = ?",
+                """SELECT u.current_chapter_id, u.current_section_id, u.display_name,
+                          COALESCE(s.bookmark_count, 0) AS bookmark_count,
+                          COALESCE(s.attempt_count, 0) AS attempt_count
+                   FROM users u LEFT JOIN user_stats s ON s.line_user_id = u.line_user_id
+                   WHERE u.line_user_id = ?""",
                 (user_id,)
             ).fetchone()
-            
-            bookmark_count = conn.execute(
-                "SELECT COUNT(*) FROM bookmarks WHERE line_user_id = ?",
-                (user_id,)
-            ).fetchone()[0]
-            
-            quiz_count = conn.execute(
-                "SELECT COUNT(*) FROM quiz_attempts WHERE line_user_id = ?",
-                (user_id,)
-            ).fetchone()[0]
         
         if user:
+            bookmark_count = user['bookmark_count']
+            quiz_count = user['attempt_count']
             status_text = f"👤 {user['display_name'] or '學習者'}\n\n"
             if user['current_chapter_id']:
                 status_text += f"📍 目前位置：第 {user['current_chapter_id']} 章第 {user['current_section_id'] or 1} 段\n"
@@ -351,13 +456,14 @@ def handle_status_inquiry(user_id, reply_token, line_api):
             )
         )
     except Exception as e:
-        print(f"Status inquiry error: {e}")
+        report_error("Status inquiry", e)
         line_api.reply_message(
             ReplyMessageRequest(
                 reply_token=reply_token,
                 messages=[TextMessage(text="狀態查詢失敗，請稍後再試")]
             )
         )
+@instrumented
 def handle_unknown_command(user_id, reply_token, line_api, original_text):
     suggestions = [
         "📚 閱讀內容 - 開始學習",
@@ -366,6 +472,7 @@ def handle_unknown_command(user_id, reply_token, line_api, original_text):
         "⏯️ 上次進度 - 繼續學習",
         "📝 本章測驗 - 練習測驗",
         "📊 錯誤分析 - 學習分析",
+        "🔁 複習 - 複習到期的題目",
         "💡 幫助 - 查看說明"
     ]
     suggestion_text = "請嘗試以下指令：\n\n" + "\n".join(suggestions)
@@ -379,9 +486,11 @@ def handle_unknown_command(user_id, reply_token, line_api, original_text):
         )
     )
 
+@instrumented
 def handle_quick_navigation(user_id, direction, reply_token, line_api):
+    book_index = book_content.current.index
     try:
-        with get_db_connection() as conn:
+        with get_db_connection(readonly=True) as conn:
             user = conn.execute(
                 "SELECT current_chapter_id, current_section_id FROM users WHERE line_user_id = ?", 
                 (user_id,)
@@ -399,7 +508,7 @@ def handle_quick_navigation(user_id, direction, reply_token, line_api):
         current_chapter = user['current_chapter_id']
         current_section = user['current_section_id'] or 0
         
-        chapter = next((c for c in book_data['chapters'] if c['chapter_id'] == current_chapter), None)
+        chapter = book_index.get_chapter(current_chapter)
         if not chapter:
             line_api.reply_message(
                 ReplyMessageRequest(
@@ -409,23 +518,10 @@ def handle_quick_navigation(user_id, direction, reply_token, line_api):
             )
             return
         
-        has_image = bool(chapter.get('image_url'))
-        content_sections = sorted([s for s in chapter['sections'] if s['type'] == 'content'], 
-                                key=lambda x: x['section_id'])
+        target_section = chapter.neighbor(current_section, direction)
         
-        all_sections = []
-        if has_image:
-            all_sections.append(0)
-        all_sections.extend([s['section_id'] for s in content_sections])
-        
-        try:
-            current_index = all_sections.index(current_section)
-        except ValueError:
-            current_index = 0
-            
         if direction == 'next':
-            target_index = current_index + 1
-            if target_index >= len(all_sections):
+            if target_section is None:
                 line_api.reply_message(
                     ReplyMessageRequest(
                         reply_token=reply_token,
@@ -434,8 +530,7 @@ def handle_quick_navigation(user_id, direction, reply_token, line_api):
                 )
                 return
         else:
-            target_index = current_index - 1
-            if target_index < 0:
+            if target_section is None:
                 line_api.reply_message(
                     ReplyMessageRequest(
                         reply_token=reply_token,
@@ -444,11 +539,10 @@ def handle_quick_navigation(user_id, direction, reply_token, line_api):
                 )
                 return
         
-        target_section = all_sections[target_index]
         handle_navigation(user_id, current_chapter, target_section, reply_token, line_api)
         
     except Exception as e:
-        print(f"Quick navigation error: {e}")
+        report_error("Quick navigation", e)
         line_api.reply_message(
             ReplyMessageRequest(
                 reply_token=reply_token,
@@ -457,26 +551,12 @@ def handle_quick_navigation(user_id, direction, reply_token, line_api):
         )
 
 @handler.add(FollowEvent)
+@instrumented
 def handle_follow(event):
     user_id = event.source.user_id
-    line_api = MessagingApi(ApiClient(configuration))
+    line_api = line_client.api
     
-    try:
-        try:
-            profile = line_api.get_profile(user_id)
-            display_name = profile.display_name
-        except:
-            display_name = f"User_{user_id[-6:]}"
-        
-        with get_db_connection() as conn:
-            conn.execute(
-                "INSERT OR IGNORE INTO users (line_user_id, display_name) VALUES (?, ?)", 
-                (user_id, display_name)
-            )
-        
-        switch_rich_menu(user_id, MAIN_RICH_MENU_ID)
-        
-        welcome_text = """歡迎使用五分鐘英文文法攻略！
+    welcome_text = """歡迎使用五分鐘英文文法攻略！
 
 📱 **手機用戶**：使用下方圖文選單操作
 💻 **電腦用戶**：可直接輸入指令
@@ -492,63 +572,49 @@ def handle_follow(event):
 • 上次進度：繼續上次學習
 • 本章測驗：練習測驗題目
 • 錯誤分析：檢視學習狀況"""
-        
+    
+    # 先回覆歡迎訊息，個人資料與圖文選單由背景工作處理
+    try:
         line_api.reply_message(
             ReplyMessageRequest(
                 reply_token=event.reply_token,
                 messages=[TextMessage(text=welcome_text)]
             )
         )
+    except Exception as e:
+        report_error("Follow reply", e)
+    
+    try:
+        with get_db_connection() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO users (line_user_id, display_name) VALUES (?, ?)", 
+                (user_id, f"User_{user_id[-6:]}")
+            )
+            job_queue.enqueue('fetch_profile', user_id, conn=conn)
+            job_queue.enqueue('link_rich_menu', user_id, conn=conn)
         
     except Exception as e:
-        print(f"Follow event error: {e}")
+        report_error("Follow event", e)
 
 @handler.add(PostbackEvent)
+@instrumented
 def handle_postback(event):
     data = event.postback.data
     reply_token = event.reply_token
     user_id = event.source.user_id
-    line_api = MessagingApi(ApiClient(configuration))
+    line_api = line_client.api
     update_user_activity(user_id)
     
     if is_duplicate_action(user_id, data):
         return
     
     try:
-        if data.isdigit():
-            chapter_number = int(data)
-            handle_direct_chapter_selection(user_id, chapter_number, reply_token, line_api)
-            return
-        
-        params = parse_qs(data)
-        action = params.get('action', [None])[0]
-        
-        if action == 'read_content':
-            handle_start_reading(user_id, reply_token, line_api)
-        elif action == 'show_chapter_menu':
-            handle_show_chapter_carousel(user_id, reply_token, line_api)
-        elif action == 'view_bookmarks':
-            handle_bookmarks(user_id, reply_token, line_api)
-        elif action == 'continue_reading':
-            handle_resume_reading(user_id, reply_token, line_api)
-        elif action == 'chapter_quiz':
-            handle_chapter_quiz(user_id, reply_token, line_api)
-        elif action == 'view_analytics':
-            handle_error_analytics(user_id, reply_token, line_api)
-        elif action == 'navigate':
-            chapter_id = int(params.get('chapter_id', [1])[0])
-            section_id = int(params.get('section_id', [1])[0])
-            handle_navigation(user_id, chapter_id, section_id, reply_token, line_api)
-        elif action == 'add_bookmark':
-            handle_add_bookmark(params, user_id, reply_token, line_api)
-        elif action == 'submit_answer':
-            handle_answer(params, user_id, reply_token, line_api)
-        elif action == 'select_chapter':
-            chapter_id = int(params.get('chapter_id', [1])[0])
-            handle_direct_chapter_selection(user_id, chapter_id, reply_token, line_api)
+        postback = decode_postback(data)
+        if postback is not None:
+            POSTBACK_HANDLERS[postback.action](user_id, *postback.args, reply_token, line_api)
             
     except Exception as e:
-        print(f"Postback error: {e}")
+        report_error("Postback", e)
         try:
             line_api.reply_message(
                 ReplyMessageRequest(
@@ -559,9 +625,11 @@ def handle_postback(event):
         except:
             pass
 
+@instrumented
 def handle_start_reading(user_id, reply_token, line_api):
+    book_index = book_content.current.index
     try:
-        chapter = next((ch for ch in book_data['chapters'] if ch['chapter_id'] == 1), None)
+        chapter = book_index.get_chapter(1)
         if not chapter:
             line_api.reply_message(
                 ReplyMessageRequest(
@@ -571,43 +639,35 @@ def handle_start_reading(user_id, reply_token, line_api):
             )
             return
         
-        if chapter.get('image_url'):
-            start_section_id = 0
-        else:
-            content_sections = [s for s in chapter['sections'] if s['type'] == 'content']
-            start_section_id = content_sections[0]['section_id'] if content_sections else 1
-        
-        with get_db_connection() as conn:
-            conn.execute(
-                "UPDATE users SET current_chapter_id = 1, current_section_id = ? WHERE line_user_id = ?", 
-                (start_section_id, user_id)
-            )
+        start_section_id = chapter.start_section_id
         
         handle_navigation(user_id, 1, start_section_id, reply_token, line_api)
         
     except Exception as e:
-        print(f"Start reading error: {e}")
+        report_error("Start reading", e)
         line_api.reply_message(
             ReplyMessageRequest(
                 reply_token=reply_token,
                 messages=[TextMessage(text="開始閱讀失敗，請稍後再試")]
             )
         )
+@instrumented
 def handle_show_chapter_carousel(user_id, reply_token, line_api):
+    book_index = book_content.current.index
     try:
         columns = []
         
-        for chapter in book_data['chapters']:
-            chapter_id = chapter['chapter_id']
-            title = chapter['title']
+        for chapter in book_index.chapter_list:
+            chapter_id = chapter.chapter_id
+            title = chapter.title
             
             if len(title) > 35:
                 title = title[:32] + "..."
             
-            content_count = len([s for s in chapter['sections'] if s['type'] == 'content'])
-            quiz_count = len([s for s in chapter['sections'] if s['type'] == 'quiz'])
+            content_count = len(chapter.content_ids)
+            quiz_count = len(chapter.quiz_ids)
             
-            thumbnail_url = chapter.get('image_url', 'https://via.placeholder.com/400x200/4A90E2/FFFFFF?text=Chapter+' + str(chapter_id))
+            thumbnail_url = chapter.chapter.get('image_url', 'https://via.placeholder.com/400x200/4A90E2/FFFFFF?text=Chapter+' + str(chapter_id))
             
             columns.append(
                 CarouselColumn(
@@ -617,7 +677,7 @@ def handle_show_chapter_carousel(user_id, reply_token, line_api):
                     actions=[
                         PostbackAction(
                             label=f"選擇第{chapter_id}章",
-                            data=f"action=select_chapter&chapter_id={chapter_id}"
+                            data=encode_postback('select_chapter', chapter_id)
                         )
                     ]
                 )
@@ -633,7 +693,7 @@ def handle_show_chapter_carousel(user_id, reply_token, line_api):
         )
         
     except Exception as e:
-        print(f"Chapter carousel error: {e}")
+        report_error("Chapter carousel", e)
         line_api.reply_message(
             ReplyMessageRequest(
                 reply_token=reply_token,
@@ -641,9 +701,11 @@ def handle_show_chapter_carousel(user_id, reply_token, line_api):
             )
         )
 
+@instrumented
 def handle_direct_chapter_selection(user_id, chapter_number, reply_token, line_api):
+    book_index = book_content.current.index
     try:
-        chapter = next((ch for ch in book_data['chapters'] if ch['chapter_id'] == chapter_number), None)
+        chapter = book_index.get_chapter(chapter_number)
         
         if not chapter:
             line_api.reply_message(
@@ -654,22 +716,12 @@ def handle_direct_chapter_selection(user_id, chapter_number, reply_token, line_a
             )
             return
         
-        if chapter.get('image_url'):
-            start_section_id = 0
-        else:
-            content_sections = [s for s in chapter['sections'] if s['type'] == 'content']
-            start_section_id = content_sections[0]['section_id'] if content_sections else 1
-        
-        with get_db_connection() as conn:
-            conn.execute(
-                "UPDATE users SET current_chapter_id = ?, current_section_id = ? WHERE line_user_id = ?", 
-                (chapter_number, start_section_id, user_id)
-            )
+        start_section_id = chapter.start_section_id
         
         handle_navigation(user_id, chapter_number, start_section_id, reply_token, line_api)
         
     except Exception as e:
-        print(f"Chapter selection error: {e}")
+        report_error("Chapter selection", e)
         line_api.reply_message(
             ReplyMessageRequest(
                 reply_token=reply_token,
@@ -677,9 +729,10 @@ def handle_direct_chapter_selection(user_id, chapter_number, reply_token, line_a
             )
         )
 
+@instrumented
 def handle_resume_reading(user_id, reply_token, line_api):
     try:
-        with get_db_connection() as conn:
+        with get_db_connection(readonly=True) as conn:
             user = conn.execute(
                 "SELECT current_chapter_id, current_section_id FROM users WHERE line_user_id = ?", 
                 (user_id,)
@@ -697,11 +750,13 @@ def handle_resume_reading(user_id, reply_token, line_api):
                 )
             )
     except Exception as e:
-        print(f"Resume reading error: {e}")
+        report_error("Resume reading", e)
 
+@instrumented
 def handle_chapter_quiz(user_id, reply_token, line_api):
+    book_index = book_content.current.index
     try:
-        with get_db_connection() as conn:
+        with get_db_connection(readonly=True) as conn:
             user = conn.execute(
                 "SELECT current_chapter_id FROM users WHERE line_user_id = ?", 
                 (user_id,)
@@ -717,12 +772,11 @@ def handle_chapter_quiz(user_id, reply_token, line_api):
             return
             
         chapter_id = user['current_chapter_id']
-        chapter = next((c for c in book_data['chapters'] if c['chapter_id'] == chapter_id), None)
+        chapter = book_index.get_chapter(chapter_id)
         
         if chapter:
-            first_quiz = next((s for s in chapter['sections'] if s['type'] == 'quiz'), None)
-            if first_quiz:
-                handle_navigation(user_id, chapter_id, first_quiz['section_id'], reply_token, line_api)
+            if chapter.first_quiz_id is not None:
+                handle_navigation(user_id, chapter_id, chapter.first_quiz_id, reply_token, line_api)
             else:
                 line_api.reply_message(
                     ReplyMessageRequest(
@@ -732,12 +786,14 @@ def handle_chapter_quiz(user_id, reply_token, line_api):
                 )
                     
     except Exception as e:
-        print(f"Chapter quiz error: {e}")
+        report_error("Chapter quiz", e)
 
+@instrumented
 def handle_progress_inquiry(user_id, reply_token, line_api):
+    book_index = book_content.current.index
     try:
-        with get_db_connection() as conn:
-            total_sections = sum(len(ch['sections']) for ch in book_data['chapters'])
+        with get_db_connection(readonly=True) as conn:
+            total_sections = book_index.total_sections
             
             user = conn.execute(
                 "SELECT current_chapter_id, current_section_id FROM users WHERE line_user_id = ?",
@@ -746,31 +802,20 @@ def handle_progress_inquiry(user_id, reply_token, line_api):
             
             completed_sections = 0
             if user and user['current_chapter_id']:
-                for chapter in book_data['chapters']:
-                    if chapter['chapter_id'] < user['current_chapter_id']:
-                        completed_sections += len([s for s in chapter['sections'] if s['type'] == 'content'])
-                    elif chapter['chapter_id'] == user['current_chapter_id']:
-                        completed_sections += len([s for s in chapter['sections'] 
-                                                if s['type'] == 'content' and s['section_id'] < (user['current_section_id'] or 1)])
+                completed_sections = book_index.completed_content(
+                    user['current_chapter_id'], user['current_section_id'] or 1
+                )
             
-            quiz_attempts = conn.execute(
-                "SELECT COUNT(*) FROM quiz_attempts WHERE line_user_id = ?",
-                (user_id,)
-            ).fetchone()[0]
+            stats = get_user_stats(conn, user_id)
+            quiz_attempts = stats['attempt_count']
             
             if quiz_attempts > 0:
-                correct_answers = conn.execute(
-                    "SELECT COUNT(*) FROM quiz_attempts WHERE line_user_id = ? AND is_correct = 1",
-                    (user_id,)
-                ).fetchone()[0]
-                accuracy = (correct_answers / quiz_attempts) * 100
+                accuracy = (stats['correct_count'] / quiz_attempts) * 100
             else:
                 accuracy = 0
             
-            bookmark_count = conn.execute(
-                "SELECT COUNT(*) FROM bookmarks WHERE line_user_id = ?",
-                (user_id,)
-            ).fetchone()[0]
+            bookmark_count = stats['bookmark_count']
+            review_due = due_count(conn, user_id)
         
         progress_text = "📊 學習進度報告\n\n"
         if user and user['current_chapter_id']:
@@ -781,7 +826,8 @@ def handle_progress_inquiry(user_id, reply_token, line_api):
         progress_text += f"📖 閱讀進度：{completed_sections}/{total_sections} 段\n"
         progress_text += f"📝 測驗次數：{quiz_attempts} 次\n"
         progress_text += f"🎯 答題正確率：{accuracy:.1f}%\n"
-        progress_text += f"🔖 書籤數量：{bookmark_count} 個"
+        progress_text += f"🔖 書籤數量：{bookmark_count} 個\n"
+        progress_text += f"🔁 待複習：{review_due} 題"
         
         line_api.reply_message(
             ReplyMessageRequest(
@@ -791,15 +837,14 @@ def handle_progress_inquiry(user_id, reply_token, line_api):
         )
         
     except Exception as e:
-        print(f"Progress inquiry error: {e}")
+        report_error("Progress inquiry", e)
 
+@instrumented
 def handle_error_analytics(user_id, reply_token, line_api):
     try:
-        with get_db_connection() as conn:
-            total_attempts = conn.execute(
-                "SELECT COUNT(*) FROM quiz_attempts WHERE line_user_id = ?", 
-                (user_id,)
-            ).fetchone()[0]
+        with get_db_connection(readonly=True) as conn:
+            stats = get_user_stats(conn, user_id)
+            total_attempts = stats['attempt_count']
             
             if total_attempts == 0:
                 line_api.reply_message(
@@ -810,24 +855,17 @@ def handle_error_analytics(user_id, reply_token, line_api):
                 )
                 return
             
-            correct_attempts = conn.execute(
-                "SELECT COUNT(*) FROM quiz_attempts WHERE line_user_id = ? AND is_correct = 1", 
-                (user_id,)
-            ).fetchone()[0]
+            correct_attempts = stats['correct_count']
             
             wrong_attempts = total_attempts - correct_attempts
             accuracy = (correct_attempts / total_attempts) * 100
             
             error_stats = conn.execute(
-                """SELECT chapter_id, section_id, COUNT(*) as error_count,
-                          COUNT(*) * 100.0 / (SELECT COUNT(*) FROM quiz_attempts qa2 
-                                              WHERE qa2.line_user_id = qa.line_user_id 
-                                              AND qa2.chapter_id = qa.chapter_id 
-                                              AND qa2.section_id = qa.section_id) as error_rate
-                   FROM quiz_attempts qa
-                   WHERE line_user_id = ? AND is_correct = 0
-                   GROUP BY chapter_id, section_id
-                   ORDER BY error_count DESC, error_rate DESC
+                """SELECT chapter_id, section_id, wrong as error_count,
+                          wrong * 100.0 / attempts as error_rate
+                   FROM user_question_stats
+                   WHERE line_user_id = ? AND wrong > 0
+                   ORDER BY wrong DESC, attempts ASC, chapter_id, section_id
                    LIMIT 5""",
                 (user_id,)
             ).fetchall()
@@ -854,7 +892,7 @@ def handle_error_analytics(user_id, reply_token, line_api):
                     QuickReplyItem(
                         action=PostbackAction(
                             label=f"複習 第{ch_id}章第{sec_id}段",
-                            data=f"action=navigate&chapter_id={ch_id}&section_id={sec_id}"
+                            data=encode_postback('navigate', ch_id, sec_id)
                         )
                     )
                 )
@@ -887,16 +925,86 @@ def handle_error_analytics(user_id, reply_token, line_api):
             )
         
     except Exception as e:
-        print(f"Error analytics error: {e}")
+        report_error("Error analytics", e)
         line_api.reply_message(
             ReplyMessageRequest(
                 reply_token=reply_token,
                 messages=[TextMessage(text="錯誤分析載入失敗，請稍後再試")]
             )
         )
+def format_wait(seconds):
+    if seconds < 3600:
+        return f"{max(1, int(seconds // 60))} 分鐘"
+    if seconds < 86400:
+        return f"{int(seconds // 3600)} 小時"
+    return f"{int(seconds // 86400)} 天"
+
+# 複習時每次取出的到期題數，整批都是書中已刪除的題目時刪除後再取下一批
+REVIEW_BATCH_SIZE = 5
+
+@instrumented
+def handle_review(user_id, reply_token, line_api):
+    book_index = book_content.current.index
+    try:
+        now = time.time()
+        found = None
+        while found is None:
+            with get_db_connection(readonly=True) as conn:
+                items = due_items(conn, user_id, now, limit=REVIEW_BATCH_SIZE)
+            stale = []
+            for chapter_id, section_id, _ in items:
+                chapter = book_index.get_chapter(chapter_id)
+                section = chapter.get_section(section_id) if chapter else None
+                if section and section['type'] == 'quiz':
+                    found = (chapter_id, section_id, chapter, section)
+                    break
+                stale.append((chapter_id, section_id))
+            if stale:
+                # 書中已刪除的題目從排程移除，不再計入待複習題數，再查詢下一批
+                with get_db_connection() as conn:
+                    remove_items(conn, user_id, stale)
+            if len(items) < REVIEW_BATCH_SIZE:
+                break
+        
+        with get_db_connection(readonly=True) as conn:
+            remaining = due_count(conn, user_id, now) if found else 0
+            upcoming = None if found else next_due_at(conn, user_id)
+        
+        if found:
+            chapter_id, section_id, chapter, section = found
+            header = f"🔁 複習模式 (待複習 {remaining} 題)\n\n第{chapter_id}章第{section_id}段"
+            line_api.reply_message(
+                ReplyMessageRequest(
+                    reply_token=reply_token,
+                    messages=[TextMessage(text=header)] + build_quiz_messages(chapter, section)
+                )
+            )
+            return
+        
+        if upcoming is None:
+            text = "尚未有需要複習的題目\n\n完成測驗後，答過的題目會依記憶曲線安排複習時間"
+        else:
+            text = f"🎉 目前沒有到期的複習題目\n\n下一題將在 {format_wait(upcoming - now)}後到期"
+        line_api.reply_message(
+            ReplyMessageRequest(
+                reply_token=reply_token,
+                messages=[TextMessage(text=text + check_new_user_guidance(user_id))]
+            )
+        )
+        
+    except Exception as e:
+        report_error("Review", e)
+        line_api.reply_message(
+            ReplyMessageRequest(
+                reply_token=reply_token,
+                messages=[TextMessage(text="複習題目載入失敗，請稍後再試")]
+            )
+        )
+
+@instrumented
 def handle_bookmarks(user_id, reply_token, line_api):
     try:
-        with get_db_connection() as conn:
+        with get_db_connection(readonly=True) as conn:
             bookmarks = conn.execute(
                 """SELECT chapter_id, section_id
                    FROM bookmarks
@@ -929,7 +1037,7 @@ def handle_bookmarks(user_id, reply_token, line_api):
                     QuickReplyItem(
                         action=PostbackAction(
                             label=label if len(label) <= 20 else label[:17] + "...",
-                            data=f"action=navigate&chapter_id={ch_id}&section_id={sec_id}"
+                            data=encode_postback('navigate', ch_id, sec_id)
                         )
                     )
                 )
@@ -950,7 +1058,7 @@ def handle_bookmarks(user_id, reply_token, line_api):
             )
             
     except Exception as e:
-        print(f"Bookmarks error: {e}")
+        report_error("Bookmarks", e)
         line_api.reply_message(
             ReplyMessageRequest(
                 reply_token=reply_token,
@@ -958,11 +1066,9 @@ def handle_bookmarks(user_id, reply_token, line_api):
             )
         )
 
-def handle_add_bookmark(params, user_id, reply_token, line_api):
+@instrumented
+def handle_add_bookmark(user_id, chapter_id, section_id, reply_token, line_api):
     try:
-        chapter_id = int(params.get('chapter_id', [1])[0])
-        section_id = int(params.get('section_id', [1])[0])
-        
         with get_db_connection() as conn:
             existing = conn.execute(
                 "SELECT id FROM bookmarks WHERE line_user_id = ? AND chapter_id = ? AND section_id = ?",
@@ -979,6 +1085,11 @@ def handle_add_bookmark(params, user_id, reply_token, line_api):
                     "INSERT INTO bookmarks (line_user_id, chapter_id, section_id) VALUES (?, ?, ?)",
                     (user_id, chapter_id, section_id)
                 )
+                conn.execute(
+                    """INSERT INTO user_stats (line_user_id, bookmark_count) VALUES (?, 1)
+                       ON CONFLICT(line_user_id) DO UPDATE SET bookmark_count = bookmark_count + 1""",
+                    (user_id,)
+                )
                 if section_id == 0:
                     text = f"✅ 已加入書籤\n\n第 {chapter_id} 章圖片"
                 else:
@@ -989,16 +1100,13 @@ def handle_add_bookmark(params, user_id, reply_token, line_api):
         )
         
     except Exception as e:
-        print(f"Add bookmark error: {e}")
+        report_error("Add bookmark", e)
 
-def handle_answer(params, user_id, reply_token, line_api):
+@instrumented
+def handle_answer(user_id, chapter_id, section_id, user_answer, reply_token, line_api):
+    book_index = book_content.current.index
     try:
-        chapter_id = int(params.get('chapter_id', [1])[0])
-        section_id = int(params.get('section_id', [1])[0])
-        user_answer = params.get('answer', [None])[0]
-        
-        chapter = next((c for c in book_data['chapters'] if c['chapter_id'] == chapter_id), None)
-        section = next((s for s in chapter['sections'] if s['section_id'] == section_id), None)
+        section = book_index.get_section(chapter_id, section_id)
         
         if section and section['type'] == 'quiz':
             correct = section['content']['answer']
@@ -1009,6 +1117,24 @@ def handle_answer(params, user_id, reply_token, line_api):
                     "INSERT INTO quiz_attempts (line_user_id, chapter_id, section_id, user_answer, is_correct) VALUES (?, ?, ?, ?, ?)",
                     (user_id, chapter_id, section_id, user_answer, is_correct)
                 )
+                conn.execute(
+                    """INSERT INTO user_question_stats (line_user_id, chapter_id, section_id, attempts, wrong)
+                       VALUES (?, ?, ?, 1, ?)
+                       ON CONFLICT(line_user_id, chapter_id, section_id) DO UPDATE SET
+                           attempts = attempts + 1,
+                           wrong = wrong + excluded.wrong""",
+                    (user_id, chapter_id, section_id, int(not is_correct))
+                )
+                conn.execute(
+                    """INSERT INTO user_stats (line_user_id, attempt_count, correct_count) VALUES (?, 1, ?)
+                       ON CONFLICT(line_user_id) DO UPDATE SET
+                           attempt_count = attempt_count + 1,
+                           correct_count = correct_count + excluded.correct_count""",
+                    (user_id, int(is_correct))
+                )
+                now = time.time()
+                record_answer(conn, user_id, chapter_id, section_id, is_correct, now)
+                review_due = due_count(conn, user_id, now)
             
             if is_correct:
                 result_text = "✅ 答對了！"
@@ -1020,26 +1146,28 @@ def handle_answer(params, user_id, reply_token, line_api):
             
             actions = []
             next_section_id = section_id + 1
-            next_section = next((s for s in chapter['sections'] if s['section_id'] == next_section_id), None)
+            next_section = book_index.get_section(chapter_id, next_section_id)
             
             if next_section:
                 if next_section['type'] == 'quiz':
                     actions.append(PostbackAction(
                         label="➡️ 下一題",
-                        data=f"action=navigate&chapter_id={chapter_id}&section_id={next_section_id}"
+                        data=encode_postback('navigate', chapter_id, next_section_id)
                     ))
                 else:
                     actions.append(PostbackAction(
                         label="📖 繼續閱讀",
-                        data=f"action=navigate&chapter_id={chapter_id}&section_id={next_section_id}"
+                        data=encode_postback('navigate', chapter_id, next_section_id)
                     ))
             else:
                 actions.append(PostbackAction(
                     label="📖 選擇章節",
-                    data="action=show_chapter_menu"
+                    data=encode_postback('show_chapter_menu')
                 ))
             
-            actions.append(PostbackAction(label="📊 查看分析", data="action=view_analytics"))
+            if review_due:
+                actions.append(PostbackAction(label=f"🔁 複習 ({review_due} 題)", data=encode_postback('review')))
+            actions.append(PostbackAction(label="📊 查看分析", data=encode_postback('view_analytics')))
             
             template = ButtonsTemplate(
                 title=f"作答結果 {emoji}",
@@ -1055,7 +1183,7 @@ def handle_answer(params, user_id, reply_token, line_api):
             )
         
     except Exception as e:
-        print(f"Answer error: {e}")
+        report_error("Answer", e)
         line_api.reply_message(
             ReplyMessageRequest(
                 reply_token=reply_token,
@@ -1076,16 +1204,13 @@ def start_keep_alive():
     thread = threading.Thread(target=keep_alive)
     thread.daemon = True
     thread.start()
+@instrumented
 def handle_navigation(user_id, chapter_id, section_id, reply_token, line_api):
     try:
-        with get_db_connection() as conn:
-            conn.execute(
-                "UPDATE users SET current_chapter_id = ?, current_section_id = ? WHERE line_user_id = ?",
-                (chapter_id, section_id, user_id)
-            )
+        user_write_buffer.set_position(user_id, chapter_id, section_id)
         
-        chapter = next((c for c in book_data['chapters'] if c['chapter_id'] == chapter_id), None)
-        if not chapter:
+        payload = book_content.current.render_cache.get(chapter_id, section_id)
+        if payload is None:
             line_api.reply_message(
                 ReplyMessageRequest(
                     reply_token=reply_token,
@@ -1094,191 +1219,107 @@ def handle_navigation(user_id, chapter_id, section_id, reply_token, line_api):
             )
             return
         
-        content_sections = sorted([s for s in chapter['sections'] if s['type'] == 'content'], 
-                                key=lambda x: x['section_id'])
-        has_chapter_image = bool(chapter.get('image_url'))
+        reply_rendered(reply_token, payload)
         
-        messages = []
+    except Exception as e:
+        report_error("Navigation", e)
+        line_api.reply_message(
+            ReplyMessageRequest(
+                reply_token=reply_token,
+                messages=[TextMessage(text="載入內容失敗，請稍後再試")]
+            )
+        )
+
+@instrumented
+def handle_search(user_id, query, reply_token, line_api):
+    if not query:
+        line_api.reply_message(
+            ReplyMessageRequest(
+                reply_token=reply_token,
+                messages=[TextMessage(text="請在「搜尋」後輸入關鍵字\n\n例如：搜尋 according to")]
+            )
+        )
+        return
+    
+    try:
+        content = book_content.current
+        hits = content.search_index.search(query, limit=SEARCH_RESULT_LIMIT)
         
-        if section_id == 0 and has_chapter_image:
-            messages.append(ImageMessage(
-                original_content_url=chapter['image_url'],
-                preview_image_url=chapter['image_url']
-            ))
-            
-            quick_items = []
-            
-            if content_sections:
-                next_section_id = content_sections[0]['section_id']
-                quick_items.append(
-                    QuickReplyItem(
-                        action=PostbackAction(
-                            label="➡️ 下一段",
-                            data=f"action=navigate&chapter_id={chapter_id}&section_id={next_section_id}"
-                        )
-                    )
+        if not hits:
+            line_api.reply_message(
+                ReplyMessageRequest(
+                    reply_token=reply_token,
+                    messages=[TextMessage(text=f"🔍 找不到「{query}」相關內容\n\n試試其他關鍵字，或輸入「章節選擇」瀏覽章節")]
                 )
-            
+            )
+            return
+        
+        result_text = f"🔍 「{query}」的搜尋結果：\n"
+        quick_items = []
+        for i, hit in enumerate(hits, 1):
+            section = content.index.get_section(hit.chapter_id, hit.section_id)
+            result_text += f"\n{i}. 第{hit.chapter_id}章第{hit.section_id}段\n{snippet(section['content'], query)}\n"
             quick_items.append(
                 QuickReplyItem(
                     action=PostbackAction(
-                        label="🔖 標記",
-                        data=f"action=add_bookmark&chapter_id={chapter_id}&section_id=0"
+                        label=f"{i}. 第{hit.chapter_id}章第{hit.section_id}段",
+                        data=encode_postback('navigate', hit.chapter_id, hit.section_id)
                     )
                 )
             )
-            
-            total_content = len(content_sections) + 1
-            progress_text = f"📖 {chapter['title']}\n\n第 1/{total_content} 段 (章節圖片)\n\n💡 輸入 n=下一段"
-            
-            messages.append(TextMessage(
-                text=progress_text,
-                quick_reply=QuickReply(items=quick_items)
-            ))
-        
-        else:
-            section = next((s for s in chapter['sections'] if s['section_id'] == section_id), None)
-            
-            if not section:
-                total_content = len(content_sections) + (1 if has_chapter_image else 0)
-                
-                template = ButtonsTemplate(
-                    title="🎉 章節完成",
-                    text=f"完成 {chapter['title']}\n\n已閱讀 {total_content} 段內容\n恭喜完成本章節！",
-                    actions=[
-                        PostbackAction(label="📊 查看分析", data="action=view_analytics"),
-                        PostbackAction(label="📖 選擇章節", data="action=show_chapter_menu")
-                    ]
-                )
-                messages.append(TemplateMessage(alt_text="章節完成", template=template))
-                
-            elif section['type'] == 'content':
-                content = section['content']
-                if len(content) > 1000:
-                    content = content[:1000] + "\n\n...(內容較長，請點擊下一段繼續)"
-                    
-                messages.append(TextMessage(text=content))
-                
-                quick_items = []
-                
-                current_index = next((i for i, s in enumerate(content_sections) if s['section_id'] == section_id), -1)
-                
-                if current_index > 0:
-                    prev_section_id = content_sections[current_index - 1]['section_id']
-                    quick_items.append(
-                        QuickReplyItem(
-                            action=PostbackAction(
-                                label="⬅️ 上一段",
-                                data=f"action=navigate&chapter_id={chapter_id}&section_id={prev_section_id}"
-                            )
-                        )
-                    )
-                elif has_chapter_image:
-                    quick_items.append(
-                        QuickReplyItem(
-                            action=PostbackAction(
-                                label="⬅️ 上一段",
-                                data=f"action=navigate&chapter_id={chapter_id}&section_id=0"
-                            )
-                        )
-                    )
-                
-                if current_index < len(content_sections) - 1:
-                    next_section_id = content_sections[current_index + 1]['section_id']
-                    quick_items.append(
-                        QuickReplyItem(
-                            action=PostbackAction(
-                                label="➡️ 下一段",
-                                data=f"action=navigate&chapter_id={chapter_id}&section_id={next_section_id}"
-                            )
-                        )
-                    )
-                else:
-                    quiz_sections = [s for s in chapter['sections'] if s['type'] == 'quiz']
-                    if quiz_sections:
-                        first_quiz_id = min(quiz_sections, key=lambda x: x['section_id'])['section_id']
-                        quick_items.append(
-                            QuickReplyItem(
-                                action=PostbackAction(
-                                    label="📝 開始測驗",
-                                    data=f"action=navigate&chapter_id={chapter_id}&section_id={first_quiz_id}"
-                                )
-                            )
-                        )
-                
-                quick_items.append(
-                    QuickReplyItem(
-                        action=PostbackAction(
-                            label="🔖 標記",
-                            data=f"action=add_bookmark&chapter_id={chapter_id}&section_id={section_id}"
-                        )
-                    )
-                )
-                
-                content_position = current_index + 1
-                if has_chapter_image:
-                    display_position = content_position + 1
-                    total_content = len(content_sections) + 1
-                else:
-                    display_position = content_position
-                    total_content = len(content_sections)
-                
-                progress_text = f"📖 第 {display_position}/{total_content} 段\n\n💡 輸入 n=下一段 b=上一段"
-                
-                messages.append(TextMessage(
-                    text=progress_text,
-                    quick_reply=QuickReply(items=quick_items)
-                ))
-                
-            elif section['type'] == 'quiz':
-                quiz = section['content']
-                quick_items = []
-                
-                for key, text in quiz['options'].items():
-                    label = f"{key}. {text}"
-                    if len(label) > 20:
-                        label = label[:17] + "..."
-                        
-                    quick_items.append(
-                        QuickReplyItem(
-                            action=PostbackAction(
-                                label=label,
-                                display_text=f"選 {key}",
-                                data=f"action=submit_answer&chapter_id={chapter_id}&section_id={section_id}&answer={key}"
-                            )
-                        )
-                    )
-                
-                quiz_sections = [s for s in chapter['sections'] if s['type'] == 'quiz']
-                current_quiz = next((i+1 for i, s in enumerate(quiz_sections) if s['section_id'] == section_id), 1)
-                
-                quiz_text = f"📝 測驗 {current_quiz}/{len(quiz_sections)}\n\n{quiz['question']}"
-                
-                messages.append(TextMessage(
-                    text=quiz_text,
-                    quick_reply=QuickReply(items=quick_items)
-                ))
+        result_text += "\n點擊下方按鈕前往該段落"
         
         line_api.reply_message(
             ReplyMessageRequest(
                 reply_token=reply_token,
-                messages=messages[:5]
+                messages=[TextMessage(text=result_text, quick_reply=QuickReply(items=quick_items))]
             )
         )
-        
     except Exception as e:
-        print(f"Navigation error: {e}")
+        report_error("Search", e)
         line_api.reply_message(
             ReplyMessageRequest(
                 reply_token=reply_token,
-                messages=[TextMessage(text="載入內容失敗，請稍後再試")]
+                messages=[TextMessage(text="搜尋失敗，請稍後再試")]
             )
         )
 
+COMMAND_HANDLERS = {
+    'start_reading': handle_start_reading,
+    'chapter_carousel': handle_show_chapter_carousel,
+    'bookmarks': handle_bookmarks,
+    'resume': handle_resume_reading,
+    'quiz': handle_chapter_quiz,
+    'analytics': handle_error_analytics,
+    'review': handle_review,
+    'progress': handle_progress_inquiry,
+    'status': handle_status_inquiry,
+    'help': handle_help_message,
+    'chapter': handle_direct_chapter_selection,
+    'navigate': handle_quick_navigation,
+    'jump': handle_navigation,
+    'search': handle_search,
+}
+
+POSTBACK_HANDLERS = {
+    'read_content': handle_start_reading,
+    'show_chapter_menu': handle_show_chapter_carousel,
+    'view_bookmarks': handle_bookmarks,
+    'continue_reading': handle_resume_reading,
+    'chapter_quiz': handle_chapter_quiz,
+    'view_analytics': handle_error_analytics,
+    'navigate': handle_navigation,
+    'add_bookmark': handle_add_bookmark,
+    'submit_answer': handle_answer,
+    'select_chapter': handle_direct_chapter_selection,
+    'review': handle_review,
+}
+
 if __name__ == "__main__":
     start_keep_alive()
+    job_queue.start()
     print("LINE Bot 啟動")
-    print(f"載入 {len(book_data.get('chapters', []))} 章節")
+    print(f"載入 {book_content.stats()['chapters']} 章節")
     print("五分鐘英文文法攻略 - 優化版 v5.0")
     print("支援100人小規模使用，防休眠機制已啟用")
     
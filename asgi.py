@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+asgi.py - 以 asyncio 處理 /callback 的 ASGI 進入點
+事件處理邏輯與 app.py 共用：處理函式在專用的執行緒中執行，LINE API 呼叫
+交給事件迴圈以 AsyncMessagingApi 送出 (共用 aiohttp 連線池)；
+處理函式的執行緒會等到 LINE API 回應才繼續，因此 ASGI_HANDLER_THREADS 就是每個 worker
+同時處理中的事件上限，預設與 aiohttp 連線數 ASGI_LINE_POOL_SIZE 相同；
+同一次 webhook 中不同使用者的事件同時處理，同一使用者的事件依序處理。
+其他路徑 (/health、/metrics 等) 交給 Flask app 處理
+
+執行方式:
+  WORKER_PROFILE=asgi gunicorn -c gunicorn.conf.py
+  uvicorn asgi:app --port 10000
+"""
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from linebot.v3.exceptions import InvalidSignatureError
+
+import app as bot
+from utils.async_line_client import AsyncLineClient, LoopBoundLineApi
+from utils.webhook_dispatch import event_user_key
+
+ASGI_LINE_POOL_SIZE = int(os.environ.get('ASGI_LINE_POOL_SIZE', '100'))
+# 資料庫連線仍由 db_pool 限制，執行緒多於連線數時在 db_pool 排隊，不影響等待 LINE API 的執行緒
+ASGI_HANDLER_THREADS = int(os.environ.get('ASGI_HANDLER_THREADS', str(ASGI_LINE_POOL_SIZE)))
+
+
+class LineBotASGI:
+
+    def __init__(self, wsgi_app, webhook_handler, line_client):
+        self.wsgi_app = wsgi_app
+        self.webhook_handler = webhook_handler
+        self.line_client = line_client
+        self.client = None
+        self.executor = None
+        self._pid = None
+        self._start_lock = None
+        self._tasks = set()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        await self._ensure_started()
+        body = await self._read_body(receive)
+        if scope['path'] == '/callback' and scope['method'] == 'POST':
+            status, text = await self.callback(scope, body)
+            await self._respond(send, status, [(b'content-type', b'text/plain; charset=utf-8')],
+                                text.encode('utf-8'))
+        else:
+            await self._call_wsgi(scope, body, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self._ensure_started()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _ensure_started(self):
+        # 連線池與執行緒都屬於目前的行程與事件迴圈，fork 後各 worker 各自建立
+        if self._pid == os.getpid():
+            return
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self.executor = ThreadPoolExecutor(max_workers=ASGI_HANDLER_THREADS, thread_name_prefix="asgi-handler")
+            self.client = await AsyncLineClient(
+                bot.CHANNEL_ACCESS_TOKEN,
+                host=bot.LINE_API_HOST,
+                pool_size=ASGI_LINE_POOL_SIZE,
+                connect_timeout=bot.LINE_CONNECT_TIMEOUT,
+                read_timeout=bot.LINE_READ_TIMEOUT,
+                latency=bot.line_api_latency
+            ).start()
+            self._pid = os.getpid()
+
+    async def shutdown(self):
+        if self._pid != os.getpid():
+            return
+        # 處理完 async 模式下已接收的事件
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=30)
+        await self.client.close()
+        self.executor.shutdown(wait=True)
+        bot.user_write_buffer.flush()
+        self._pid = None
+
+    async def callback(self, scope, body):
+        bot.maintenance.touch()
+        signature = None
+        for name, value in scope['headers']:
+            if name == b'x-line-signature':
+                signature = value.decode('latin-1')
+        if signature is None:
+            return 400, 'Bad Request'
+        try:
+            payload = self.webhook_handler.parse(body.decode('utf-8'), signature)
+        except InvalidSignatureError:
+            return 400, 'Bad Request'
+        except Exception as e:
+            print(f"Callback error: {e}")
+            return 500, 'Internal Server Error'
+
+        if bot.WEBHOOK_MODE == 'async':
+            # 立即回應 LINE 平台，事件在背景處理
+            task = asyncio.ensure_future(self.handle_events(payload.events, payload.destination))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            await self.handle_events(payload.events, payload.destination)
+        return 200, 'OK'
+
+    async def handle_events(self, events, destination=None):
+        by_user = {}
+        for event in events:
+            by_user.setdefault(event_user_key(event), []).append(event)
+        await asyncio.gather(*(self._handle_in_order(user_events, destination)
+                               for user_events in by_user.values()))
+
+    async def _handle_in_order(self, events, destination):
+        for event in events:
+            try:
+                await self.handle_event(event, destination)
+            except Exception as e:
+                print(f"Event worker error: {e}")
+
+    async def handle_event(self, event, destination=None):
+        loop = asyncio.get_running_loop()
+        api = LoopBoundLineApi(self.client, loop)
+        await loop.run_in_executor(self.executor, self._dispatch, event, destination, api)
+
+    def _dispatch(self, event, destination, api):
+        with self.line_client.deferred(api):
+            self.webhook_handler.dispatch(event, destination)
+
+    async def _read_body(self, receive):
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    async def _respond(self, send, status, headers, body):
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _call_wsgi(self, scope, body, send):
+        environ = self._wsgi_environ(scope, body)
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                   for name, value in headers]
+
+        def run():
+            result = self.wsgi_app(environ, start_response)
+            try:
+                return b''.join(result)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+
+        content = await asyncio.get_running_loop().run_in_executor(self.executor, run)
+        await self._respond(send, response['status'], response['headers'], content)
+
+    @staticmethod
+    def _wsgi_environ(scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            'PATH_INFO': scope['path'],
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                environ[name] = value
+            else:
+                key = f'HTTP_{name}'
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+
+app = LineBotASGI(bot.app, bot.handler, bot.line_client)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_archive.py - 比較作答紀錄全部留在主資料表 vs 封存 90 天前的紀錄：主資料表大小、近期報表與全表掃描的時間
+
+使用方法:
+  python benchmarks/bench_archive.py --months 6,12,24 --per-month 200000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from init_db import ensure_archive_tables
+from utils.attempt_archive import AttemptArchive, attempt_totals
+
+NOW = datetime(2024, 12, 31, 12, 0, 0, tzinfo=timezone.utc)
+
+# 近 7 天各章節的作答次數與正確率
+RECENT_REPORT = '''
+    SELECT chapter_id, COUNT(*), AVG(is_correct) FROM quiz_attempts
+    WHERE created_at >= ? GROUP BY chapter_id
+'''
+
+
+def populate(conn, months, per_month, seed):
+    conn.execute('''
+        CREATE TABLE quiz_attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            line_user_id TEXT NOT NULL,
+            chapter_id INTEGER NOT NULL,
+            section_id INTEGER NOT NULL,
+            user_answer TEXT NOT NULL,
+            is_correct BOOLEAN NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX idx_quiz_attempts_user_id ON quiz_attempts(line_user_id)')
+    ensure_archive_tables(conn)
+    rng = random.Random(seed)
+    total = months * per_month
+    span = months * 30 * 86400
+    start = NOW.timestamp() - span
+    batch = []
+    for index in range(total):
+        answered = datetime.fromtimestamp(start + span * index / total, timezone.utc)
+        batch.append((f"U{rng.randrange(50000):06d}", rng.randint(1, 7), rng.randint(20, 60), 'A',
+                      rng.random() < 0.7, answered.strftime('%Y-%m-%d %H:%M:%S')))
+        if len(batch) >= 50000:
+            conn.executemany(
+                "INSERT INTO quiz_attempts (line_user_id, chapter_id, section_id, user_answer, is_correct, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", batch
+            )
+            batch = []
+    if batch:
+        conn.executemany(
+            "INSERT INTO quiz_attempts (line_user_id, chapter_id, section_id, user_answer, is_correct, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)", batch
+        )
+    conn.commit()
+
+
+def scan_ms(conn, repeat=3):
+    """未使用索引的全表彙總 (例如 init_db.py info 的整體正確率)"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute("SELECT COUNT(*), AVG(is_correct) FROM quiz_attempts").fetchone()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def recent_report_ms(conn, repeat=20):
+    since = (NOW - timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S')
+    started = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(RECENT_REPORT, (since,)).fetchall()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def hot_size(conn):
+    pages = conn.execute("SELECT COUNT(*) FROM dbstat WHERE name LIKE '%quiz_attempts%'").fetchone()
+    return pages[0] * conn.execute("PRAGMA page_size").fetchone()[0] if pages else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--months', default='6,12,24', help="歷史資料月數")
+    parser.add_argument('--per-month', type=int, default=200000)
+    parser.add_argument('--hot-days', type=int, default=90)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    for months in [int(value) for value in args.months.split(',')]:
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = sqlite3.connect(os.path.join(tmp, 'bench.db'))
+            populate(conn, months, args.per_month, args.seed)
+            full_rows = conn.execute("SELECT COUNT(*) FROM quiz_attempts").fetchone()[0]
+            full_size = hot_size(conn)
+            full_ms = recent_report_ms(conn)
+            full_scan_ms = scan_ms(conn)
+
+            archive = AttemptArchive(os.path.join(tmp, 'archive'), args.hot_days)
+            started = time.perf_counter()
+            archive.archive(conn, now=NOW)
+            archive_seconds = time.perf_counter() - started
+            conn.execute("VACUUM")
+            hot_rows = conn.execute("SELECT COUNT(*) FROM quiz_attempts").fetchone()[0]
+            hot_ms = recent_report_ms(conn)
+            hot_scan_ms = scan_ms(conn)
+
+            started = time.perf_counter()
+            totals = attempt_totals(conn, archive)
+            history_ms = (time.perf_counter() - started) * 1000
+            assert totals[0] == full_rows
+
+            print(f"{months:>3} 個月 ({full_rows} 筆)  "
+                  f"全部在主表: {full_size / 1048576:7.1f} MB  近 7 天報表 {full_ms:6.2f} ms  全表掃描 {full_scan_ms:7.1f} ms  |  "
+                  f"封存後主表: {hot_rows} 筆 {hot_size(conn) / 1048576:6.1f} MB  近 7 天報表 {hot_ms:6.2f} ms  "
+                  f"全表掃描 {hot_scan_ms:7.1f} ms  |  "
+                  f"封存 {archive_seconds:5.1f} s  全歷史統計 {history_ms:7.1f} ms")
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_backup.py - 比較備份方式的速度與備份期間對寫入延遲的影響：
+檔案複製 (舊的 init_db.py backup)、backup API 一次複製、分段複製 (每段之間暫停)、分段複製並壓縮
+
+使用方法:
+  python benchmarks/bench_backup.py --size-mb 200 --pages 256 --sleep 0.01
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db_backup import online_backup, verify_backup
+from utils.db_pool import SQLitePool
+
+
+def populate(pool, size_mb):
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, payload BLOB)")
+    rows = size_mb * 1024
+    with pool.connection() as conn:
+        for start in range(0, rows, 10000):
+            conn.executemany("INSERT INTO items (payload) VALUES (?)",
+                             [(os.urandom(512) + bytes(512),) for _ in range(min(10000, rows - start))])
+
+
+class Writer(threading.Thread):
+    """以固定間隔寫入單筆資料並 commit，記錄每次寫入的延遲"""
+
+    def __init__(self, pool, interval):
+        super().__init__(daemon=True)
+        self.pool = pool
+        self.interval = interval
+        self.latencies = []
+        self.running = True
+
+    def run(self):
+        while self.running:
+            started = time.perf_counter()
+            with self.pool.connection() as conn:
+                conn.execute("INSERT INTO items (payload) VALUES (?)", (b'w' * 256,))
+            self.latencies.append((time.perf_counter() - started) * 1000)
+            time.sleep(self.interval)
+
+    def take(self):
+        latencies, self.latencies = self.latencies, []
+        return latencies
+
+
+def summarize(latencies):
+    if not latencies:
+        return "沒有寫入"
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    return (f"寫入 {len(ordered):>5} 次  p50 {ordered[len(ordered) // 2]:6.2f} ms  "
+            f"p99 {p99:7.2f} ms  最大 {ordered[-1]:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--size-mb', type=int, default=200)
+    parser.add_argument('--pages', type=int, default=256, help="分段複製每段的頁數")
+    parser.add_argument('--sleep', type=float, default=0.01, help="分段之間暫停的秒數")
+    parser.add_argument('--write-interval', type=float, default=0.002)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = SQLitePool(os.path.join(tmp, 'live.db'), write_size=1, read_size=1)
+        print(f"建立 {args.size_mb} MB 資料庫...")
+        populate(pool, args.size_mb)
+        writer = Writer(pool, args.write_interval)
+        writer.start()
+
+        time.sleep(2)
+        print(f"{'無備份':<22}  {'':>28}  {summarize(writer.take())}")
+
+        methods = [
+            ('檔案複製 (copy2)', lambda target: shutil.copy2(pool.database, target) and None),
+            ('backup API 一次複製', lambda target: online_backup(pool.database, target, pages=-1, sleep=0)),
+            (f'分段 {args.pages} 頁/{args.sleep * 1000:.0f} ms',
+             lambda target: online_backup(pool.database, target, pages=args.pages, sleep=args.sleep)),
+            ('分段並壓縮',
+             lambda target: online_backup(pool.database, target + '.gz', pages=args.pages, sleep=args.sleep,
+                                          compress=True)),
+        ]
+        size = os.path.getsize(pool.database)
+        for index, (label, backup) in enumerate(methods):
+            target = os.path.join(tmp, f"backup_{index}.db")
+            writer.take()
+            started = time.perf_counter()
+            stats = backup(target)
+            seconds = time.perf_counter() - started
+            latencies = writer.take()
+            if stats is None:
+                detail = f"完整性: {verify_backup(target)}"
+            else:
+                detail = f"重新開始 {stats['restarts']} 次 輸出 {stats['output_bytes'] / 1048576:.0f} MB"
+            print(f"{label:<22}  {seconds:6.2f} s {size / 1048576 / seconds:6.1f} MB/s  "
+                  f"{summarize(latencies)}  {detail}")
+            for path in (target, target + '.gz'):
+                if os.path.exists(path):
+                    os.remove(path)
+        writer.running = False
+        writer.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_bookpack.py - 比較 book.json 與 mmap 內容包的啟動時間與每個 worker 的記憶體用量
+每種模式在獨立的子行程中載入 (相當於一個 worker)，並回覆 --renders 個隨機段落
+
+使用方法:
+  python benchmarks/bench_bookpack.py --scale 100
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def read_status():
+    status = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('VmRSS', 'RssAnon', 'RssFile'):
+                status[key] = int(value.split()[0]) / 1024
+    return status
+
+
+def child(path, renders, seed):
+    """子行程：載入內容並輸出量測結果"""
+    from models.book_content import BookContentManager
+
+    before = read_status()
+    started = time.perf_counter()
+    manager = BookContentManager(path, watch_interval=0)
+    content = manager.load()
+    load_ms = (time.perf_counter() - started) * 1000
+
+    rng = random.Random(seed)
+    keys = [(chapter.chapter_id, section_id)
+            for chapter in content.index.chapter_list for section_id in chapter.sections]
+    started = time.perf_counter()
+    for chapter_id, section_id in rng.sample(keys, min(renders, len(keys))):
+        content.render_cache.get(chapter_id, section_id)
+    render_ms = (time.perf_counter() - started) * 1000
+
+    after = read_status()
+    print(json.dumps({
+        "load_ms": load_ms,
+        "render_ms": render_ms,
+        "rss_mb": after['VmRSS'] - before['VmRSS'],
+        "anon_mb": after['RssAnon'] - before['RssAnon'],
+        "file_mb": after['RssFile'] - before['RssFile'],
+    }))
+
+
+def build_scaled_book(source, scale):
+    with open(source, encoding='utf-8') as f:
+        book = json.load(f)
+    chapters = []
+    for copy_index in range(scale):
+        for chapter in book['chapters']:
+            scaled = copy.deepcopy(chapter)
+            scaled['chapter_id'] = len(chapters) + 1
+            # 讓每份複本的文字不同，避免字串表把重複內容合併
+            for section in scaled['sections']:
+                if section['type'] == 'content':
+                    section['content'] = f"[{copy_index}] " + section['content']
+                else:
+                    section['content']['question'] = f"[{copy_index}] " + section['content']['question']
+            chapters.append(scaled)
+    return {"chapters": chapters}
+
+
+def run_child(path, args):
+    output = subprocess.run(
+        [sys.executable, __file__, '--child', path, '--renders', str(args.renders), '--seed', str(args.seed)],
+        check=True, capture_output=True, text=True, cwd=ROOT
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--book', default=os.path.join(ROOT, 'book.json'))
+    parser.add_argument('--scale', type=int, default=100)
+    parser.add_argument('--renders', type=int, default=200)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--child')
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.renders, args.seed)
+        return
+
+    from bookpack import compile_book
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'book.json')
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(build_scaled_book(args.book, args.scale), f, ensure_ascii=False)
+        started = time.perf_counter()
+        pack_path, stats = compile_book(json_path, os.path.join(tmp, 'book.pack'), validate=False)
+        compile_s = time.perf_counter() - started
+        print(f"book.json {os.path.getsize(json_path) / 1e6:.1f} MB -> book.pack {stats['bytes'] / 1e6:.1f} MB "
+              f"({stats['sections']} 段, 編譯 {compile_s:.2f} s)")
+
+        print(f"{'模式':<10}{'載入 ms':>10}{'渲染 ms':>10}{'RSS MB':>10}{'私有 MB':>10}{'共用 MB':>10}")
+        for label, path in (("json", json_path), ("pack", pack_path)):
+            results = [run_child(path, args) for _ in range(args.runs)]
+            best = min(results, key=lambda r: r['load_ms'])
+            print(f"{label:<10}{best['load_ms']:>10.1f}{best['render_ms']:>10.1f}"
+                  f"{best['rss_mb']:>10.1f}{best['anon_mb']:>10.1f}{best['file_mb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_command_router.py - 比較原本 handle_message 的 if/elif 關鍵字掃描與 CommandRouter
+
+使用方法:
+  python benchmarks/bench_command_router.py --rounds 20000
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.command_router import build_default_router
+
+MESSAGES = [
+    "閱讀內容", "章節選擇", "我的書籤", "上次進度", "本章測驗", "錯誤分析",
+    "n", "b", "下一段", "3", "第5章", "跳到第2章第3段", "學習進度", "狀態",
+    "幫助", "hello", "請問這題為什麼選 B 而不是 C", "thanks!",
+]
+
+
+def legacy_route(text):
+    """原本 handle_message 的判斷順序 (只回傳指令名稱)"""
+    text = text.strip()
+    normalized_text = text.replace(' ', '').lower()
+    if any(keyword in normalized_text for keyword in ['閱讀內容', '開始閱讀', '閱讀', 'read', 'start']):
+        return 'start_reading'
+    elif any(keyword in normalized_text for keyword in ['章節選擇', '選擇章節', 'chapter', 'chapters']):
+        return 'chapter_carousel'
+    elif any(keyword in normalized_text for keyword in ['我的書籤', '書籤', 'bookmark', 'bookmarks']):
+        return 'bookmarks'
+    elif any(keyword in normalized_text for keyword in ['上次進度', '繼續閱讀', '進度', 'continue', 'resume']):
+        return 'resume'
+    elif any(keyword in normalized_text for keyword in ['本章測驗', '測驗題', '測驗', 'quiz', 'test']):
+        return 'quiz'
+    elif any(keyword in normalized_text for keyword in ['錯誤分析', '分析', 'analytics', 'analysis']):
+        return 'analytics'
+    elif text.isdigit() and 1 <= int(text) <= 7:
+        return 'chapter'
+    elif text.lower() in ['n', 'next', '下', '下一段', '下一']:
+        return 'navigate'
+    elif text.lower() in ['b', 'back', 'prev', '上', '上一段', '上一']:
+        return 'navigate'
+    elif text.startswith('第') and text.endswith('章') and len(text) == 3:
+        return 'chapter'
+    elif '跳到' in normalized_text or '跳轉' in normalized_text:
+        match = re.search(r'第?(\d+)章.*?第?(\d+)段', text)
+        return 'jump' if match else None
+    elif any(keyword in normalized_text for keyword in ['學習進度', '我的進度', 'progress']):
+        return 'progress'
+    elif any(keyword in normalized_text for keyword in ['狀態', '資訊', 'status', 'info']):
+        return 'status'
+    elif any(keyword in normalized_text for keyword in ['幫助', '說明', '指令', 'help', 'command']):
+        return 'help'
+    return None
+
+
+def run(route, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for text in MESSAGES:
+            route(text)
+    return (time.perf_counter() - started) / (rounds * len(MESSAGES)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rounds', type=int, default=20000)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    router = build_default_router()
+    print(f"建立路由: {(time.perf_counter() - started) * 1000:.3f} ms")
+
+    legacy_us = run(legacy_route, args.rounds)
+    router_us = run(router.route, args.rounds)
+    print(f"if/elif 掃描: {legacy_us:6.2f} us/訊息")
+    print(f"CommandRouter: {router_us:6.2f} us/訊息  ({legacy_us / router_us:.1f}x)")
+
+    print("\n各訊息 (us/訊息):")
+    for text in MESSAGES:
+        legacy = run(lambda t: legacy_route(text), args.rounds // 10)
+        routed = run(lambda t: router.route(text), args.rounds // 10)
+        print(f"  {text:<24} {legacy:6.2f} -> {routed:6.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_error_analytics.py - 比較「最需要加強的題目」查詢：
+原本對 quiz_attempts 的關聯子查詢 vs user_question_stats 彙總表
+
+使用方法:
+  python benchmarks/bench_error_analytics.py --attempts 1000000 --users 5000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from init_db import ensure_summary_tables
+
+OLD_QUERY = """SELECT chapter_id, section_id, COUNT(*) as error_count,
+                      COUNT(*) * 100.0 / (SELECT COUNT(*) FROM quiz_attempts qa2
+                                          WHERE qa2.line_user_id = qa.line_user_id
+                                          AND qa2.chapter_id = qa.chapter_id
+                                          AND qa2.section_id = qa.section_id) as error_rate
+               FROM quiz_attempts qa
+               WHERE line_user_id = ? AND is_correct = 0
+               GROUP BY chapter_id, section_id
+               ORDER BY error_count DESC, error_rate DESC
+               LIMIT 5"""
+
+NEW_QUERY = """SELECT chapter_id, section_id, wrong as error_count,
+                      wrong * 100.0 / attempts as error_rate
+               FROM user_question_stats
+               WHERE line_user_id = ? AND wrong > 0
+               ORDER BY wrong DESC, attempts ASC, chapter_id, section_id
+               LIMIT 5"""
+
+
+def populate(conn, attempts, users, seed):
+    conn.executescript('''
+        CREATE TABLE quiz_attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            line_user_id TEXT NOT NULL,
+            chapter_id INTEGER NOT NULL,
+            section_id INTEGER NOT NULL,
+            user_answer TEXT NOT NULL,
+            is_correct BOOLEAN NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE bookmarks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            line_user_id TEXT NOT NULL,
+            chapter_id INTEGER NOT NULL,
+            section_id INTEGER NOT NULL
+        );
+        CREATE INDEX idx_quiz_attempts_user_id ON quiz_attempts(line_user_id);
+    ''')
+    rng = random.Random(seed)
+    # 少數重度使用者貢獻大部分作答紀錄
+    weights = [1.0 / (i + 1) for i in range(users)]
+    user_ids = [f"U{i:08d}" for i in range(users)]
+    batch = []
+    for _ in range(attempts):
+        user_id = rng.choices(user_ids, weights)[0]
+        batch.append((user_id, rng.randint(1, 7), rng.randint(20, 60), 'A', rng.random() < 0.6))
+        if len(batch) >= 50000:
+            conn.executemany(
+                "INSERT INTO quiz_attempts (line_user_id, chapter_id, section_id, user_answer, is_correct) VALUES (?, ?, ?, ?, ?)",
+                batch
+            )
+            batch = []
+    if batch:
+        conn.executemany(
+            "INSERT INTO quiz_attempts (line_user_id, chapter_id, section_id, user_answer, is_correct) VALUES (?, ?, ?, ?, ?)",
+            batch
+        )
+    conn.commit()
+    return user_ids
+
+
+def time_query(conn, query, user_ids):
+    started = time.perf_counter()
+    for user_id in user_ids:
+        conn.execute(query, (user_id,)).fetchall()
+    return (time.perf_counter() - started) / len(user_ids) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--attempts', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--samples', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, 'bench.db'))
+        print(f"建立 {args.attempts} 筆作答紀錄 ({args.users} 位使用者)...")
+        user_ids = populate(conn, args.attempts, args.users, args.seed)
+
+        started = time.perf_counter()
+        ensure_summary_tables(conn)
+        conn.commit()
+        print(f"回填彙總表: {time.perf_counter() - started:.2f} s")
+
+        heavy = user_ids[:args.samples // 2]
+        rng = random.Random(args.seed)
+        typical = rng.sample(user_ids, args.samples // 2)
+        for label, sample in (("重度使用者", heavy), ("一般使用者", typical)):
+            old_ms = time_query(conn, OLD_QUERY, sample)
+            new_ms = time_query(conn, NEW_QUERY, sample)
+            print(f"{label}: 關聯子查詢 {old_ms:8.3f} ms/次  彙總表 {new_ms:8.3f} ms/次  ({old_ms / new_ms:6.1f}x)")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
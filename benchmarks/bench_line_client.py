@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_line_client.py - 比較每個事件建立 ApiClient 與共用連線池的回覆延遲
+
+使用方法:
+  python benchmarks/bench_line_client.py --requests 500 --threads 4
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from linebot.v3.messaging import (
+    Configuration, ApiClient, MessagingApi, ReplyMessageRequest, TextMessage
+)
+from utils.line_client import LineClient
+from benchmarks.line_stub import LineStubServer
+
+ACCESS_TOKEN = 'bench_token'
+
+
+def reply_request():
+    return ReplyMessageRequest(reply_token='bench', messages=[TextMessage(text="pong")])
+
+
+def run(label, send, total, threads):
+    latencies = []
+
+    def one(_):
+        start = time.perf_counter()
+        send()
+        latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<24} 平均 {statistics.mean(latencies) * 1000:7.2f} ms  "
+          f"p95 {p95 * 1000:7.2f} ms  吞吐 {total / elapsed:8.1f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.0, help="stub 注入延遲 (秒)")
+    args = parser.parse_args()
+
+    stub = LineStubServer(latency=args.latency).start()
+    try:
+        configuration = Configuration(access_token=ACCESS_TOKEN, host=stub.url)
+
+        def per_event():
+            MessagingApi(ApiClient(configuration)).reply_message(reply_request())
+
+        run("每個事件建立 ApiClient", per_event, args.requests, args.threads)
+        print(f"{'':<24} 新建連線 {stub.connections} 次")
+
+        stub.reset()
+        client = LineClient(ACCESS_TOKEN, host=stub.url, pool_size=args.threads)
+
+        def shared():
+            client.api.reply_message(reply_request())
+
+        run("共用連線池", shared, args.requests, args.threads)
+        print(f"{'':<24} 新建連線 {stub.connections} 次")
+        client.close()
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_maintenance.py - 比較清理過期資料的方式對同時寫入的影響：
+一次 DELETE + 完整 VACUUM (舊的 cleanup) vs 分批刪除 + incremental_vacuum
+
+使用方法:
+  python benchmarks/bench_maintenance.py --rows 500000 --max-lock-ms 50
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db_pool import SQLitePool
+from utils.maintenance import CleanupRule, MaintenanceScheduler
+from benchmarks.bench_backup import Writer, summarize
+
+NOW = time.time()
+RULE = CleanupRule('user_actions', 'user_actions', 'timestamp', lambda now: now - 3600)
+
+
+def populate(pool, rows):
+    with pool.connection() as conn:
+        conn.execute('''
+            CREATE TABLE user_actions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                line_user_id TEXT NOT NULL,
+                action_data TEXT NOT NULL,
+                timestamp REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX idx_user_actions_timestamp ON user_actions(timestamp)')
+        conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, payload BLOB)')
+    with pool.connection() as conn:
+        for start in range(0, rows, 50000):
+            conn.executemany(
+                "INSERT INTO user_actions (line_user_id, action_data, timestamp) VALUES (?, ?, ?)",
+                [(f"U{index % 5000:05d}", 'x' * 300, NOW - 86400 if index % 10 else NOW)
+                 for index in range(start, min(rows, start + 50000))]
+            )
+
+
+def run(label, tmp, rows, auto_vacuum, cleanup, write_interval):
+    pool = SQLitePool(os.path.join(tmp, f"{label}.db"), write_size=2, read_size=1, auto_vacuum=auto_vacuum)
+    populate(pool, rows)
+    size = os.path.getsize(pool.database)
+    writer = Writer(pool, write_interval)
+    writer.start()
+    time.sleep(0.5)
+    writer.take()
+    started = time.perf_counter()
+    detail = cleanup(pool)
+    seconds = time.perf_counter() - started
+    latencies = writer.take()
+    writer.running = False
+    writer.join()
+    with pool.connection() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    print(f"{label:<10} {seconds:6.2f} s  {size / 1048576:6.1f} → {os.path.getsize(pool.database) / 1048576:6.1f} MB  "
+          f"{summarize(latencies)}  {detail}")
+
+
+def full_vacuum(pool):
+    with pool.connection() as conn:
+        conn.execute("DELETE FROM user_actions WHERE timestamp < ?", (NOW - 3600,))
+    with pool.connection() as conn:
+        conn.execute("VACUUM")
+    return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--max-lock-ms', type=float, default=50)
+    parser.add_argument('--vacuum-pages', type=int, default=200)
+    parser.add_argument('--write-interval', type=float, default=0.002)
+    args = parser.parse_args()
+
+    def batched(pool):
+        scheduler = MaintenanceScheduler(pool.connection, [RULE], max_lock_ms=args.max_lock_ms,
+                                         vacuum_pages=args.vacuum_pages, pause=0.01, autostart=False)
+        report = scheduler.run_once(force_vacuum=True)
+        stats = scheduler.stats()
+        return (f"{stats['batches']} 批 單批最長 {stats['max_lock_observed_ms']} ms "
+                f"(上限 {args.max_lock_ms:.0f} ms) 歸還 {report['vacuumed_pages']} 頁")
+
+    print(f"{args.rows} 筆操作紀錄，其中 90% 過期")
+    with tempfile.TemporaryDirectory() as tmp:
+        run('VACUUM', tmp, args.rows, None, full_vacuum, args.write_interval)
+        run('分批', tmp, args.rows, 'INCREMENTAL', batched, args.write_interval)
+
+
+if __name__ == "__main__":
+    main()
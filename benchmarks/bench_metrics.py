@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_metrics.py - 量測計時區段的額外開銷 (單一行程與多個行程同時寫入)
+
+使用方法:
+  python benchmarks/bench_metrics.py --rounds 200000 --processes 4
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.metrics import MetricsRegistry
+
+
+def run(latency, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        with latency.time(handler='handle_navigation'):
+            pass
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="metrics overhead benchmark")
+    parser.add_argument('--rounds', type=int, default=200000)
+    parser.add_argument('--processes', type=int, default=4)
+    args = parser.parse_args()
+
+    registry = MetricsRegistry()
+    latency = registry.histogram('bench_duration_seconds', 'bench', ['handler'])
+
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        pass
+    baseline = time.perf_counter() - started
+    elapsed = run(latency, args.rounds) - baseline
+    print(f"single process: {elapsed / args.rounds * 1e6:.2f} us per span")
+
+    started = time.perf_counter()
+    children = []
+    for _ in range(args.processes):
+        pid = os.fork()
+        if pid == 0:
+            run(latency, args.rounds)
+            os._exit(0)
+        children.append(pid)
+    for pid in children:
+        os.waitpid(pid, 0)
+    elapsed = time.perf_counter() - started
+    total = args.rounds * args.processes
+    print(f"{args.processes} processes: {elapsed / total * 1e6:.2f} us per span, {total / elapsed:.0f} spans/s")
+
+    series, _ = registry.collect()
+    count = series['bench_duration_seconds|handler="handle_navigation"'][0]
+    assert count == args.rounds + total, count
+    print(f"recorded {count} observations")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_postback_codec.py - 比較 parse_qs 解析舊格式與 decode_postback 解析新格式
+
+使用方法:
+  python benchmarks/bench_postback_codec.py --rounds 100000
+"""
+import argparse
+import os
+import sys
+import time
+from urllib.parse import parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.postback_codec import decode_postback, encode_postback
+
+SAMPLES = [
+    ('navigate', (3, 12), "action=navigate&chapter_id=3&section_id=12"),
+    ('submit_answer', (1, 45, 'C'), "action=submit_answer&chapter_id=1&section_id=45&answer=C"),
+    ('add_bookmark', (2, 7), "action=add_bookmark&chapter_id=2&section_id=7"),
+    ('view_analytics', (), "action=view_analytics"),
+]
+
+
+def legacy_parse(data):
+    """原本 handle_postback 的解析方式"""
+    params = parse_qs(data)
+    action = params.get('action', [None])[0]
+    if action in ('navigate', 'add_bookmark', 'submit_answer'):
+        int(params.get('chapter_id', [1])[0])
+        int(params.get('section_id', [1])[0])
+    return action
+
+
+def timed(func, data, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        func(data)
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rounds', type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{'動作':<16}{'舊格式':>8}{'新格式':>8}{'parse_qs':>12}{'decode':>10}{'舊格式解碼':>12}")
+    for action, values, legacy in SAMPLES:
+        compact = encode_postback(action, *values)
+        old_us = timed(legacy_parse, legacy, args.rounds)
+        new_us = timed(decode_postback, compact, args.rounds)
+        fallback_us = timed(decode_postback, legacy, args.rounds)
+        print(f"{action:<16}{len(legacy):>6} B{len(compact):>6} B"
+              f"{old_us:>9.2f} us{new_us:>7.2f} us{fallback_us:>9.2f} us")
+
+
+if __name__ == "__main__":
+    main()
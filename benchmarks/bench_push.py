@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_push.py - 對本機 LINE API 模擬伺服器執行 multicast 推播，比較不同併發數的送出速度
+
+使用方法:
+  python benchmarks/bench_push.py --users 100000 --latency 0.1 --rate 200 --concurrency 1,8,32
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from init_db import ensure_push_tables
+from utils.db_pool import SQLitePool
+from utils.line_client import LineClient
+from utils.push_engine import PushEngine
+from benchmarks.line_stub import LineStubServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--chapters', type=int, default=10, help="每章一組訊息")
+    parser.add_argument('--latency', type=float, default=0.1, help="stub 注入延遲 (秒)")
+    parser.add_argument('--rate', type=float, default=200, help="每秒請求數上限")
+    parser.add_argument('--concurrency', default='1,8,32')
+    args = parser.parse_args()
+
+    stub = LineStubServer(latency=args.latency).start()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            pool = SQLitePool(os.path.join(directory, 'push.db'))
+            with pool.connection() as conn:
+                ensure_push_tables(conn)
+            groups = []
+            for chapter in range(args.chapters):
+                user_ids = [f"U{chapter:02d}{index:08d}" for index in range(chapter, args.users, args.chapters)]
+                groups.append(([{"type": "text", "text": f"第 {chapter + 1} 章提醒"}], user_ids))
+
+            print(f"{args.users} 位收件者，stub 延遲 {args.latency * 1000:.0f} ms，上限 {args.rate:.0f} req/s")
+            for concurrency in [int(value) for value in args.concurrency.split(',')]:
+                stub.reset()
+                engine = PushEngine(pool.connection, LineClient('bench', host=stub.url, pool_size=concurrency),
+                                    rate=args.rate, concurrency=concurrency, base_delay=0.05)
+                run_id = engine.plan(f"bench:{concurrency}", groups)
+                report = engine.send(run_id)
+                print(f"併發 {concurrency:>3}  {report['sent']:>4} 批  "
+                      f"{report['elapsed']:7.2f} s  {report['requests_per_second']:7.1f} req/s  "
+                      f"{report['recipients_per_second']:9.0f} 位/s  限速等待 {report['rate_limited_seconds']:.2f} s")
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_review.py - 比較複習排程查詢：每次重播使用者的作答紀錄 vs review_schedule 索引
+
+使用方法:
+  python benchmarks/bench_review.py --attempts 3000000 --users 300000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from init_db import REVIEW_SCHEDULE_SCHEMA, REVIEW_SCHEDULE_INDEX
+from models.review_schedule import (
+    NEW_STATE, due_count, due_items, next_state, rebuild_review_schedule, record_answer
+)
+
+NOW = time.time()
+
+
+def populate(conn, attempts, users, seed):
+    conn.executescript('''
+        CREATE TABLE quiz_attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            line_user_id TEXT NOT NULL,
+            chapter_id INTEGER NOT NULL,
+            section_id INTEGER NOT NULL,
+            user_answer TEXT NOT NULL,
+            is_correct BOOLEAN NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX idx_quiz_attempts_user_id ON quiz_attempts(line_user_id);
+    ''')
+    rng = random.Random(seed)
+    weights = [1.0 / (i + 1) ** 0.5 for i in range(users)]
+    user_ids = [f"U{i:08d}" for i in range(users)]
+    batch = []
+    for user_id in rng.choices(user_ids, weights, k=attempts):
+        answered = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(NOW - rng.uniform(0, 60 * 86400)))
+        batch.append((user_id, rng.randint(1, 7), rng.randint(20, 60), 'A', rng.random() < 0.7, answered))
+        if len(batch) >= 50000:
+            conn.executemany(
+                "INSERT INTO quiz_attempts (line_user_id, chapter_id, section_id, user_answer, is_correct, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                batch
+            )
+            batch = []
+    if batch:
+        conn.executemany(
+            "INSERT INTO quiz_attempts (line_user_id, chapter_id, section_id, user_answer, is_correct, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            batch
+        )
+    conn.commit()
+    return user_ids
+
+
+def replay_due(conn, user_id):
+    """不使用排程表：讀出使用者全部作答紀錄重新計算到期題目"""
+    states = {}
+    for chapter_id, section_id, is_correct, answered_at in conn.execute(
+        """SELECT chapter_id, section_id, is_correct, CAST(strftime('%s', created_at) AS REAL)
+           FROM quiz_attempts WHERE line_user_id = ? ORDER BY id""", (user_id,)
+    ):
+        key = (chapter_id, section_id)
+        states[key] = next_state(states.get(key, NEW_STATE), bool(is_correct), answered_at)
+    due = sorted((state.due_at, key) for key, state in states.items() if state.due_at <= NOW)
+    return len(due), due[:1]
+
+
+def time_per_user(func, user_ids):
+    started = time.perf_counter()
+    for user_id in user_ids:
+        func(user_id)
+    return (time.perf_counter() - started) / len(user_ids) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--attempts', type=int, default=3000000)
+    parser.add_argument('--users', type=int, default=300000)
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, 'bench.db'))
+        print(f"建立 {args.attempts} 筆作答紀錄 ({args.users} 位使用者)...")
+        user_ids = populate(conn, args.attempts, args.users, args.seed)
+
+        started = time.perf_counter()
+        conn.execute(REVIEW_SCHEDULE_SCHEMA)
+        conn.execute(REVIEW_SCHEDULE_INDEX)
+        rows = rebuild_review_schedule(conn)
+        conn.commit()
+        print(f"回填 review_schedule: {rows} 列，{time.perf_counter() - started:.2f} s")
+
+        rng = random.Random(args.seed)
+        heavy = user_ids[:args.samples // 2]
+        typical = rng.sample(user_ids, args.samples // 2)
+        for label, sample in (("重度使用者", heavy), ("一般使用者", typical)):
+            replay_ms = time_per_user(lambda user_id: replay_due(conn, user_id), sample)
+            index_ms = time_per_user(
+                lambda user_id: (due_count(conn, user_id, NOW), due_items(conn, user_id, NOW)), sample)
+            print(f"{label}: 重播作答紀錄 {replay_ms:8.3f} ms/次  排程索引 {index_ms:8.3f} ms/次  "
+                  f"({replay_ms / index_ms:6.1f}x)")
+
+        started = time.perf_counter()
+        for user_id in typical:
+            record_answer(conn, user_id, 3, 40, rng.random() < 0.7, NOW)
+            conn.commit()
+        print(f"作答時更新排程: {(time.perf_counter() - started) / len(typical) * 1000:.3f} ms/次 (含 commit)")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_search.py - 全文檢索的建立時間與查詢延遲 (原始書籍與放大 N 倍的合成書籍)
+
+使用方法:
+  python benchmarks/bench_search.py --scale 100
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_bookpack import build_scaled_book
+from models.book_index import BookIndex
+from models.search_index import SearchIndex
+
+QUERIES = [
+    "according to", "age", "a piece of", "不可數名詞", "現在完成式",
+    "被動語態", "the", "的用法", "information", "xyzzy",
+]
+
+
+def measure(book, rounds):
+    index = BookIndex(book)
+    started = time.perf_counter()
+    search_index = SearchIndex(index)
+    build_s = time.perf_counter() - started
+
+    latencies = {}
+    for query in QUERIES:
+        samples = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            search_index.search(query)
+            samples.append((time.perf_counter() - started) * 1e6)
+        latencies[query] = samples
+    return len(search_index), len(search_index.postings), build_s, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--book', default=os.path.join(ROOT, 'book.json'))
+    parser.add_argument('--scale', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    with open(args.book, encoding='utf-8') as f:
+        book = json.load(f)
+
+    for label, data in (("1x", book), (f"{args.scale}x", build_scaled_book(args.book, args.scale))):
+        docs, terms, build_s, latencies = measure(data, args.rounds)
+        print(f"\n[{label}] {docs} 段 / {terms} 個索引詞, 建立索引 {build_s * 1000:.0f} ms")
+        print(f"  {'查詢':<16}{'p50 us':>10}{'p99 us':>10}")
+        for query, samples in latencies.items():
+            samples.sort()
+            p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+            print(f"  {query:<16}{statistics.median(samples):>10.1f}{p99:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
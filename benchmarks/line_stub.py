@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+line_stub.py - 本機模擬的 api.line.me
+記錄收到的請求與新建立的連線數，可注入固定延遲，供效能測試使用；
+on_request(method, path, body, received_at) 會在每個請求寫入紀錄時呼叫。
+帶有 X-Line-Retry-Key 的請求與 LINE 相同，同一個 key 第二次送出時回應 409；
+fail_next() 讓接下來的請求回應指定的錯誤，requests 只記錄成功的請求
+"""
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY_RESPONSE = json.dumps({"sentMessages": [{"id": "1", "quoteToken": "stub"}]}).encode('utf-8')
+
+
+class LineStubServer:
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, on_request=None):
+        self.latency = latency
+        self.on_request = on_request
+        self.requests = []
+        self.connections = 0
+        self.retry_keys = set()
+        self.rejected = 0
+        self._failures = []
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with stub._lock:
+                    stub.connections += 1
+
+            def _respond(self, status, body):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                if stub.latency:
+                    time.sleep(stub.latency)
+                status = stub.check(self.path, self.headers.get('X-Line-Retry-Key'))
+                if status != 200:
+                    self._respond(status, json.dumps({"message": "stub error"}).encode('utf-8'))
+                    return
+                stub.record('POST', self.path, body)
+                if self.path.startswith('/v2/bot/message/reply'):
+                    self._respond(200, REPLY_RESPONSE)
+                else:
+                    self._respond(200, b'{}')
+
+            def do_GET(self):
+                if stub.latency:
+                    time.sleep(stub.latency)
+                stub.record('GET', self.path, b'')
+                if self.path.startswith('/v2/bot/profile/'):
+                    user_id = self.path.rsplit('/', 1)[-1]
+                    body = json.dumps({"userId": user_id, "displayName": f"Stub_{user_id[-6:]}"})
+                    self._respond(200, body.encode('utf-8'))
+                else:
+                    self._respond(200, b'{}')
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, method, path, body):
+        received_at = time.perf_counter()
+        with self._lock:
+            self.requests.append((method, path, body))
+        if self.on_request is not None:
+            self.on_request(method, path, body, received_at)
+
+    def fail_next(self, count=1, status=500, path_prefix='/'):
+        """接下來 count 個路徑符合 path_prefix 的請求回應 status"""
+        with self._lock:
+            self._failures.extend([(path_prefix, status)] * count)
+
+    def check(self, path, retry_key=None):
+        """回傳此請求的狀態碼；成功時記下 retry key"""
+        with self._lock:
+            for index, (prefix, status) in enumerate(self._failures):
+                if path.startswith(prefix):
+                    del self._failures[index]
+                    self.rejected += 1
+                    return status
+            if retry_key is not None:
+                if retry_key in self.retry_keys:
+                    self.rejected += 1
+                    return 409
+                self.retry_keys.add(retry_key)
+        return 200
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset(self):
+        with self._lock:
+            self.requests = []
+            self.connections = 0
+            self.retry_keys = set()
+            self.rejected = 0
+            self._failures = []
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="本機 LINE API 模擬伺服器")
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency', type=float, default=0.0, help="每個請求的延遲秒數")
+    args = parser.parse_args()
+    stub = LineStubServer(port=args.port, latency=args.latency)
+    print(f"LINE API stub 執行於 {stub.url}")
+    stub.server.serve_forever()
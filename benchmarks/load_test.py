@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+load_test.py - 以簽章正確的 LINE webhook 對 /callback 進行壓力測試
+產生文字訊息、postback 與加入好友事件，同時啟動本機 LINE API 模擬伺服器接收回覆，
+統計各事件類型的 /callback 延遲、實際收到回覆的延遲、吞吐量與錯誤率
+
+使用方法:
+  # 自動啟動 gunicorn (可一次比較多種 worker 模式與 worker 數)
+  python benchmarks/load_test.py --spawn --workers 1,2,4 --concurrency 16 --duration 20
+  python benchmarks/load_test.py --spawn --profiles sync,gthread,gevent --workers 2 --stub-latency 0.1
+
+  # 對已啟動的服務施壓 (服務需設定 LINE_API_HOST=http://127.0.0.1:8090 與相同的 CHANNEL_SECRET)
+  python benchmarks/load_test.py --target http://127.0.0.1:10000 --stub-port 8090 --secret <secret>
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import math
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.line_stub import LineStubServer
+from utils.postback_codec import encode_postback
+
+DEFAULT_SECRET = 'loadtest-channel-secret'
+
+Sample = namedtuple('Sample', ['event_type', 'status', 'started', 'finished', 'reply_token'])
+
+MESSAGE_TEXTS = [
+    "閱讀內容", "n", "n", "n", "b", "下一段", "3", "第5章", "章節選擇", "我的書籤",
+    "上次進度", "本章測驗", "錯誤分析", "學習進度", "狀態", "幫助", "搜尋 according to",
+    "跳到第2章第3段", "hello",
+]
+
+
+def sign(body, secret):
+    digest = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode('ascii')
+
+
+class WebhookFactory:
+    """產生與 LINE 平台格式相同的 webhook 內容"""
+
+    def __init__(self, book, users, seed=42):
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.users = [f"U{uuid.UUID(int=random.Random(seed + i).getrandbits(128)).hex}" for i in range(users)]
+        self.content = []
+        self.quizzes = []
+        for chapter in book.get('chapters', []):
+            for section in chapter.get('sections', []):
+                key = (chapter['chapter_id'], section['section_id'])
+                if section['type'] == 'quiz':
+                    self.quizzes.append(key + (list(section['content']['options']),))
+                else:
+                    self.content.append(key)
+
+    def _event(self, event_type, user_id, **fields):
+        event = {
+            "type": event_type,
+            "mode": "active",
+            "timestamp": int(time.time() * 1000),
+            "source": {"type": "user", "userId": user_id},
+            "webhookEventId": uuid.uuid4().hex.upper()[:26],
+            "deliveryContext": {"isRedelivery": False},
+            "replyToken": uuid.uuid4().hex,
+        }
+        event.update(fields)
+        return event
+
+    def build(self, event_type, user_id=None):
+        """回傳 (事件類型, body bytes, reply token)"""
+        with self.lock:
+            rng = self.rng
+            user_id = user_id or rng.choice(self.users)
+            if event_type == 'message':
+                text = rng.choice(MESSAGE_TEXTS)
+                event = self._event('message', user_id, message={
+                    "type": "text", "id": str(rng.getrandbits(60)), "quoteToken": uuid.uuid4().hex, "text": text
+                })
+            elif event_type == 'postback':
+                kind = rng.random()
+                if kind < 0.6 and self.content:
+                    chapter_id, section_id = rng.choice(self.content)
+                    data = encode_postback('navigate', chapter_id, section_id)
+                elif kind < 0.9 and self.quizzes:
+                    chapter_id, section_id, options = rng.choice(self.quizzes)
+                    data = encode_postback('submit_answer', chapter_id, section_id, rng.choice(options))
+                elif self.content:
+                    chapter_id, section_id = rng.choice(self.content)
+                    data = encode_postback('add_bookmark', chapter_id, section_id)
+                else:
+                    data = encode_postback('show_chapter_menu')
+                event = self._event('postback', user_id, postback={"data": data})
+            elif event_type == 'follow':
+                event = self._event('follow', user_id, follow={"isUnblocked": False})
+            else:
+                raise ValueError(f"unknown event type: {event_type}")
+        body = json.dumps({"destination": "Uloadtestbot", "events": [event]}, ensure_ascii=False)
+        return event_type, body.encode('utf-8'), event['replyToken']
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    # nearest-rank
+    rank = math.ceil(pct / 100.0 * len(ordered))
+    return ordered[max(0, rank - 1)]
+
+
+class ReplyTracker:
+    """由 LINE API 模擬伺服器收到的 reply 請求記錄每個 reply token 的回覆時間"""
+
+    def __init__(self):
+        self.replied = {}
+        self.api_calls = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def __call__(self, method, path, body, received_at):
+        token = None
+        if path.startswith('/v2/bot/message/reply') and body:
+            try:
+                token = json.loads(body).get('replyToken')
+            except ValueError:
+                pass
+        endpoint = path.split('?', 1)[0]
+        for prefix in ('/v2/bot/profile/', '/v2/bot/user/'):
+            if endpoint.startswith(prefix):
+                endpoint = prefix + '*'
+        with self.lock:
+            self.api_calls[f"{method} {endpoint}"] += 1
+            if token:
+                self.replied.setdefault(token, received_at)
+
+
+def run_load(target, secret, factory, mix, concurrency, duration, total, timeout):
+    """送出 webhook 直到時間或數量用完，回傳每個請求的紀錄"""
+    results = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration if duration else None
+    counter = {"sent": 0}
+    event_types = list(mix)
+    weights = [mix[name] for name in event_types]
+    picker = random.Random(7)
+
+    def next_slot():
+        with lock:
+            if total and counter["sent"] >= total:
+                return None
+            if deadline and time.perf_counter() >= deadline:
+                return None
+            counter["sent"] += 1
+            return picker.choices(event_types, weights)[0]
+
+    def worker():
+        session = requests.Session()
+        local = []
+        while True:
+            event_type = next_slot()
+            if event_type is None:
+                break
+            event_type, body, reply_token = factory.build(event_type)
+            headers = {'Content-Type': 'application/json', 'X-Line-Signature': sign(body, secret)}
+            started = time.perf_counter()
+            try:
+                status = session.post(f"{target}/callback", data=body, headers=headers, timeout=timeout).status_code
+            except requests.RequestException:
+                status = None
+            finished = time.perf_counter()
+            local.append(Sample(event_type, status, started, finished, reply_token))
+        with lock:
+            results.extend(local)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    return results, time.perf_counter() - started
+
+
+def summarize(results, elapsed, tracker):
+    groups = defaultdict(list)
+    for record in results:
+        groups[record.event_type].append(record)
+    groups['all'] = results
+
+    rows = []
+    for name in ['message', 'postback', 'follow', 'all']:
+        records = groups.get(name)
+        if not records:
+            continue
+        errors = [r for r in records if r.status != 200]
+        callback_ms = [(r.finished - r.started) * 1000 for r in records if r.status == 200]
+        reply_ms = [(tracker.replied[r.reply_token] - r.started) * 1000
+                    for r in records if r.reply_token in tracker.replied]
+        rows.append({
+            "type": name,
+            "requests": len(records),
+            "throughput": len(records) / elapsed if elapsed else 0.0,
+            "error_rate": len(errors) / len(records),
+            "statuses": dict(sorted(
+                ((str(status), sum(1 for r in records if r.status == status)) for status in {r.status for r in records}),
+            )),
+            "callback_ms": {p: percentile(callback_ms, p) for p in (50, 95, 99)},
+            "reply_ms": {p: percentile(reply_ms, p) for p in (50, 95, 99)},
+            "reply_rate": len(reply_ms) / len(records),
+        })
+    return rows
+
+
+def print_report(title, rows, elapsed, tracker):
+    def fmt(value):
+        return f"{value:8.1f}" if value is not None else f"{'-':>8}"
+
+    print(f"\n=== {title} ({elapsed:.1f} s) ===")
+    print(f"{'事件':<10}{'請求數':>8}{'req/s':>9}{'錯誤率':>8}"
+          f"{'cb p50':>9}{'cb p95':>9}{'cb p99':>9}{'回覆率':>8}{'rp p50':>9}{'rp p95':>9}{'rp p99':>9}")
+    for row in rows:
+        cb, rp = row["callback_ms"], row["reply_ms"]
+        print(f"{row['type']:<10}{row['requests']:>8}{row['throughput']:>9.1f}{row['error_rate']:>8.1%}"
+              f"{fmt(cb[50])} {fmt(cb[95])} {fmt(cb[99])}{row['reply_rate']:>8.1%}"
+              f"{fmt(rp[50])} {fmt(rp[95])} {fmt(rp[99])}")
+        if row['error_rate']:
+            print(f"{'':<10}狀態碼: {row['statuses']}")
+    print("LINE API 呼叫: " + ", ".join(f"{k} x{v}" for k, v in sorted(tracker.api_calls.items())))
+    print("(cb = /callback 回應時間, rp = 送出 webhook 到 LINE API 收到回覆的時間, 單位 ms)")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{url}/ping", timeout=1).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def spawn_app(profile, workers, args, stub_url, workdir):
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        'CHANNEL_SECRET': args.secret,
+        'CHANNEL_ACCESS_TOKEN': 'loadtest-access-token',
+        'MAIN_RICH_MENU_ID': 'richmenu-loadtest',
+        'LINE_API_HOST': stub_url,
+        'DATABASE_NAME': os.path.join(workdir, f'loadtest-{profile}-{workers}.db'),
+        'BOOK_PATH': os.path.abspath(args.book),
+        'BOOK_WATCH_INTERVAL': '0',
+        'WEBHOOK_MODE': args.webhook_mode,
+        'WORKER_PROFILE': profile,
+        'PYTHONUNBUFFERED': '1',
+    })
+    command = [
+        sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+        '--chdir', ROOT, '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+        '--access-logfile', os.devnull, '--log-level', 'warning',
+        'asgi:app' if profile == 'asgi' else 'app:app'
+    ]
+    log = open(os.path.join(workdir, f'gunicorn-{profile}-{workers}.log'), 'w')
+    process = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{port}"
+    if not wait_ready(url):
+        process.kill()
+        raise RuntimeError(f"gunicorn did not start, see {log.name}")
+    return process, url
+
+
+def stop_app(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def run_scenario(title, target, args, factory, tracker):
+    if args.warmup:
+        # 先讓每位模擬使用者加入好友，建立使用者資料
+        for user_id in factory.users:
+            _, body, _ = factory.build('follow', user_id)
+            requests.post(f"{target}/callback", data=body,
+                          headers={'Content-Type': 'application/json', 'X-Line-Signature': sign(body, args.secret)},
+                          timeout=args.timeout)
+        time.sleep(args.grace)
+    with tracker.lock:
+        tracker.replied.clear()
+        tracker.api_calls.clear()
+
+    results, elapsed = run_load(target, args.secret, factory, parse_mix(args.mix),
+                                args.concurrency, args.duration, args.requests, args.timeout)
+    # 非同步模式下回覆在 /callback 回應後才送出，等待剩餘的回覆
+    time.sleep(args.grace)
+    rows = summarize(results, elapsed, tracker)
+    print_report(title, rows, elapsed, tracker)
+    return {"title": title, "elapsed": elapsed, "rows": rows, "api_calls": dict(tracker.api_calls)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--target', help="已啟動服務的網址，未指定時需使用 --spawn")
+    parser.add_argument('--spawn', action='store_true', help="以 gunicorn 啟動 app")
+    parser.add_argument('--workers', default='2', help="--spawn 時的 worker 數，可用逗號列出多個")
+    parser.add_argument('--profiles', default='gthread',
+                        help="--spawn 時的 WORKER_PROFILE (sync/gthread/gevent)，可用逗號列出多個")
+    parser.add_argument('--webhook-mode', default='sync', choices=['sync', 'async'])
+    parser.add_argument('--secret', default=DEFAULT_SECRET)
+    parser.add_argument('--book', default=os.path.join(ROOT, 'book.json'))
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--mix', default='message=60,postback=35,follow=5')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20.0, help="秒數；0 表示以 --requests 為準")
+    parser.add_argument('--requests', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--stub-port', type=int, default=0)
+    parser.add_argument('--stub-latency', type=float, default=0.0, help="LINE API 模擬延遲 (秒)")
+    parser.add_argument('--grace', type=float, default=2.0, help="結束後等待回覆的秒數")
+    parser.add_argument('--no-warmup', dest='warmup', action='store_false')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help="將結果寫入 JSON 檔")
+    args = parser.parse_args()
+
+    if not args.target and not args.spawn:
+        parser.error("需指定 --target 或 --spawn")
+    if not args.duration and not args.requests:
+        parser.error("--duration 為 0 時需指定 --requests")
+
+    with open(args.book, encoding='utf-8') as f:
+        book = json.load(f)
+    tracker = ReplyTracker()
+    stub = LineStubServer(port=args.stub_port, latency=args.stub_latency, on_request=tracker).start()
+    print(f"LINE API stub: {stub.url} (延遲 {args.stub_latency * 1000:.0f} ms)")
+
+    reports = []
+    try:
+        if args.spawn:
+            with tempfile.TemporaryDirectory() as workdir:
+                for profile in args.profiles.split(','):
+                    for workers in [int(w) for w in args.workers.split(',')]:
+                        factory = WebhookFactory(book, args.users, args.seed)
+                        process, url = spawn_app(profile, workers, args, stub.url, workdir)
+                        try:
+                            title = f"{profile} x {workers} workers, {args.webhook_mode}, 併發 {args.concurrency}"
+                            reports.append(run_scenario(title, url, args, factory, tracker))
+                        finally:
+                            stop_app(process)
+        else:
+            factory = WebhookFactory(book, args.users, args.seed)
+            reports.append(run_scenario(args.target, args.target.rstrip('/'), args, factory, tracker))
+    finally:
+        stub.stop()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+"""
+bookpack - 由 book.json 編譯的二進位內容包
+內容包以 mmap 唯讀開啟，所有 gunicorn worker 透過作業系統的 page cache 共用同一份內容，
+載入時只需讀取檔頭，段落內容在需要時才解碼
+
+編譯:
+  python -m bookpack compile book.json [-o book.pack]
+"""
+from bookpack.format import BookPackError, FORMAT_VERSION
+from bookpack.writer import compile_book, write_pack
+from bookpack.reader import BookPack
+
+__all__ = ['BookPack', 'BookPackError', 'FORMAT_VERSION', 'compile_book', 'write_pack']
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+使用方法:
+  python -m bookpack compile book.json [-o book.pack]
+  python -m bookpack info book.pack
+"""
+import argparse
+import sys
+
+from bookpack.format import BookPackError
+from bookpack.reader import BookPack
+from bookpack.writer import compile_book
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bookpack', description="book.json 內容包工具")
+    commands = parser.add_subparsers(dest='command', required=True)
+    compile_parser = commands.add_parser('compile', help="將 book.json 編譯成內容包")
+    compile_parser.add_argument('source')
+    compile_parser.add_argument('-o', '--output')
+    compile_parser.add_argument('--no-validate', action='store_true')
+    info_parser = commands.add_parser('info', help="顯示內容包資訊")
+    info_parser.add_argument('pack')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'compile':
+            path, stats = compile_book(args.source, args.output, validate=not args.no_validate)
+            print(f"✅ {path}: {stats['chapters']} 章 / {stats['sections']} 段 / "
+                  f"{stats['options']} 選項 / {stats['strings']} 字串, {stats['bytes']} bytes")
+        else:
+            pack = BookPack(args.pack)
+            print(f"{args.pack}: 版本 {pack.version}, {pack.chapter_count} 章 / "
+                  f"{pack.section_count} 段 / {pack.option_count} 選項 / {pack.string_count} 字串")
+            pack.close()
+    except BookPackError as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
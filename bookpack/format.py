@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+format.py - 內容包的二進位格式 (little-endian)
+
+  檔頭
+  章節表    每章: chapter_id, 標題, 圖片網址, 第一個段落索引, 段落數
+  段落表    每段: section_id, 類型, 內容/題目, 答案, 第一個選項索引, 選項數
+  選項表    每個選項: 代號, 文字
+  字串表    每個字串: 在字串資料中的位移與長度 (相同字串只存一次)
+  字串資料  UTF-8
+"""
+import struct
+
+MAGIC = b'BKPK'
+FORMAT_VERSION = 1
+
+# magic, 格式版本, 保留, 章節數, 段落數, 選項數, 字串數,
+# 章節表/段落表/選項表/字串表/字串資料的位移, 原始 book.json 的 sha256
+HEADER = struct.Struct('<4sHHIIIIQQQQQ32s')
+CHAPTER = struct.Struct('<IIIII')
+SECTION = struct.Struct('<IB3xIIII')
+OPTION = struct.Struct('<II')
+STRING = struct.Struct('<QI')
+
+NO_STRING = 0xFFFFFFFF
+
+SECTION_TYPES = ['content', 'quiz']
+SECTION_TYPE_CODES = {name: code for code, name in enumerate(SECTION_TYPES)}
+
+
+class BookPackError(Exception):
+    pass
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+reader.py - 以 mmap 讀取內容包
+章節與段落以唯讀的 Mapping 呈現，介面與 book.json 解析後的 dict 相同，
+BookIndex 與 RenderCache 不需區分資料來源；字串在讀取欄位時才解碼
+"""
+import mmap
+import weakref
+from collections.abc import Mapping
+
+from bookpack.format import (
+    MAGIC, FORMAT_VERSION, HEADER, CHAPTER, SECTION, OPTION, STRING,
+    NO_STRING, SECTION_TYPES, BookPackError
+)
+
+
+class BookPack:
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            try:
+                self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise BookPackError(f"empty book pack: {path}")
+        # 最後一個參照釋放時關閉 mmap (例如重新載入後舊版本不再使用)
+        self._close = weakref.finalize(self, self._buffer.close)
+        if len(self._buffer) < HEADER.size:
+            raise BookPackError(f"truncated book pack: {path}")
+        (magic, version, _, self.chapter_count, self.section_count, self.option_count,
+         self.string_count, self._chapter_offset, self._section_offset, self._option_offset,
+         self._string_offset, self._data_offset, digest) = HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC:
+            raise BookPackError(f"not a book pack: {path}")
+        if version != FORMAT_VERSION:
+            raise BookPackError(f"unsupported book pack version {version}")
+        self.source_digest = digest
+
+    @property
+    def chapters(self):
+        # 章節參照 pack，pack 不保留章節，避免循環參照；
+        # 舊版本的最後一個讀取者釋放後 mmap 立即關閉，不必等循環垃圾回收
+        return [PackedChapter(self, i) for i in range(self.chapter_count)]
+
+    @property
+    def version(self):
+        """與 book.json 內容雜湊相同的版本字串"""
+        return self.source_digest.hex()[:12]
+
+    def string(self, string_id):
+        if string_id == NO_STRING:
+            return None
+        offset, length = STRING.unpack_from(self._buffer, self._string_offset + string_id * STRING.size)
+        start = self._data_offset + offset
+        return self._buffer[start:start + length].decode('utf-8')
+
+    def chapter_record(self, index):
+        return CHAPTER.unpack_from(self._buffer, self._chapter_offset + index * CHAPTER.size)
+
+    def section_record(self, index):
+        return SECTION.unpack_from(self._buffer, self._section_offset + index * SECTION.size)
+
+    def option_record(self, index):
+        return OPTION.unpack_from(self._buffer, self._option_offset + index * OPTION.size)
+
+    def as_book(self):
+        """回傳與 book.json 相同結構的資料"""
+        return {"chapters": self.chapters}
+
+    def close(self):
+        self._close()
+
+
+class PackedChapter(Mapping):
+    __slots__ = ('pack', 'chapter_id', '_title', '_image_url', '_first', '_count')
+
+    KEYS = ('chapter_id', 'title', 'image_url', 'sections')
+
+    def __init__(self, pack, index):
+        self.pack = pack
+        self.chapter_id, self._title, self._image_url, self._first, self._count = pack.chapter_record(index)
+
+    def __getitem__(self, key):
+        if key == 'chapter_id':
+            return self.chapter_id
+        if key == 'title':
+            return self.pack.string(self._title)
+        if key == 'image_url':
+            if self._image_url == NO_STRING:
+                raise KeyError(key)
+            return self.pack.string(self._image_url)
+        if key == 'sections':
+            return [PackedSection(self.pack, i) for i in range(self._first, self._first + self._count)]
+        raise KeyError(key)
+
+    def __iter__(self):
+        return (key for key in self.KEYS if key != 'image_url' or self._image_url != NO_STRING)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class PackedSection(Mapping):
+    __slots__ = ('pack', 'section_id', 'type', '_text', '_answer', '_option_start', '_option_count')
+
+    KEYS = ('section_id', 'type', 'content')
+
+    def __init__(self, pack, index):
+        self.pack = pack
+        (self.section_id, type_code, self._text, self._answer,
+         self._option_start, self._option_count) = pack.section_record(index)
+        self.type = SECTION_TYPES[type_code]
+
+    def __getitem__(self, key):
+        if key == 'section_id':
+            return self.section_id
+        if key == 'type':
+            return self.type
+        if key == 'content':
+            if self.type == 'quiz':
+                return PackedQuiz(self)
+            return self.pack.string(self._text)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+
+class PackedQuiz(Mapping):
+    __slots__ = ('section',)
+
+    KEYS = ('question', 'options', 'answer')
+
+    def __init__(self, section):
+        self.section = section
+
+    def __getitem__(self, key):
+        section = self.section
+        pack = section.pack
+        if key == 'question':
+            return pack.string(section._text)
+        if key == 'answer':
+            return pack.string(section._answer)
+        if key == 'options':
+            options = {}
+            for i in range(section._option_start, section._option_start + section._option_count):
+                option_key, option_value = pack.option_record(i)
+                options[pack.string(option_key)] = pack.string(option_value)
+            return options
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
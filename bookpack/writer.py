@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+writer.py - 將 book.json 編譯成內容包
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+from bookpack.format import (
+    MAGIC, FORMAT_VERSION, HEADER, CHAPTER, SECTION, OPTION, STRING,
+    NO_STRING, SECTION_TYPE_CODES, BookPackError
+)
+from validate_book import BookValidator
+
+
+class _StringTable:
+    """相同的字串只保存一次"""
+
+    def __init__(self):
+        self.ids = {}
+        self.entries = []
+        self.data = bytearray()
+
+    def add(self, value):
+        if value is None:
+            return NO_STRING
+        string_id = self.ids.get(value)
+        if string_id is None:
+            encoded = value.encode('utf-8')
+            string_id = len(self.entries)
+            self.ids[value] = string_id
+            self.entries.append((len(self.data), len(encoded)))
+            self.data += encoded
+        return string_id
+
+
+def write_pack(data, pack_path, source_digest=b''):
+    """將已解析的書籍內容寫成內容包，先寫入暫存檔再以 os.replace 替換"""
+    strings = _StringTable()
+    chapters = bytearray()
+    sections = bytearray()
+    options = bytearray()
+    section_count = 0
+    option_count = 0
+
+    for chapter in data.get('chapters', []):
+        chapter_sections = chapter.get('sections', [])
+        chapters += CHAPTER.pack(
+            chapter['chapter_id'],
+            strings.add(chapter.get('title', '')),
+            strings.add(chapter.get('image_url')),
+            section_count,
+            len(chapter_sections)
+        )
+        for section in chapter_sections:
+            section_type = SECTION_TYPE_CODES.get(section['type'])
+            if section_type is None:
+                raise BookPackError(f"unknown section type: {section['type']}")
+            content = section['content']
+            if section['type'] == 'quiz':
+                text, answer = content['question'], content['answer']
+                quiz_options = list(content['options'].items())
+            else:
+                text, answer, quiz_options = content, None, []
+            sections += SECTION.pack(
+                section['section_id'], section_type,
+                strings.add(text), strings.add(answer),
+                option_count, len(quiz_options)
+            )
+            for key, value in quiz_options:
+                options += OPTION.pack(strings.add(key), strings.add(value))
+            option_count += len(quiz_options)
+            section_count += 1
+
+    string_table = b''.join(STRING.pack(offset, length) for offset, length in strings.entries)
+    chapter_offset = HEADER.size
+    section_offset = chapter_offset + len(chapters)
+    option_offset = section_offset + len(sections)
+    string_offset = option_offset + len(options)
+    data_offset = string_offset + len(string_table)
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, 0,
+        len(data.get('chapters', [])), section_count, option_count, len(strings.entries),
+        chapter_offset, section_offset, option_offset, string_offset, data_offset,
+        source_digest.ljust(32, b'\0')
+    )
+
+    directory = os.path.dirname(os.path.abspath(pack_path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.bookpack-', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for part in (header, chapters, sections, options, string_table, strings.data):
+                f.write(part)
+        os.chmod(tmp_path, 0o644)
+        # 直接覆寫會破壞其他行程正在 mmap 的內容，改以 rename 替換
+        os.replace(tmp_path, pack_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return {
+        "chapters": len(data.get('chapters', [])),
+        "sections": section_count,
+        "options": option_count,
+        "strings": len(strings.entries),
+        "bytes": data_offset + len(strings.data),
+    }
+
+
+def compile_book(json_path, pack_path=None, validate=True):
+    """讀取、驗證並編譯 book.json，回傳 (內容包路徑, 統計資料)"""
+    if pack_path is None:
+        pack_path = os.path.splitext(json_path)[0] + '.pack'
+    try:
+        with open(json_path, 'rb') as f:
+            raw = f.read()
+        data = json.loads(raw.decode('utf-8'))
+    except Exception as e:
+        raise BookPackError(f"cannot load {json_path}: {e}")
+    if validate:
+        validator = BookValidator()
+        if not validator.validate_data(data):
+            raise BookPackError("; ".join(validator.errors[:5]))
+    stats = write_pack(data, pack_path, hashlib.sha256(raw).digest())
+    return pack_path, stats
@@ -7,6 +7,7 @@ import os
 import json
 import requests
 import time
+from utils.postback_codec import encode_postback
 
 # === 請填寫您的 Channel Access Token ===
 CHANNEL_ACCESS_TOKEN = "5BvBNjyt6NrqujdHjczXYOSYvbF/WQIbhzsnrJKzcHqBoc2n12y34Ccc5IzOWRsKe/zqRtZuSprwjBlYR9PcPbO2PH/s8ZVsaBNMIXrU7GyAqpDSTrWaGbQbdg8vBd27ynXcqOKT8UfSC4r1gBwynwdB04t89/1O/w1cDnyilFU="
@@ -36,38 +37,38 @@ UNIFIED_MENU_CONFIG = {
         # 閱讀內容 (左上)
         {
             "bounds": {"x": 20, "y": 47, "width": 240, "height": 88}, 
-            "action": {"type": "postback", "data": "action=read_content"}
+            "action": {"type": "postback", "data": encode_postback('read_content')}
         },
         
         # 章節選擇 (中上)
         {
             "bounds": {"x": 280, "y": 47, "width": 240, "height": 88}, 
-            "action": {"type": "postback", "data": "action=show_chapter_menu"}
+            "action": {"type": "postback", "data": encode_postback('show_chapter_menu')}
         },
         
         # 我的書籤 (右上)
         {
             "bounds": {"x": 540, "y": 47, "width": 240, "height": 88}, 
-            "action": {"type": "postback", "data": "action=view_bookmarks"}
+            "action": {"type": "postback", "data": encode_postback('view_bookmarks')}
         },
         
         # === 第二排 (下排) ===
         # 上次進度 (左下)
         {
             "bounds": {"x": 20, "y": 153, "width": 240, "height": 88}, 
-            "action": {"type": "postback", "data": "action=continue_reading"}
+            "action": {"type": "postback", "data": encode_postback('continue_reading')}
         },
         
         # 本章測驗題 (中下)
         {
             "bounds": {"x": 280, "y": 153, "width": 240, "height": 88}, 
-            "action": {"type": "postback", "data": "action=chapter_quiz"}
+            "action": {"type": "postback", "data": encode_postback('chapter_quiz')}
         },
         
         # 錯誤分析 (右下)
         {
             "bounds": {"x": 540, "y": 153, "width": 240, "height": 88}, 
-            "action": {"type": "postback", "data": "action=view_analytics"}
+            "action": {"type": "postback", "data": encode_postback('view_analytics')}
         }
     ]
 }
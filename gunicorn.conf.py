@@ -1,10 +1,49 @@
 import os
+import sys
+
+# WORKER_PROFILE 選擇 worker 模式：
+#   gthread: 每個 worker 多個執行緒，等待 LINE API 時其他執行緒繼續處理 (預設)
+#   gevent:  協程，適合 LINE API 延遲高、同時連線多的情況 (使用 gevent)
+#   sync:    每個 worker 一次處理一個請求
+#   asgi:    asgi.py 以 asyncio 處理 /callback (使用 uvicorn 的 UvicornWorker)
+# 各模式需要的 gevent、uvicorn 都固定在 requirements.txt，部署時不需另外安裝
+# 啟動指令不指定 app，由此設定依 WORKER_PROFILE 選擇 app:app 或 asgi:app：
+#   gunicorn -c gunicorn.conf.py
+#   WORKER_PROFILE=asgi gunicorn -c gunicorn.conf.py
+# WEB_CONCURRENCY、GUNICORN_THREADS、GUNICORN_WORKER_CONNECTIONS 可覆寫個別數值
+# 預設值依 benchmarks/load_test.py 的結果 (2 workers、併發 32、LINE API 延遲 100ms)：
+#   sync 16 req/s、gthread 16 執行緒 182 req/s、gevent 148 req/s
+WORKER_PROFILES = {
+    'sync': {'worker_class': 'sync', 'workers': 4, 'threads': 1, 'worker_connections': 1000},
+    'gthread': {'worker_class': 'gthread', 'workers': 2, 'threads': 16, 'worker_connections': 1000},
+    'gevent': {'worker_class': 'gevent', 'workers': 2, 'threads': 1, 'worker_connections': 100},
+    'asgi': {'worker_class': 'uvicorn.workers.UvicornWorker', 'workers': 2, 'threads': 1,
+             'worker_connections': 1000},
+}
+
+profile = os.environ.get('WORKER_PROFILE', 'gthread').lower()
+if profile not in WORKER_PROFILES:
+    raise RuntimeError(f"unknown WORKER_PROFILE: {profile}")
+settings = WORKER_PROFILES[profile]
 
 bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
-workers = 4
-worker_class = "sync"
-worker_connections = 1000
-threads = 1
+worker_class = settings['worker_class']
+workers = int(os.environ.get('WEB_CONCURRENCY', settings['workers']))
+threads = int(os.environ.get('GUNICORN_THREADS', settings['threads']))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', settings['worker_connections']))
+
+# 命令列指定的 app (例如 gunicorn app:app) 優先於此設定，asgi 模式下於 on_starting 檢查
+wsgi_app = 'asgi:app' if profile == 'asgi' else 'app:app'
+
+if worker_class == 'gevent':
+    # preload_app 會在 fork 前匯入 app，必須在此之前替換標準函式庫，
+    # 讓 app 建立的鎖、佇列、背景執行緒與 socket 都是協程版本
+    from gevent import monkey
+    monkey.patch_all()
+
+# app 依此調整連線池大小，並在 gevent 下啟用 SQLite 的 cooperative 寫入模式
+os.environ['WORKER_CLASS'] = worker_class
+os.environ['WORKER_CONCURRENCY'] = str(worker_connections if worker_class == 'gevent' else threads)
 
 timeout = 120
 keepalive = 2
@@ -17,3 +56,25 @@ max_requests_jitter = 50
 accesslog = "-"
 errorlog = "-"
 loglevel = "info"
+
+
+def on_starting(server):
+    # UvicornWorker 載入 WSGI 的 app:app 會在第一個請求時才失敗，啟動時就停止
+    if profile == 'asgi' and server.app.app_uri != wsgi_app:
+        raise RuntimeError(f"WORKER_PROFILE=asgi requires {wsgi_app}, got {server.app.app_uri}; "
+                           f"start with: gunicorn -c gunicorn.conf.py")
+
+
+def post_worker_init(worker):
+    # 每個 worker 啟動背景工作執行緒，處理重新啟動前尚未完成的工作
+    app_module = sys.modules.get('app')
+    if app_module is not None:
+        app_module.job_queue.start()
+
+
+def worker_exit(server, worker):
+    # 結束 worker 前處理完背景佇列中的事件，並寫入尚未寫入的使用者更新
+    app_module = sys.modules.get('app')
+    if app_module is not None:
+        app_module.event_queue.shutdown(timeout=graceful_timeout)
+        app_module.user_write_buffer.flush()
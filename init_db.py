@@ -3,9 +3,255 @@
 import sqlite3
 import os
 import sys
+import time
 from datetime import datetime
 
+from models.review_schedule import rebuild_review_schedule
+from utils.attempt_archive import AttemptArchive, attempt_sources, attempt_totals, default_archive_dir
+from utils.db_backup import online_backup, rotate_backups, BackupError
+from utils.db_pool import SQLitePool
+from utils.maintenance import MaintenanceScheduler, CleanupRule
+
 DATABASE_NAME = 'linebot.db'
+ATTEMPT_ARCHIVE_DIR = os.environ.get('ATTEMPT_ARCHIVE_DIR') or default_archive_dir(DATABASE_NAME)
+ATTEMPT_HOT_DAYS = int(os.environ.get('ATTEMPT_HOT_DAYS', '90'))
+# 線上備份每次複製的頁數與之間暫停的秒數，自動命名的備份只保留最新 BACKUP_KEEP 份
+BACKUP_PAGES = int(os.environ.get('BACKUP_PAGES', '256'))
+BACKUP_SLEEP = float(os.environ.get('BACKUP_SLEEP', '0.01'))
+BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', '7'))
+# cleanup 每批刪除持有寫入鎖的目標上限 (毫秒)
+MAINTENANCE_MAX_LOCK_MS = float(os.environ.get('MAINTENANCE_MAX_LOCK_MS', '50'))
+MAINTENANCE_BATCH_SIZE = int(os.environ.get('MAINTENANCE_BATCH_SIZE', '500'))
+
+# 推播紀錄與失敗的背景工作保留天數 (完成的背景工作由 JobQueue 自行清除)
+PUSH_RETENTION_DAYS = int(os.environ.get('PUSH_RETENTION_DAYS', '30'))
+FAILED_JOB_RETENTION_DAYS = int(os.environ.get('FAILED_JOB_RETENTION_DAYS', '30'))
+# 建立後這麼多天仍未完成 (finished_at 為 NULL) 的推播視為中斷，不再以同一 run_key 續傳
+PUSH_ABANDONED_DAYS = int(os.environ.get('PUSH_ABANDONED_DAYS', '7'))
+
+# app.py 的背景維護與 cleanup 指令共用；推播紀錄連同每次 multicast 的收件者清單一起刪除
+MAINTENANCE_RULES = [
+    CleanupRule('user_actions', 'user_actions', 'timestamp', lambda now: now - 86400),
+    CleanupRule('push_runs', 'push_runs', 'finished_at', lambda now: now - PUSH_RETENTION_DAYS * 86400,
+                key='id', cascade=(('push_batches', 'run_id'),)),
+    CleanupRule('abandoned_push_runs', 'push_runs', 'created_at', lambda now: now - PUSH_ABANDONED_DAYS * 86400,
+                where="finished_at IS NULL", key='id', cascade=(('push_batches', 'run_id'),)),
+    CleanupRule('failed_jobs', 'jobs', 'updated_at', lambda now: now - FAILED_JOB_RETENTION_DAYS * 86400,
+                where="status = 'failed'"),
+]
+
+# 非活躍使用者連同其統計、複習排程與書籤一起刪除 (作答紀錄保留)
+CLEANUP_RULES = MAINTENANCE_RULES + [
+    CleanupRule('users', 'users', 'last_active',
+                lambda now: time.strftime('%Y-%m-%d', time.gmtime(now - 90 * 86400)),
+                key='line_user_id',
+                cascade=(('user_stats', 'line_user_id'), ('user_question_stats', 'line_user_id'),
+                         ('review_schedule', 'line_user_id'), ('bookmarks', 'line_user_id'))),
+]
+
+USER_STATS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS user_stats (
+        line_user_id TEXT PRIMARY KEY,
+        bookmark_count INTEGER NOT NULL DEFAULT 0,
+        attempt_count INTEGER NOT NULL DEFAULT 0,
+        correct_count INTEGER NOT NULL DEFAULT 0
+    )
+'''
+
+def _accumulate(conn, source, select, upsert, batch_size=5000):
+    """把 source 上彙總查詢的結果分批累加到 conn 的統計表"""
+    cursor = source.execute(select)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        conn.executemany(upsert, rows)
+
+def rebuild_user_stats(conn, archive=None):
+    """由 bookmarks 與 quiz_attempts (含封存檔) 重新計算每位使用者的統計數字"""
+    conn.execute("DELETE FROM user_stats")
+    conn.execute('''
+        INSERT INTO user_stats (line_user_id, bookmark_count)
+        SELECT line_user_id, COUNT(*) FROM bookmarks GROUP BY line_user_id
+    ''')
+    for source in attempt_sources(conn, archive):
+        _accumulate(conn, source, '''
+            SELECT line_user_id, COUNT(*), SUM(is_correct)
+            FROM quiz_attempts GROUP BY line_user_id
+        ''', '''
+            INSERT INTO user_stats (line_user_id, attempt_count, correct_count) VALUES (?, ?, ?)
+            ON CONFLICT(line_user_id) DO UPDATE SET
+                attempt_count = attempt_count + excluded.attempt_count,
+                correct_count = correct_count + excluded.correct_count
+        ''')
+    return conn.execute("SELECT COUNT(*) FROM user_stats").fetchone()[0]
+
+USER_QUESTION_STATS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS user_question_stats (
+        line_user_id TEXT NOT NULL,
+        chapter_id INTEGER NOT NULL,
+        section_id INTEGER NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        wrong INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (line_user_id, chapter_id, section_id)
+    ) WITHOUT ROWID
+'''
+
+# 涵蓋「最需要加強的題目」查詢所需的所有欄位，排序直接由索引提供
+USER_QUESTION_STATS_INDEX = '''
+    CREATE INDEX IF NOT EXISTS idx_user_question_stats_weakest
+    ON user_question_stats(line_user_id, wrong DESC, attempts, chapter_id, section_id)
+'''
+
+def rebuild_user_question_stats(conn, archive=None):
+    """由 quiz_attempts (含封存檔) 重新計算每位使用者每一題的作答與答錯次數"""
+    conn.execute("DELETE FROM user_question_stats")
+    for source in attempt_sources(conn, archive):
+        _accumulate(conn, source, '''
+            SELECT line_user_id, chapter_id, section_id, COUNT(*), SUM(is_correct = 0)
+            FROM quiz_attempts
+            GROUP BY line_user_id, chapter_id, section_id
+        ''', '''
+            INSERT INTO user_question_stats (line_user_id, chapter_id, section_id, attempts, wrong)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(line_user_id, chapter_id, section_id) DO UPDATE SET
+                attempts = attempts + excluded.attempts,
+                wrong = wrong + excluded.wrong
+        ''')
+    return conn.execute("SELECT COUNT(*) FROM user_question_stats").fetchone()[0]
+
+# 每位使用者每一題的複習排程 (models/review_schedule.py)
+REVIEW_SCHEDULE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS review_schedule (
+        line_user_id TEXT NOT NULL,
+        chapter_id INTEGER NOT NULL,
+        section_id INTEGER NOT NULL,
+        repetitions INTEGER NOT NULL DEFAULT 0,
+        interval_days REAL NOT NULL DEFAULT 0,
+        ease REAL NOT NULL DEFAULT 2.5,
+        lapses INTEGER NOT NULL DEFAULT 0,
+        due_at REAL NOT NULL,
+        PRIMARY KEY (line_user_id, chapter_id, section_id)
+    ) WITHOUT ROWID
+'''
+
+# 下一題複習與待複習題數只需在單一使用者的範圍內依 due_at 查詢
+REVIEW_SCHEDULE_INDEX = '''
+    CREATE INDEX IF NOT EXISTS idx_review_schedule_due
+    ON review_schedule(line_user_id, due_at)
+'''
+
+# 背景工作 (utils/job_queue.py)；status: pending / running / done / failed
+JOBS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        run_at REAL NOT NULL,
+        last_error TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )
+'''
+
+JOBS_INDEX = 'CREATE INDEX IF NOT EXISTS idx_jobs_status_run_at ON jobs(status, run_at)'
+# 清除完成與失敗的工作
+JOBS_UPDATED_INDEX = 'CREATE INDEX IF NOT EXISTS idx_jobs_status_updated_at ON jobs(status, updated_at)'
+
+def ensure_job_table(conn):
+    conn.execute(JOBS_SCHEMA)
+    conn.execute(JOBS_INDEX)
+    conn.execute(JOBS_UPDATED_INDEX)
+
+# 推播 (utils/push_engine.py)：每次推播一筆 push_runs，每次 multicast 一筆 push_batches；
+# push_batches.status: pending / sent / failed
+PUSH_RUNS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS push_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        run_key TEXT UNIQUE NOT NULL,
+        status TEXT NOT NULL DEFAULT 'sending',
+        batches INTEGER NOT NULL DEFAULT 0,
+        recipients INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        finished_at REAL
+    )
+'''
+
+PUSH_BATCHES_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS push_batches (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        run_id INTEGER NOT NULL,
+        retry_key TEXT NOT NULL,
+        messages TEXT NOT NULL,
+        user_ids TEXT NOT NULL,
+        recipients INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        first_attempt_at REAL,
+        last_error TEXT,
+        sent_at REAL
+    )
+'''
+
+PUSH_BATCHES_INDEX = 'CREATE INDEX IF NOT EXISTS idx_push_batches_run_status ON push_batches(run_id, status)'
+# 中斷的推播 (finished_at IS NULL) 也由這個索引找出
+PUSH_RUNS_FINISHED_INDEX = 'CREATE INDEX IF NOT EXISTS idx_push_runs_finished_at ON push_runs(finished_at)'
+
+# 學習提醒依 last_active 範圍挑選收件者，索引包含查詢所需的全部欄位，不必回表
+USERS_REMINDER_INDEX = '''
+    CREATE INDEX IF NOT EXISTS idx_users_reminder
+    ON users(last_active, current_chapter_id, line_user_id)
+'''
+
+def ensure_push_tables(conn):
+    conn.execute(PUSH_RUNS_SCHEMA)
+    conn.execute(PUSH_BATCHES_SCHEMA)
+    conn.execute(PUSH_BATCHES_INDEX)
+    conn.execute(PUSH_RUNS_FINISHED_INDEX)
+
+# 作答紀錄封存檔 (utils/attempt_archive.py)：每個月份一列，記錄封存檔涵蓋的時間範圍
+ATTEMPT_ARCHIVES_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS attempt_archives (
+        month TEXT PRIMARY KEY,
+        rows INTEGER NOT NULL DEFAULT 0,
+        first_at TEXT NOT NULL,
+        last_at TEXT NOT NULL,
+        archived_at REAL NOT NULL
+    )
+'''
+
+# 時間範圍查詢與封存都依 created_at 挑選作答紀錄
+QUIZ_ATTEMPTS_CREATED_AT_INDEX = '''
+    CREATE INDEX IF NOT EXISTS idx_quiz_attempts_created_at
+    ON quiz_attempts(created_at)
+'''
+
+def ensure_archive_tables(conn):
+    conn.execute(ATTEMPT_ARCHIVES_SCHEMA)
+    conn.execute(QUIZ_ATTEMPTS_CREATED_AT_INDEX)
+
+def get_attempt_archive():
+    return AttemptArchive(ATTEMPT_ARCHIVE_DIR, ATTEMPT_HOT_DAYS)
+
+# 由原始資料表彙總而來的統計表: (表格名稱, 建立語法, 重建函式)
+SUMMARY_TABLES = [
+    ('user_stats', [USER_STATS_SCHEMA], rebuild_user_stats),
+    ('user_question_stats', [USER_QUESTION_STATS_SCHEMA, USER_QUESTION_STATS_INDEX], rebuild_user_question_stats),
+    ('review_schedule', [REVIEW_SCHEDULE_SCHEMA, REVIEW_SCHEDULE_INDEX], rebuild_review_schedule),
+]
+
+def ensure_summary_tables(conn, archive=None):
+    """建立統計表，第一次建立時由既有資料 (含封存檔) 回填"""
+    for table_name, statements, rebuild in SUMMARY_TABLES:
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)
+        ).fetchone()
+        for statement in statements:
+            conn.execute(statement)
+        if not exists:
+            rebuild(conn, archive)
 
 def create_database():
     """建立完整的資料庫結構"""
@@ -15,6 +261,9 @@ def create_database():
         
         print(f"建立資料庫: {DATABASE_NAME}")
         
+        # 必須在建立第一個表格前設定；之後的清理以 incremental_vacuum 歸還空頁
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS users (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -59,6 +308,11 @@ def create_database():
             )
         ''')
         
+        ensure_archive_tables(conn)
+        ensure_summary_tables(conn, get_attempt_archive())
+        ensure_job_table(conn)
+        ensure_push_tables(conn)
+        
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS system_stats (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -82,6 +336,7 @@ def create_database():
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_quiz_attempts_chapter ON quiz_attempts(chapter_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_quiz_attempts_correct ON quiz_attempts(is_correct)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_last_active ON users(last_active)')
+        cursor.execute(USERS_REMINDER_INDEX)
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_system_stats_date ON system_stats(stat_date)')
         
         conn.commit()
@@ -152,13 +407,14 @@ def show_database_info():
         active_users = cursor.fetchone()[0]
         print(f"  週活躍使用者: {active_users}")
         
+        archive = get_attempt_archive()
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'attempt_archives'").fetchone() is None:
+            archive = None
+        total_quizzes, correct_answers = attempt_totals(conn, archive)
         cursor.execute("SELECT COUNT(*) FROM quiz_attempts")
-        total_quizzes = cursor.fetchone()[0]
-        print(f"  總測驗次數: {total_quizzes}")
+        print(f"  總測驗次數: {total_quizzes} (主資料庫 {cursor.fetchone()[0]} 筆)")
         
         if total_quizzes > 0:
-            cursor.execute("SELECT COUNT(*) FROM quiz_attempts WHERE is_correct = 1")
-            correct_answers = cursor.fetchone()[0]
             accuracy = (correct_answers / total_quizzes) * 100
             print(f"  整體正確率: {accuracy:.1f}%")
         
@@ -178,31 +434,136 @@ def show_database_info():
             conn.close()
 
 def cleanup_old_data():
-    """清理舊資料"""
+    """分批刪除舊資料並以 incremental_vacuum 歸還空頁，不會長時間鎖住資料庫"""
     try:
-        conn = sqlite3.connect(DATABASE_NAME)
-        cursor = conn.cursor()
+        pool = SQLitePool(DATABASE_NAME, write_size=1, read_size=1)
+        # 規則涉及的表格在舊資料庫中可能尚未建立
+        with pool.connection() as conn:
+            ensure_archive_tables(conn)
+            ensure_summary_tables(conn, get_attempt_archive())
+            ensure_job_table(conn)
+            ensure_push_tables(conn)
+        scheduler = MaintenanceScheduler(
+            pool.connection, CLEANUP_RULES, batch_size=MAINTENANCE_BATCH_SIZE,
+            max_lock_ms=MAINTENANCE_MAX_LOCK_MS, autostart=False
+        )
         
         print("🧹 清理舊資料...")
         
-        cursor.execute("DELETE FROM user_actions WHERE timestamp < ?", (datetime.now().timestamp() - 86400,))
-        old_actions = cursor.rowcount
+        report = scheduler.run_once(force_vacuum=True)
+        stats = scheduler.stats()
         
-        cursor.execute("DELETE FROM users WHERE last_active < date('now', '-90 days')")
-        inactive_users = cursor.rowcount
+        print(f"✅ 清理完成:")
+        for rule in CLEANUP_RULES:
+            print(f"  {rule.name}: 刪除 {report[rule.name]} 筆")
+        print(f"  歸還空頁: {report['vacuumed_pages']} 頁")
+        print(f"  {stats['batches']} 批，單批最長持有寫入鎖 {stats['max_lock_observed_ms']} ms "
+              f"(上限 {stats['max_lock_ms']} ms)")
         
-        cursor.execute("VACUUM")
+        if stats['auto_vacuum'] != 2:
+            print("ℹ️ 資料庫不是 auto_vacuum=INCREMENTAL，空頁未歸還；"
+                  "離峰時執行 python init_db.py vacuum 轉換 (只需一次)")
         
+        return True
+        
+    except sqlite3.Error as e:
+        print(f"❌ 清理資料失敗: {e}")
+        return False
+
+def vacuum_database():
+    """改為 auto_vacuum=INCREMENTAL 並完整 VACUUM；VACUUM 期間鎖住整個資料庫，需在離峰時執行"""
+    conn = None
+    try:
+        before = os.path.getsize(DATABASE_NAME)
+        conn = sqlite3.connect(DATABASE_NAME)
+        print("🔧 轉換為 auto_vacuum=INCREMENTAL 並重整資料庫...")
+        conn.executescript("PRAGMA auto_vacuum=INCREMENTAL; VACUUM;")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        print(f"✅ auto_vacuum={conn.execute('PRAGMA auto_vacuum').fetchone()[0]}，"
+              f"{before} → {os.path.getsize(DATABASE_NAME)} bytes")
+        return True
+        
+    except sqlite3.Error as e:
+        print(f"❌ 重整失敗: {e}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+def reconcile_user_stats():
+    """重建所有統計表"""
+    try:
+        conn = sqlite3.connect(DATABASE_NAME)
+        
+        print("🔄 重建使用者統計...")
+        ensure_archive_tables(conn)
+        archive = get_attempt_archive()
+        results = []
+        for table_name, statements, rebuild in SUMMARY_TABLES:
+            for statement in statements:
+                conn.execute(statement)
+            results.append((table_name, rebuild(conn, archive)))
         conn.commit()
         
-        print(f"✅ 清理完成:")
-        print(f"  刪除舊操作記錄: {old_actions} 筆")
-        print(f"  刪除非活躍使用者: {inactive_users} 筆")
+        print("✅ 統計重建完成:")
+        for table_name, rows in results:
+            print(f"  {table_name}: {rows} 筆")
+        return True
+        
+    except sqlite3.Error as e:
+        print(f"❌ 重建統計失敗: {e}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+def archive_attempts(hot_days=None):
+    """把超過保留天數的作答紀錄依月份搬到封存檔"""
+    conn = None
+    try:
+        conn = sqlite3.connect(DATABASE_NAME)
+        ensure_archive_tables(conn)
+        conn.commit()
+        archive = get_attempt_archive()
+        if hot_days is not None:
+            archive.hot_days = hot_days
+        
+        print(f"📦 封存 {archive.hot_days} 天前的作答紀錄到 {archive.directory}/ ...")
+        moved = archive.archive(conn)
+        
+        print("✅ 封存完成:")
+        for month, rows in moved.items():
+            print(f"  {month}: {rows} 筆")
+        if not moved:
+            print("  沒有需要封存的作答紀錄")
+        return True
         
+    except sqlite3.Error as e:
+        print(f"❌ 封存失敗: {e}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+def compact_database():
+    """封存舊作答紀錄後重整封存檔與主資料庫"""
+    if not archive_attempts():
+        return False
+    conn = None
+    try:
+        print("🗜️ 重整封存檔...")
+        for month, size in get_attempt_archive().compact().items():
+            print(f"  {month}: {size} bytes")
+        
+        before = os.path.getsize(DATABASE_NAME)
+        conn = sqlite3.connect(DATABASE_NAME)
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        print(f"✅ 主資料庫: {before} → {os.path.getsize(DATABASE_NAME)} bytes")
         return True
         
     except sqlite3.Error as e:
-        print(f"❌ 清理資料失敗: {e}")
+        print(f"❌ 重整失敗: {e}")
         return False
     finally:
         if conn:
@@ -245,22 +606,28 @@ def test_database():
         if conn:
             conn.close()
 
-def backup_database(backup_path=None):
-    """備份資料庫"""
+def backup_database(backup_path=None, compress=False):
+    """以 SQLite backup API 線上備份資料庫 (不需停止服務) 並檢查完整性"""
     if not os.path.exists(DATABASE_NAME):
         print(f"❌ 資料庫檔案 {DATABASE_NAME} 不存在")
         return False
     
+    rotate = backup_path is None
     if backup_path is None:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_path = f"{DATABASE_NAME}.backup_{timestamp}"
+        backup_path = f"{DATABASE_NAME}.backup_{timestamp}" + ('.gz' if compress else '')
     
     try:
-        import shutil
-        shutil.copy2(DATABASE_NAME, backup_path)
+        stats = online_backup(DATABASE_NAME, backup_path, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP, compress=compress)
         print(f"✅ 資料庫備份完成: {backup_path}")
+        print(f"  {stats['pages']} 頁 {stats['bytes']} bytes → {stats['output_bytes']} bytes，"
+              f"{stats['seconds']:.2f}s ({stats['mb_per_second']} MB/s)，重新開始 {stats['restarts']} 次")
+        print(f"  完整性檢查: {stats['integrity']}")
+        if rotate:
+            for path in rotate_backups(f"{DATABASE_NAME}.backup_*", BACKUP_KEEP):
+                print(f"  刪除舊備份: {path}")
         return True
-    except Exception as e:
+    except (BackupError, OSError) as e:
         print(f"❌ 備份失敗: {e}")
         return False
 
@@ -272,8 +639,12 @@ def main():
         print("  python init_db.py reset      - 重設資料庫")
         print("  python init_db.py info       - 顯示資料庫資訊")
         print("  python init_db.py cleanup    - 清理舊資料")
+        print("  python init_db.py vacuum     - 轉換為 incremental_vacuum 並重整 (會鎖住資料庫)")
         print("  python init_db.py test       - 測試資料庫")
-        print("  python init_db.py backup     - 備份資料庫")
+        print("  python init_db.py backup [--gzip] [路徑] - 線上備份資料庫")
+        print("  python init_db.py reconcile  - 重建使用者統計")
+        print("  python init_db.py archive [天數] - 封存舊作答紀錄")
+        print("  python init_db.py compact    - 封存並重整資料庫")
         print("  python init_db.py drop       - 刪除資料庫")
         sys.exit(1)
     
@@ -290,10 +661,20 @@ def main():
         show_database_info()
     elif command == "cleanup":
         cleanup_old_data()
+    elif command == "vacuum":
+        vacuum_database()
     elif command == "test":
         test_database()
     elif command == "backup":
-        backup_database()
+        options = sys.argv[2:]
+        paths = [option for option in options if not option.startswith('--')]
+        backup_database(paths[0] if paths else None, compress='--gzip' in options)
+    elif command == "reconcile":
+        reconcile_user_stats()
+    elif command == "archive":
+        archive_attempts(int(sys.argv[2]) if len(sys.argv) > 2 else None)
+    elif command == "compact":
+        compact_database()
     elif command == "drop":
         confirm = input("確定要刪除資料庫嗎？所有資料將被清除 (y/N): ")
         if confirm.lower() in ['y', 'yes']:
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+book_content.py - 可熱更新的書籍內容
+每個版本的 book.json 連同索引與預先建立的回覆內容組成一個不可變的快照，
+在背景建立完成並通過 BookValidator 驗證後才以單一指派替換；
+處理中的請求持有舊快照，不受替換影響
+"""
+import hashlib
+import json
+import mmap
+import multiprocessing
+import os
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+
+from bookpack import BookPack, BookPackError
+from models.book_index import BookIndex
+from models.search_index import SearchIndex
+from utils.render_cache import RenderCache
+from validate_book import BookValidator
+
+
+class BookContentError(Exception):
+    pass
+
+
+class BookContent:
+    """單一版本的書籍內容"""
+
+    def __init__(self, data, version, warm=True):
+        self.data = data
+        self.version = version
+        self.index = BookIndex(data)
+        self.render_cache = RenderCache(self.index)
+        self._search_index = None
+        self._search_lock = threading.Lock()
+        if warm:
+            self.render_cache.warm()
+            self._search_index = SearchIndex(self.index)
+        self.loaded_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+    @property
+    def search_index(self):
+        # 未預先建立時 (內容包模式) 在第一次搜尋時建立
+        if self._search_index is None:
+            with self._search_lock:
+                if self._search_index is None:
+                    self._search_index = SearchIndex(self.index)
+        return self._search_index
+
+
+def is_pack(path):
+    return path.endswith('.pack')
+
+
+def read_book(path, validate=True):
+    """讀取並驗證 book.json，回傳 (data, version)；失敗時拋出 BookContentError
+    內容包 (*.pack) 在編譯時已驗證，直接以 mmap 開啟"""
+    if is_pack(path):
+        try:
+            pack = BookPack(path)
+        except (OSError, BookPackError) as e:
+            raise BookContentError(f"cannot load {path}: {e}")
+        return pack.as_book(), pack.version
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+        data = json.loads(raw.decode('utf-8'))
+    except Exception as e:
+        raise BookContentError(f"cannot load {path}: {e}")
+    if validate:
+        validator = BookValidator()
+        if not validator.validate_data(data):
+            raise BookContentError("; ".join(validator.errors[:5]))
+    return data, hashlib.sha256(raw).hexdigest()[:12]
+
+
+class BookContentManager:
+
+    GENERATION = struct.Struct('Q')
+
+    def __init__(self, path, watch_interval=5.0, warm=None):
+        self.path = path
+        self.watch_interval = watch_interval
+        # 內容包由各 worker 共用，回覆內容在第一次使用時才建立，避免每個 worker 複製整本書
+        self.warm = not is_pack(path) if warm is None else warm
+        self._current = None
+        self._signature = None
+        self._reload_lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self._pending = False
+        # 其他 worker 觸發的重新載入以共享的世代編號通知
+        self._generation = mmap.mmap(-1, self.GENERATION.size)
+        self._generation_lock = multiprocessing.Lock()
+        self._seen_generation = 0
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_reload_ms = 0.0
+
+    def _stat_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self):
+        """啟動時載入；驗證失敗仍沿用可解析的內容，無法讀取時使用空白書籍"""
+        signature = self._stat_signature()
+        try:
+            data, version = read_book(self.path)
+        except BookContentError as e:
+            print(f"Book validation error: {e}")
+            self.last_error = str(e)
+            try:
+                data, version = read_book(self.path, validate=False)
+            except BookContentError as e:
+                print(f"Load book.json failed: {e}")
+                data, version = {"chapters": []}, None
+        self._install(BookContent(data, version, warm=self.warm), signature, 0.0)
+        return self._current
+
+    def _install(self, content, signature, elapsed_ms):
+        self._signature = signature
+        self._current = content
+        self.last_reload_ms = elapsed_ms
+
+    @property
+    def current(self):
+        self._ensure_started()
+        if self._read_generation() != self._seen_generation and not self._pending:
+            self._reload_in_background()
+        return self._current
+
+    def reload(self):
+        """重新讀取 book.json；內容未變更回傳 False，驗證失敗拋出 BookContentError"""
+        with self._reload_lock:
+            self._seen_generation = self._read_generation()
+            signature = self._stat_signature()
+            started = time.perf_counter()
+            try:
+                data, version = read_book(self.path)
+            except BookContentError as e:
+                self.failures += 1
+                self.last_error = str(e)
+                # 記錄失敗的檔案狀態，避免每次輪詢都重試同一份錯誤內容
+                self._signature = signature
+                raise
+            if self._current is not None and version == self._current.version:
+                self._signature = signature
+                return False
+            content = BookContent(data, version, warm=self.warm)
+            self._install(content, signature, (time.perf_counter() - started) * 1000)
+            self.reloads += 1
+            self.last_error = None
+            print(f"Book content reloaded: version {version}, {self.last_reload_ms:.1f} ms")
+            return True
+
+    def request_reload(self):
+        """在目前行程重新載入，並通知其他 worker 跟進"""
+        changed = self.reload()
+        with self._generation_lock:
+            generation = self._read_generation() + 1
+            self.GENERATION.pack_into(self._generation, 0, generation)
+        self._seen_generation = generation
+        return changed
+
+    def _read_generation(self):
+        return self.GENERATION.unpack_from(self._generation, 0)[0]
+
+    def _reload_in_background(self):
+        self._pending = True
+
+        def run():
+            try:
+                self.reload()
+            except BookContentError as e:
+                print(f"Book reload error: {e}")
+            finally:
+                self._pending = False
+
+        threading.Thread(target=run, name="book-reload", daemon=True).start()
+
+    def _ensure_started(self):
+        # 監看執行緒不會跟著 fork 複製，每個 worker 各自啟動
+        if self._pid == os.getpid():
+            return
+        with self._reload_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            if self.watch_interval > 0:
+                self._thread = threading.Thread(target=self._watch, name="book-watcher", daemon=True)
+                self._thread.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.watch_interval)
+            if self._stat_signature() == self._signature:
+                continue
+            try:
+                self.reload()
+            except BookContentError as e:
+                print(f"Book reload error: {e}")
+            except Exception as e:
+                print(f"Book watcher error: {e}")
+
+    def stats(self):
+        content = self._current
+        return {
+            "version": content.version if content else None,
+            "loaded_at": content.loaded_at if content else None,
+            "chapters": len(content.data.get('chapters', [])) if content else 0,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_reload_ms": round(self.last_reload_ms, 2),
+            "last_error": self.last_error,
+        }
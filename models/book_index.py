@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+book_index.py - 書籍內容索引
+在載入 book.json 時建立一次，提供章節與段落的 O(1) 查詢，
+並預先計算內容/測驗順序、上下段連結與顯示位置
+"""
+from bisect import bisect_left
+
+
+class ChapterIndex:
+    """單一章節的預先計算資料"""
+
+    def __init__(self, chapter):
+        self.chapter = chapter
+        self.chapter_id = chapter['chapter_id']
+        self.title = chapter.get('title', '')
+        self.image_url = chapter.get('image_url')
+        self.has_image = bool(self.image_url)
+
+        sections = chapter.get('sections', [])
+        self.sections = {s['section_id']: s for s in sections}
+        self.section_count = len(sections)
+        self.content_ids = sorted(s['section_id'] for s in sections if s['type'] == 'content')
+        self.quiz_ids = sorted(s['section_id'] for s in sections if s['type'] == 'quiz')
+
+        # 閱讀順序：章節圖片 (section 0) 在前，接著依序為內容段落
+        self.reading_order = ([0] if self.has_image else []) + self.content_ids
+        self.reading_positions = {sid: i for i, sid in enumerate(self.reading_order)}
+        self.content_positions = {sid: i for i, sid in enumerate(self.content_ids)}
+        self.quiz_positions = {sid: i for i, sid in enumerate(self.quiz_ids)}
+
+        if self.has_image:
+            self.start_section_id = 0
+        else:
+            self.start_section_id = self.content_ids[0] if self.content_ids else 1
+        self.first_quiz_id = self.quiz_ids[0] if self.quiz_ids else None
+        self.total_display = len(self.reading_order)
+
+    def get_section(self, section_id):
+        return self.sections.get(section_id)
+
+    def reading_index(self, section_id):
+        """段落在閱讀順序中的位置，找不到時視為第一段"""
+        return self.reading_positions.get(section_id, 0)
+
+    def neighbor(self, section_id, direction):
+        """取得閱讀順序中的上一段/下一段，超出範圍時回傳 None"""
+        index = self.reading_index(section_id) + (1 if direction == 'next' else -1)
+        if 0 <= index < len(self.reading_order):
+            return self.reading_order[index]
+        return None
+
+    def content_links(self, section_id):
+        """內容段落的 (上一段, 下一段)，沒有時為 None"""
+        index = self.content_positions.get(section_id, -1)
+        if index > 0:
+            prev_id = self.content_ids[index - 1]
+        elif self.has_image:
+            prev_id = 0
+        else:
+            prev_id = None
+        if index < len(self.content_ids) - 1:
+            next_id = self.content_ids[index + 1]
+        else:
+            next_id = None
+        return prev_id, next_id
+
+    def display_position(self, section_id):
+        """內容段落的顯示位置 (含章節圖片)"""
+        position = self.content_positions.get(section_id, -1) + 1
+        return position + 1 if self.has_image else position
+
+    def quiz_position(self, section_id):
+        return self.quiz_positions.get(section_id, 0) + 1
+
+    def content_before(self, section_id):
+        """本章中 section_id 之前的內容段落數"""
+        return bisect_left(self.content_ids, section_id)
+
+
+class BookIndex:
+    """整本書的索引，以 chapter_id 查詢 ChapterIndex"""
+
+    def __init__(self, book_data):
+        self.chapter_list = [ChapterIndex(ch) for ch in book_data.get('chapters', [])]
+        self.chapters = {ch.chapter_id: ch for ch in self.chapter_list}
+        self.total_sections = sum(ch.section_count for ch in self.chapter_list)
+
+        # 各章節之前累計的內容段落數，供進度計算使用
+        self.content_offsets = {}
+        running = 0
+        for ch in sorted(self.chapter_list, key=lambda c: c.chapter_id):
+            self.content_offsets[ch.chapter_id] = running
+            running += len(ch.content_ids)
+        self.total_content = running
+
+    def __len__(self):
+        return len(self.chapter_list)
+
+    def get_chapter(self, chapter_id):
+        return self.chapters.get(chapter_id)
+
+    def get_section(self, chapter_id, section_id):
+        chapter = self.chapters.get(chapter_id)
+        if chapter is None:
+            return None
+        return chapter.sections.get(section_id)
+
+    def completed_content(self, chapter_id, section_id):
+        """目前位置之前已閱讀的內容段落數"""
+        chapter = self.chapters.get(chapter_id)
+        if chapter is None:
+            return sum(len(ch.content_ids) for ch in self.chapter_list if ch.chapter_id < chapter_id)
+        return self.content_offsets[chapter_id] + chapter.content_before(section_id)
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+review_schedule.py - 測驗題的間隔重複複習排程 (SM-2)
+每位使用者的每一題在 review_schedule 表保存一列排程狀態，作答時只更新該列；
+下一題複習與待複習題數都以 (line_user_id, due_at) 索引查詢，不需掃描作答紀錄
+"""
+import time
+from collections import namedtuple
+
+from utils.attempt_archive import attempt_sources
+
+ReviewState = namedtuple('ReviewState', ['repetitions', 'interval_days', 'ease', 'lapses', 'due_at'])
+
+DAY = 86400
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+# 只有答對、答錯兩種結果，分別視為 SM-2 的品質 4 與 2
+CORRECT_QUALITY = 4
+WRONG_QUALITY = 2
+# 答錯的題目在同一次學習中稍後再出現
+RELEARN_DELAY = 600
+
+NEW_STATE = ReviewState(0, 0.0, INITIAL_EASE, 0, 0.0)
+
+
+def _ease(ease, quality):
+    return max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+
+def next_state(state, correct, now):
+    """回傳作答後的排程狀態；尚未到期就答對 (例如重讀章節) 不會延長間隔"""
+    if not correct:
+        return ReviewState(0, 0.0, _ease(state.ease, WRONG_QUALITY), state.lapses + 1, now + RELEARN_DELAY)
+    if state.repetitions and now < state.due_at:
+        return state
+    repetitions = state.repetitions + 1
+    if repetitions == 1:
+        interval = 1.0
+    elif repetitions == 2:
+        interval = 6.0
+    else:
+        interval = round(state.interval_days * state.ease, 1)
+    ease = _ease(state.ease, CORRECT_QUALITY)
+    return ReviewState(repetitions, interval, ease, state.lapses, now + interval * DAY)
+
+
+def load_state(conn, user_id, chapter_id, section_id):
+    row = conn.execute(
+        """SELECT repetitions, interval_days, ease, lapses, due_at FROM review_schedule
+           WHERE line_user_id = ? AND chapter_id = ? AND section_id = ?""",
+        (user_id, chapter_id, section_id)
+    ).fetchone()
+    return ReviewState(*row) if row else NEW_STATE
+
+
+def save_states(conn, rows):
+    """rows 為 [(user_id, chapter_id, section_id, ReviewState), ...]"""
+    conn.executemany(
+        """INSERT INTO review_schedule
+               (line_user_id, chapter_id, section_id, repetitions, interval_days, ease, lapses, due_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+           ON CONFLICT(line_user_id, chapter_id, section_id) DO UPDATE SET
+               repetitions = excluded.repetitions,
+               interval_days = excluded.interval_days,
+               ease = excluded.ease,
+               lapses = excluded.lapses,
+               due_at = excluded.due_at""",
+        [(user_id, chapter_id, section_id) + tuple(state) for user_id, chapter_id, section_id, state in rows]
+    )
+
+
+def record_answer(conn, user_id, chapter_id, section_id, correct, now=None):
+    """在作答的同一個交易中更新此題的排程，回傳新的狀態"""
+    now = time.time() if now is None else now
+    state = next_state(load_state(conn, user_id, chapter_id, section_id), correct, now)
+    save_states(conn, [(user_id, chapter_id, section_id, state)])
+    return state
+
+
+def due_items(conn, user_id, now=None, limit=1):
+    """到期最久的題目 [(chapter_id, section_id, due_at), ...]"""
+    now = time.time() if now is None else now
+    return conn.execute(
+        """SELECT chapter_id, section_id, due_at FROM review_schedule
+           WHERE line_user_id = ? AND due_at <= ?
+           ORDER BY due_at LIMIT ?""",
+        (user_id, now, limit)
+    ).fetchall()
+
+
+def remove_items(conn, user_id, items):
+    """刪除排程中的題目 (例如書中已刪除的題目)，items 為 [(chapter_id, section_id), ...]"""
+    conn.executemany(
+        "DELETE FROM review_schedule WHERE line_user_id = ? AND chapter_id = ? AND section_id = ?",
+        [(user_id, chapter_id, section_id) for chapter_id, section_id in items]
+    )
+
+
+def due_count(conn, user_id, now=None):
+    now = time.time() if now is None else now
+    return conn.execute(
+        "SELECT COUNT(*) FROM review_schedule WHERE line_user_id = ? AND due_at <= ?",
+        (user_id, now)
+    ).fetchone()[0]
+
+
+def next_due_at(conn, user_id):
+    """下一題到期的時間，沒有排程時回傳 None"""
+    return conn.execute(
+        "SELECT MIN(due_at) FROM review_schedule WHERE line_user_id = ?", (user_id,)
+    ).fetchone()[0]
+
+
+def rebuild_review_schedule(conn, archive=None, batch_size=5000):
+    """依時間順序重播 quiz_attempts (由舊到新的封存檔，最後是主資料庫) 重新計算所有排程；
+    逐題處理，記憶體用量與資料量無關；後面的來源從前面來源算出的狀態接著重播"""
+    conn.execute("DELETE FROM review_schedule")
+    for index, source in enumerate(attempt_sources(conn, archive)):
+        rows = source.execute('''
+            SELECT line_user_id, chapter_id, section_id, is_correct,
+                   CAST(strftime('%s', created_at) AS REAL)
+            FROM quiz_attempts
+            ORDER BY line_user_id, chapter_id, section_id, id
+        ''')
+        pending = []
+        key = None
+        state = NEW_STATE
+        for user_id, chapter_id, section_id, is_correct, answered_at in rows:
+            if (user_id, chapter_id, section_id) != key:
+                if key is not None:
+                    pending.append(key + (state,))
+                key = (user_id, chapter_id, section_id)
+                state = load_state(conn, *key) if index else NEW_STATE
+            state = next_state(state, bool(is_correct), answered_at or 0.0)
+            if len(pending) >= batch_size:
+                save_states(conn, pending)
+                pending = []
+        if key is not None:
+            pending.append(key + (state,))
+        save_states(conn, pending)
+    return conn.execute("SELECT COUNT(*) FROM review_schedule").fetchone()[0]
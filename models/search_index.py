@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+search_index.py - 內容段落的全文檢索
+英文以單字、中文以相鄰兩字 (bigram) 為索引詞，建立倒排索引並以 BM25 排序；
+每個詞對每個段落的 BM25 分數在建立索引時就先算好，並依分數由高到低排列，
+查詢時以 threshold algorithm 逐層讀取，確定前 N 名後即停止，不需掃描完整的倒排串列
+"""
+import heapq
+import math
+import re
+from collections import Counter, namedtuple
+
+SearchHit = namedtuple('SearchHit', ['chapter_id', 'section_id', 'score'])
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?|[\u3400-\u4dbf\u4e00-\u9fff]+")
+_CJK_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff]")
+
+
+def tokenize(text):
+    """英文單字與中文 bigram；單獨一個中文字則保留單字"""
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        if _CJK_PATTERN.match(token):
+            if len(token) == 1:
+                tokens.append(token)
+            else:
+                tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+        else:
+            tokens.append(token)
+    return tokens
+
+
+class SearchIndex:
+
+    def __init__(self, book_index, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents = []
+        # 詞 → {段落: 分數}，用於隨機存取
+        self.postings = {}
+        # 詞 → 依分數由高到低排列的段落
+        self.ranked = {}
+        self._build(book_index)
+
+    def _build(self, book_index):
+        term_counts = []
+        for chapter in book_index.chapter_list:
+            for section_id in chapter.content_ids:
+                text = chapter.sections[section_id]['content']
+                self.documents.append((chapter.chapter_id, section_id))
+                term_counts.append(Counter(tokenize(text)))
+
+        total = len(term_counts)
+        lengths = [sum(counts.values()) for counts in term_counts]
+        # 所有段落都沒有可索引的詞 (例如只有標點) 時平均長度為 0
+        average = (sum(lengths) / total if total else 0.0) or 1.0
+        frequencies = Counter()
+        for counts in term_counts:
+            frequencies.update(counts.keys())
+
+        for doc, counts in enumerate(term_counts):
+            norm = self.k1 * (1 - self.b + self.b * lengths[doc] / average)
+            for term, tf in counts.items():
+                df = frequencies[term]
+                idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+                self.postings.setdefault(term, {})[doc] = idf * tf * (self.k1 + 1) / (tf + norm)
+        for term, posting in self.postings.items():
+            self.ranked[term] = sorted(posting, key=lambda doc: (-posting[doc], doc))
+
+    def search(self, query, limit=5):
+        terms = list(dict.fromkeys(tokenize(query)))
+        postings = [self.postings[term] for term in terms if term in self.postings]
+        if not postings or limit <= 0:
+            return []
+
+        ranked = [self.ranked[term] for term in terms if term in self.postings]
+        top = []
+        seen = set()
+        depth = 0
+        while True:
+            # 各串列在目前深度的分數總和，是尚未讀到的段落可能得到的最高分
+            threshold = 0.0
+            active = False
+            for posting, docs in zip(postings, ranked):
+                if depth >= len(docs):
+                    continue
+                active = True
+                doc = docs[depth]
+                threshold += posting[doc]
+                if doc in seen:
+                    continue
+                seen.add(doc)
+                score = 0.0
+                for other in postings:
+                    score += other.get(doc, 0.0)
+                entry = (score, -doc)
+                if len(top) < limit:
+                    heapq.heappush(top, entry)
+                elif entry > top[0]:
+                    heapq.heapreplace(top, entry)
+            if not active or (len(top) == limit and top[0][0] >= threshold):
+                break
+            depth += 1
+
+        return [SearchHit(*self.documents[-doc], score) for score, doc in sorted(top, reverse=True)]
+
+    def __len__(self):
+        return len(self.documents)
+
+
+def snippet(text, query, width=30):
+    """取出第一個符合查詢詞附近的文字"""
+    lowered = text.lower()
+    position = -1
+    for term in [query.strip().lower()] + tokenize(query):
+        if term:
+            position = lowered.find(term)
+            if position >= 0:
+                break
+    start = max(0, position - width // 3) if position >= 0 else 0
+    excerpt = ' '.join(text[start:start + width].split())
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if start + width < len(text) else ""
+    return prefix + excerpt + suffix
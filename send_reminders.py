@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+send_reminders.py - 學習提醒推播
+挑選一段時間沒有使用、但仍在閱讀某一章的使用者，同一章的使用者收到相同的訊息，
+以 multicast 每次最多送給 500 位；同一天重複執行只會補送尚未完成的批次
+
+執行方式 (可每日排程執行):
+  CHANNEL_ACCESS_TOKEN=... python send_reminders.py
+  python send_reminders.py --dry-run
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+from init_db import ensure_push_tables, USERS_REMINDER_INDEX
+from models.book_content import read_book, BookContentError
+from models.book_index import BookIndex
+from utils.db_pool import SQLitePool
+from utils.line_client import LineClient
+from utils.postback_codec import encode_postback
+from utils.push_engine import PushEngine
+
+DATABASE_NAME = os.environ.get('DATABASE_NAME', 'linebot.db')
+BOOK_PATH = os.environ.get('BOOK_PATH', 'book.json')
+LINE_API_HOST = os.environ.get('LINE_API_HOST', 'https://api.line.me')
+PUSH_RATE = float(os.environ.get('PUSH_RATE', '100'))
+PUSH_CONCURRENCY = int(os.environ.get('PUSH_CONCURRENCY', '16'))
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def select_recipients(conn, now, inactive_hours=24, max_idle_days=14):
+    """回傳 {chapter_id: [line_user_id, ...]}；
+    last_active 在 max_idle_days 天內、但超過 inactive_hours 小時沒有使用的使用者 (以 idx_users_reminder 查詢)"""
+    newest = (now - timedelta(hours=inactive_hours)).strftime(TIMESTAMP_FORMAT)
+    oldest = (now - timedelta(days=max_idle_days)).strftime(TIMESTAMP_FORMAT)
+    recipients = {}
+    rows = conn.execute('''
+        SELECT current_chapter_id, line_user_id FROM users
+        WHERE last_active >= ? AND last_active < ? AND current_chapter_id IS NOT NULL
+    ''', (oldest, newest))
+    for chapter_id, user_id in rows:
+        recipients.setdefault(chapter_id, []).append(user_id)
+    return recipients
+
+
+def reminder_messages(chapter):
+    text = (f"📖 今天也來學一點文法吧！\n\n"
+            f"你上次讀到第 {chapter.chapter_id} 章「{chapter.title}」，"
+            f"點選下方「繼續閱讀」從上次的位置接著學習")
+    return [{
+        "type": "text",
+        "text": text,
+        "quickReply": {"items": [{
+            "type": "action",
+            "action": {
+                "type": "postback",
+                "label": "繼續閱讀",
+                "data": encode_postback('continue_reading'),
+                "displayText": "繼續閱讀"
+            }
+        }]}
+    }]
+
+
+def build_groups(recipients, book_index):
+    """每一章一組訊息；書中已不存在的章節略過"""
+    groups = []
+    for chapter_id in sorted(recipients):
+        chapter = book_index.get_chapter(chapter_id)
+        if chapter is not None:
+            groups.append((reminder_messages(chapter), recipients[chapter_id]))
+    return groups
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="推播學習提醒")
+    parser.add_argument('--inactive-hours', type=float, default=24, help="超過幾小時未使用才提醒")
+    parser.add_argument('--max-idle-days', type=float, default=14, help="超過幾天未使用就不再提醒")
+    parser.add_argument('--run-key', help="同一個 run key 只推播一次 (預設為 study_reminder:<UTC 日期>)")
+    parser.add_argument('--rate', type=float, default=PUSH_RATE, help="每秒 multicast 請求數上限")
+    parser.add_argument('--concurrency', type=int, default=PUSH_CONCURRENCY)
+    parser.add_argument('--dry-run', action='store_true', help="只顯示收件者數量，不建立推播")
+    args = parser.parse_args(argv)
+
+    access_token = os.environ.get('CHANNEL_ACCESS_TOKEN')
+    if not access_token and not args.dry_run:
+        print("Missing CHANNEL_ACCESS_TOKEN")
+        return 1
+    try:
+        data, _ = read_book(BOOK_PATH, validate=False)
+    except BookContentError as e:
+        print(f"Load book failed: {e}")
+        return 1
+
+    now = datetime.now(timezone.utc)
+    run_key = args.run_key or f"study_reminder:{now.strftime('%Y-%m-%d')}"
+    pool = SQLitePool(DATABASE_NAME, write_size=1, read_size=1)
+    with pool.connection() as conn:
+        ensure_push_tables(conn)
+        conn.execute(USERS_REMINDER_INDEX)
+    with pool.connection(readonly=True) as conn:
+        recipients = select_recipients(conn, now, args.inactive_hours, args.max_idle_days)
+    groups = build_groups(recipients, BookIndex(data))
+    print(f"{run_key}: {sum(len(users) for _, users in groups)} 位收件者，{len(groups)} 組訊息")
+    if args.dry_run:
+        return 0
+
+    line_client = LineClient(access_token, host=LINE_API_HOST, pool_size=args.concurrency)
+    engine = PushEngine(pool.connection, line_client, rate=args.rate, concurrency=args.concurrency)
+    run_id = engine.plan(run_key, groups)
+    report = engine.send(run_id)
+    print(f"送出 {report['sent']} 批 ({report['recipients']} 位)，重複略過 {report['duplicates']} 批，"
+          f"失敗 {report['failed']} 批，重試 {report['retries']} 次")
+    print(f"耗時 {report['elapsed']:.2f}s，{report['requests_per_second']} req/s，"
+          f"{report['recipients_per_second']} 位/s")
+    return 1 if report['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
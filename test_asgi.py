@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試 ASGI 進入點：事件依使用者同時處理且保持順序、回覆在事件迴圈中送出且失敗會回報給處理函式、
+等待 LINE API 的事件數不受資料庫連線數限制、其他路徑交給 Flask
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+os.environ.setdefault('CHANNEL_SECRET', 'test_secret_12345678901234567890123456789012')
+os.environ.setdefault('CHANNEL_ACCESS_TOKEN', 'test_token')
+os.environ.setdefault('MAIN_RICH_MENU_ID', 'richmenu-test123456789012345')
+
+import asgi
+from utils.line_client import LineClient
+
+
+def make_event(user_id, name):
+    return SimpleNamespace(source=SimpleNamespace(user_id=user_id), name=name)
+
+
+class RecordingHandler:
+    def __init__(self, line_client):
+        self.line_client = line_client
+        self.log = []
+        self.lock = threading.Lock()
+
+    def dispatch(self, event, destination=None):
+        with self.lock:
+            self.log.append(('start', event.name))
+        if event.name == 'a1':
+            time.sleep(0.1)
+        try:
+            self.line_client.api.reply_message(f"reply-{event.name}")
+        except RuntimeError as e:
+            with self.lock:
+                self.log.append(('reply failed', str(e)))
+            return
+        self.line_client.post('/v2/bot/user/x/richmenu/y')
+        with self.lock:
+            self.log.append(('end', event.name))
+        if event.name == 'crash':
+            raise RuntimeError("handler failed after reply")
+
+
+class RecordingClient:
+    timeout = (1.0, 1.0)
+
+    def __init__(self, fail=False):
+        self.sent = []
+        self.fail = fail
+
+    async def call(self, kind, args):
+        if self.fail and kind == 'reply':
+            raise RuntimeError("reply failed")
+        self.sent.append((kind, args))
+
+
+def make_app():
+    line_client = LineClient('token')
+    handler = RecordingHandler(line_client)
+    app = asgi.LineBotASGI(None, handler, line_client)
+    app.executor = ThreadPoolExecutor(max_workers=4)
+    app.client = RecordingClient()
+    app._pid = os.getpid()
+    return app, handler
+
+
+def test_events_run_concurrently_across_users_in_order_per_user():
+    app, handler = make_app()
+    events = [make_event('A', 'a1'), make_event('B', 'b1'), make_event('A', 'a2')]
+    asyncio.run(app.handle_events(events))
+    log = handler.log
+    # B 不必等待 A 的第一個事件，A 的事件依序處理
+    assert log.index(('end', 'b1')) < log.index(('end', 'a1'))
+    assert log.index(('end', 'a1')) < log.index(('start', 'a2'))
+
+
+def test_replies_are_sent_on_event_loop():
+    app, handler = make_app()
+    asyncio.run(app.handle_events([make_event('A', 'a2')]))
+    assert app.client.sent == [
+        ('reply', ('reply-a2',)),
+        ('post', ('/v2/bot/user/x/richmenu/y', None, 'application/json', None)),
+    ]
+    # 離開 deferred 區塊後恢復使用實際的 MessagingApi
+    assert not isinstance(handler.line_client.api, asgi.LoopBoundLineApi)
+
+
+def test_reply_failure_reaches_handler():
+    app, handler = make_app()
+    app.client = RecordingClient(fail=True)
+    asyncio.run(app.handle_events([make_event('A', 'a2')]))
+    assert handler.log == [('start', 'a2'), ('reply failed', 'reply failed')]
+    assert app.client.sent == []
+
+
+def test_handler_error_after_reply_sends_reply_once():
+    app, handler = make_app()
+    asyncio.run(app.handle_events([make_event('A', 'crash'), make_event('A', 'a2')]))
+    # 處理函式失敗前已送出的回覆不會重送，也不會被丟棄；同一使用者的下一個事件照常處理
+    assert app.client.sent == [
+        ('reply', ('reply-crash',)),
+        ('post', ('/v2/bot/user/x/richmenu/y', None, 'application/json', None)),
+        ('reply', ('reply-a2',)),
+        ('post', ('/v2/bot/user/x/richmenu/y', None, 'application/json', None)),
+    ]
+
+
+class SlowClient(RecordingClient):
+    """模擬 LINE API 延遲，記錄同時等待回應的呼叫數"""
+
+    def __init__(self):
+        super().__init__()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def call(self, kind, args):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.05)
+        self.in_flight -= 1
+        await super().call(kind, args)
+
+
+def test_handler_threads_not_capped_by_db_pool():
+    app, handler = make_app()
+    app.executor = ThreadPoolExecutor(max_workers=asgi.ASGI_HANDLER_THREADS)
+    app.client = SlowClient()
+    users = asgi.bot.DB_READ_POOL_SIZE * 4
+    asyncio.run(app.handle_events([make_event(f"U{index}", f"e{index}") for index in range(users)]))
+    assert len(app.client.sent) == users * 2
+    # 處理函式的執行緒等待 LINE API 回應，執行緒數若等於資料庫連線數會讓其他事件排隊
+    assert app.client.max_in_flight > asgi.bot.DB_READ_POOL_SIZE
+
+
+async def call(app, method, path, body=b'', headers=()):
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'',
+             'headers': list(headers), 'http_version': '1.1'}
+    await app(scope, receive, send)
+    return sent[0]['status'], b''.join(m.get('body', b'') for m in sent[1:])
+
+
+def test_callback_signature_and_flask_fallback():
+    app = asgi.LineBotASGI(asgi.bot.app, asgi.bot.handler, asgi.bot.line_client)
+    app.executor = ThreadPoolExecutor(max_workers=2)
+    app.client = RecordingClient()
+    app._pid = os.getpid()
+
+    async def scenario():
+        return (
+            await call(app, 'POST', '/callback', b'{}'),
+            await call(app, 'POST', '/callback', b'{}', [(b'x-line-signature', b'invalid')]),
+            await call(app, 'GET', '/ping'),
+        )
+
+    missing, invalid, ping = asyncio.run(scenario())
+    assert missing[0] == 400
+    assert invalid[0] == 400
+    assert ping == (200, b'pong')
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試作答紀錄的冷熱分層：舊紀錄依月份搬到封存檔、重複執行不會重複搬移、
+短範圍查詢不開啟封存檔、長範圍查詢與統計重建的結果與封存前相同
+"""
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from init_db import (
+    ensure_archive_tables, rebuild_user_stats, rebuild_user_question_stats,
+    USER_STATS_SCHEMA, USER_QUESTION_STATS_SCHEMA, REVIEW_SCHEDULE_SCHEMA
+)
+from models.review_schedule import rebuild_review_schedule
+from utils.attempt_archive import AttemptArchive, attempt_totals
+from utils.db_pool import SQLitePool
+
+NOW = datetime(2024, 6, 15, 12, 0, 0, tzinfo=timezone.utc)
+
+
+def _stamp(days_ago):
+    return (NOW - timedelta(days=days_ago)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+ANSWERS = [
+    ('U1', 1, 5, False, _stamp(200)),
+    ('U1', 1, 5, True, _stamp(199)),
+    ('U2', 1, 5, True, _stamp(150)),
+    ('U1', 2, 1, False, _stamp(120)),
+    ('U1', 1, 5, True, _stamp(100)),
+    ('U2', 2, 1, False, _stamp(30)),
+    ('U1', 2, 1, True, _stamp(10)),
+    ('U3', 1, 5, True, _stamp(1)),
+]
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLitePool(str(tmp_path / "archive.db"))
+    with pool.connection() as conn:
+        conn.execute('''
+            CREATE TABLE quiz_attempts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                line_user_id TEXT NOT NULL,
+                chapter_id INTEGER NOT NULL,
+                section_id INTEGER NOT NULL,
+                user_answer TEXT NOT NULL,
+                is_correct BOOLEAN NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute("CREATE TABLE bookmarks (line_user_id TEXT NOT NULL)")
+        conn.execute("INSERT INTO bookmarks VALUES ('U4')")
+        for statement in (USER_STATS_SCHEMA, USER_QUESTION_STATS_SCHEMA, REVIEW_SCHEDULE_SCHEMA):
+            conn.execute(statement)
+        ensure_archive_tables(conn)
+        conn.executemany(
+            "INSERT INTO quiz_attempts (line_user_id, chapter_id, section_id, user_answer, is_correct, created_at) "
+            "VALUES (?, ?, ?, 'A', ?, ?)", ANSWERS
+        )
+    return pool
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return AttemptArchive(str(tmp_path / "archive"), hot_days=90)
+
+
+def _summaries(conn, archive=None):
+    rebuild_user_stats(conn, archive)
+    rebuild_user_question_stats(conn, archive)
+    rebuild_review_schedule(conn, archive, batch_size=1)
+    return [[tuple(row) for row in conn.execute(f"SELECT * FROM {table} ORDER BY 1, 2")]
+            for table in ('user_stats', 'user_question_stats', 'review_schedule')]
+
+
+def test_archive_moves_old_months(pool, archive):
+    with pool.connection() as conn:
+        moved = archive.archive(conn, now=NOW, batch_size=1)
+    assert moved == {'2023-11': 2, '2024-01': 1, '2024-02': 1, '2024-03': 1}
+
+    with pool.connection(readonly=True) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM quiz_attempts").fetchone()[0] == 3
+        assert conn.execute("SELECT MIN(created_at) FROM quiz_attempts").fetchone()[0] >= archive.cutoff(NOW)
+        months = conn.execute("SELECT month, rows, first_at, last_at FROM attempt_archives ORDER BY month").fetchall()
+    assert [tuple(row) for row in months] == [
+        ('2023-11', 2, _stamp(200), _stamp(199)),
+        ('2024-01', 1, _stamp(150), _stamp(150)),
+        ('2024-02', 1, _stamp(120), _stamp(120)),
+        ('2024-03', 1, _stamp(100), _stamp(100)),
+    ]
+    archived = sqlite3.connect(archive.path('2023-11'))
+    assert [row[0] for row in archived.execute("SELECT id FROM quiz_attempts ORDER BY id")] == [1, 2]
+    archived.close()
+
+    with pool.connection() as conn:
+        assert archive.archive(conn, now=NOW) == {}
+
+
+def test_interrupted_archive_is_not_duplicated(pool, archive):
+    with pool.connection() as conn:
+        archive.archive(conn, now=NOW)
+        # 模擬寫入封存檔後、從主資料庫刪除前中斷
+        conn.execute(
+            "INSERT INTO quiz_attempts (id, line_user_id, chapter_id, section_id, user_answer, is_correct, created_at) "
+            "VALUES (2, 'U1', 1, 5, 'A', 1, ?)", (_stamp(199),)
+        )
+    with pool.connection() as conn:
+        assert archive.archive(conn, now=NOW) == {'2023-11': 1}
+        assert conn.execute("SELECT rows FROM attempt_archives WHERE month = '2023-11'").fetchone()[0] == 2
+        assert attempt_totals(conn, archive) == (len(ANSWERS), 5)
+
+
+class _CrashBeforeDelete:
+    """轉送到真正的連線，但從主資料庫刪除已封存的紀錄時丟出例外 (模擬行程中斷)"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def executemany(self, sql, rows):
+        if sql.startswith("DELETE FROM quiz_attempts"):
+            raise RuntimeError("crash")
+        return self.conn.executemany(sql, rows)
+
+
+def test_resume_after_crash_keeps_archived_rows_visible(pool, archive):
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            archive.archive(_CrashBeforeDelete(conn), now=NOW)
+    with pool.connection(readonly=True) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM attempt_archives").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM quiz_attempts").fetchone()[0] == len(ANSWERS)
+
+    with pool.connection() as conn:
+        expected = _summaries(conn)
+        assert archive.archive(conn, now=NOW) == {'2023-11': 2, '2024-01': 1, '2024-02': 1, '2024-03': 1}
+        assert conn.execute("SELECT rows FROM attempt_archives WHERE month = '2023-11'").fetchone()[0] == 2
+        assert archive.months(conn) == ['2023-11', '2024-01', '2024-02', '2024-03']
+        assert attempt_totals(conn, archive) == (len(ANSWERS), 5)
+        assert _summaries(conn, archive) == expected
+
+
+def test_queries_only_open_archives_for_long_ranges(pool, archive):
+    with pool.connection(readonly=True) as conn:
+        before = {days: attempt_totals(conn, since=NOW - timedelta(days=days)) for days in (7, 60, 160, 365)}
+    with pool.connection() as conn:
+        archive.archive(conn, now=NOW)
+
+    with pool.connection(readonly=True) as conn:
+        assert archive.months(conn, since=NOW - timedelta(days=60)) == []
+        assert archive.months(conn, since=NOW - timedelta(days=160)) == ['2024-01', '2024-02', '2024-03']
+        assert archive.months(conn, until=NOW - timedelta(days=180)) == ['2023-11']
+        for days, totals in before.items():
+            assert attempt_totals(conn, archive, since=NOW - timedelta(days=days)) == totals
+        assert attempt_totals(conn, archive) == (len(ANSWERS), 5)
+
+        rows = archive.query(
+            conn, "SELECT line_user_id, COUNT(*) FROM {attempts} GROUP BY line_user_id",
+            since=NOW - timedelta(days=130), until=NOW - timedelta(days=5)
+        )
+        counts = {}
+        for user_id, count in rows:
+            counts[user_id] = counts.get(user_id, 0) + count
+        assert counts == {'U1': 3, 'U2': 1}
+
+
+def test_rebuild_includes_archived_attempts(pool, archive):
+    with pool.connection() as conn:
+        expected = _summaries(conn)
+    with pool.connection() as conn:
+        archive.archive(conn, now=NOW)
+    with pool.connection() as conn:
+        assert _summaries(conn, archive) == expected
+        assert _summaries(conn) != expected
+
+
+def test_compact(pool, archive):
+    with pool.connection() as conn:
+        archive.archive(conn, now=NOW)
+    sizes = archive.compact()
+    assert sorted(sizes) == ['2023-11', '2024-01', '2024-02', '2024-03']
+    assert all(size > 0 for size in sizes.values())
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試書籍內容熱更新：驗證、原子替換、失敗時保留舊版本
+"""
+import copy
+import json
+import time
+
+import pytest
+
+from models.book_content import BookContentError, BookContentManager
+from test_book_index import SAMPLE_BOOK
+
+
+def write_book(path, data):
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+
+
+def edited_book(title):
+    data = copy.deepcopy(SAMPLE_BOOK)
+    data['chapters'][0]['title'] = title
+    return data
+
+
+def test_reload_swaps_snapshot(tmp_path):
+    path = tmp_path / 'book.json'
+    write_book(path, SAMPLE_BOOK)
+    manager = BookContentManager(str(path), watch_interval=0)
+    old = manager.load()
+    assert manager.reload() is False
+
+    write_book(path, edited_book("CH 1 revised"))
+    assert manager.reload() is True
+    new = manager.current
+    assert new.version != old.version
+    assert new.index.get_chapter(1).title == "CH 1 revised"
+    # 處理中的請求仍持有舊快照
+    assert old.index.get_chapter(1).title == "CH 1"
+    assert manager.stats()["reloads"] == 1
+
+
+def test_invalid_book_keeps_current_version(tmp_path):
+    path = tmp_path / 'book.json'
+    write_book(path, SAMPLE_BOOK)
+    manager = BookContentManager(str(path), watch_interval=0)
+    old = manager.load()
+
+    broken = copy.deepcopy(SAMPLE_BOOK)
+    broken['chapters'][0]['sections'][2]['content']['answer'] = 'Z'
+    write_book(path, broken)
+    with pytest.raises(BookContentError):
+        manager.reload()
+    path.write_text("{not json", encoding='utf-8')
+    with pytest.raises(BookContentError):
+        manager.reload()
+
+    assert manager.current is old
+    stats = manager.stats()
+    assert stats["failures"] == 2
+    assert stats["last_error"]
+
+
+def test_missing_book_loads_empty(tmp_path):
+    manager = BookContentManager(str(tmp_path / 'missing.json'), watch_interval=0)
+    content = manager.load()
+    assert content.index.chapter_list == []
+    assert content.render_cache.get(1, 1) is None
+
+
+def test_watcher_picks_up_changes(tmp_path):
+    path = tmp_path / 'book.json'
+    write_book(path, SAMPLE_BOOK)
+    manager = BookContentManager(str(path), watch_interval=0.02)
+    old = manager.load()
+    manager.current
+
+    write_book(path, edited_book("CH 1 watched"))
+    deadline = time.time() + 5
+    while manager.current is old and time.time() < deadline:
+        time.sleep(0.02)
+    assert manager.current.index.get_chapter(1).title == "CH 1 watched"
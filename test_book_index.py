@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試 BookIndex 的章節/段落查詢與預先計算的導覽資料
+"""
+from models.book_index import BookIndex
+
+SAMPLE_BOOK = {
+    "chapters": [
+        {
+            "chapter_id": 1,
+            "title": "CH 1",
+            "image_url": "https://example.com/ch1.png",
+            "sections": [
+                {"section_id": 2, "type": "content", "content": "second"},
+                {"section_id": 1, "type": "content", "content": "first"},
+                {"section_id": 3, "type": "quiz", "content": {"question": "q", "options": {"A": "a", "B": "b"}, "answer": "A"}},
+                {"section_id": 4, "type": "quiz", "content": {"question": "q", "options": {"A": "a", "B": "b"}, "answer": "B"}},
+            ]
+        },
+        {
+            "chapter_id": 2,
+            "title": "CH 2",
+            "sections": [
+                {"section_id": 1, "type": "content", "content": "only"},
+            ]
+        }
+    ]
+}
+
+def test_lookup():
+    index = BookIndex(SAMPLE_BOOK)
+    assert len(index) == 2
+    assert index.total_sections == 5
+    assert index.get_section(1, 2)['content'] == "second"
+    assert index.get_section(1, 9) is None
+    assert index.get_section(9, 1) is None
+    assert index.get_chapter(3) is None
+
+def test_reading_order_and_links():
+    chapter = BookIndex(SAMPLE_BOOK).get_chapter(1)
+    assert chapter.reading_order == [0, 1, 2]
+    assert chapter.start_section_id == 0
+    assert chapter.first_quiz_id == 3
+    assert chapter.content_links(1) == (0, 2)
+    assert chapter.content_links(2) == (1, None)
+    assert chapter.neighbor(0, 'next') == 1
+    assert chapter.neighbor(0, 'prev') is None
+    assert chapter.neighbor(2, 'next') is None
+    # 不在閱讀順序中的段落 (例如測驗) 視為第一段
+    assert chapter.neighbor(3, 'next') == 1
+
+def test_positions():
+    index = BookIndex(SAMPLE_BOOK)
+    chapter = index.get_chapter(1)
+    assert chapter.total_display == 3
+    assert chapter.display_position(1) == 2
+    assert chapter.quiz_position(4) == 2
+
+    no_image = index.get_chapter(2)
+    assert no_image.start_section_id == 1
+    assert no_image.content_links(1) == (None, None)
+    assert no_image.display_position(1) == 1
+
+def test_completed_content():
+    index = BookIndex(SAMPLE_BOOK)
+    assert index.completed_content(1, 1) == 0
+    assert index.completed_content(1, 3) == 2
+    assert index.completed_content(2, 1) == 2
+    assert index.total_content == 3
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試 bookpack：編譯後的內容包與原本的 book.json 內容一致
+"""
+import gc
+import json
+import weakref
+
+import pytest
+
+from bookpack import BookPack, BookPackError, compile_book
+from models.book_content import BookContentManager
+from models.book_index import BookIndex
+from utils.render_cache import RenderCache
+from test_book_index import SAMPLE_BOOK
+
+
+def plain(value):
+    if hasattr(value, 'items'):
+        return {key: plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [plain(item) for item in value]
+    return value
+
+
+@pytest.fixture
+def paths(tmp_path):
+    json_path = tmp_path / 'book.json'
+    json_path.write_text(json.dumps(SAMPLE_BOOK), encoding='utf-8')
+    pack_path, _ = compile_book(str(json_path), validate=False)
+    return str(json_path), pack_path
+
+
+def test_pack_matches_source(paths):
+    _, pack_path = paths
+    pack = BookPack(pack_path)
+    assert plain(pack.as_book()) == SAMPLE_BOOK
+    assert 'image_url' not in pack.chapters[1]
+    assert pack.chapters[1].get('image_url') is None
+
+
+def test_render_cache_output_is_identical(paths):
+    _, pack_path = paths
+    from_json = RenderCache(BookIndex(SAMPLE_BOOK))
+    from_pack = RenderCache(BookIndex(BookPack(pack_path).as_book()))
+    for chapter_id in (1, 2, 3):
+        for section_id in (0, 1, 2, 3, 4, 99):
+            assert from_json.get(chapter_id, section_id) == from_pack.get(chapter_id, section_id)
+
+
+def test_manager_loads_pack_with_source_version(paths):
+    json_path, pack_path = paths
+    from_json = BookContentManager(json_path, watch_interval=0).load()
+    from_pack = BookContentManager(pack_path, watch_interval=0).load()
+    assert from_pack.version == from_json.version
+    assert from_pack.index.get_section(1, 3)['content']['answer'] == 'A'
+
+
+def test_reload_releases_old_pack(paths):
+    json_path, pack_path = paths
+    manager = BookContentManager(pack_path, watch_interval=0)
+    gc.disable()
+    try:
+        content = manager.load()
+        pack = weakref.ref(content.data['chapters'][0].pack)
+        buffer = pack()._buffer
+        chapter = content.index.get_chapter(1)
+        del content
+
+        data = json.loads(open(json_path, encoding='utf-8').read())
+        data['chapters'][0]['title'] = "CH 1 revised"
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        compile_book(json_path, pack_path, validate=False)
+        assert manager.reload() is True
+        # 處理中的請求仍持有舊版本的章節
+        assert not buffer.closed
+        assert chapter.title == "CH 1"
+        del chapter
+        assert pack() is None
+        assert buffer.closed
+    finally:
+        gc.enable()
+
+
+def test_rejects_invalid_pack(tmp_path):
+    path = tmp_path / 'bad.pack'
+    path.write_bytes(b'NOTAPACK' * 20)
+    with pytest.raises(BookPackError):
+        BookPack(str(path))
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試文字指令路由：每個現有指令片語都對應到正確的處理函式與參數
+"""
+import pytest
+
+from utils.command_router import AhoCorasick, CommandRouter, Route, build_default_router
+
+ROUTES = [
+    # 閱讀內容
+    ("閱讀內容", Route('start_reading', ())),
+    ("開始閱讀", Route('start_reading', ())),
+    ("閱讀", Route('start_reading', ())),
+    ("read", Route('start_reading', ())),
+    ("Start", Route('start_reading', ())),
+    # 章節選擇
+    ("章節選擇", Route('chapter_carousel', ())),
+    ("選擇章節", Route('chapter_carousel', ())),
+    ("chapter", Route('chapter_carousel', ())),
+    ("Chapters", Route('chapter_carousel', ())),
+    # 書籤
+    ("我的書籤", Route('bookmarks', ())),
+    ("書籤", Route('bookmarks', ())),
+    ("bookmark", Route('bookmarks', ())),
+    ("bookmarks", Route('bookmarks', ())),
+    # 上次進度
+    ("上次進度", Route('resume', ())),
+    ("繼續閱讀", Route('resume', ())),   # 優先於「閱讀」
+    ("進度", Route('resume', ())),
+    ("continue", Route('resume', ())),
+    ("resume", Route('resume', ())),
+    # 測驗
+    ("本章測驗", Route('quiz', ())),
+    ("測驗題", Route('quiz', ())),
+    ("測驗", Route('quiz', ())),
+    ("quiz", Route('quiz', ())),
+    ("test", Route('quiz', ())),
+    # 複習 (優先於「測驗」)
+    ("複習", Route('review', ())),
+    ("複習測驗", Route('review', ())),
+    ("review", Route('review', ())),
+    # 錯誤分析
+    ("錯誤分析", Route('analytics', ())),
+    ("分析", Route('analytics', ())),
+    ("analytics", Route('analytics', ())),
+    ("analysis", Route('analytics', ())),
+    # 學習進度 (優先於「進度」)
+    ("學習進度", Route('progress', ())),
+    ("我的進度", Route('progress', ())),
+    ("progress", Route('progress', ())),
+    # 狀態
+    ("狀態", Route('status', ())),
+    ("資訊", Route('status', ())),
+    ("status", Route('status', ())),
+    ("info", Route('status', ())),
+    # 幫助
+    ("幫助", Route('help', ())),
+    ("說明", Route('help', ())),
+    ("指令", Route('help', ())),
+    ("help", Route('help', ())),
+    ("command", Route('help', ())),
+    # 數字與「第N章」
+    ("1", Route('chapter', (1,))),
+    ("7", Route('chapter', (7,))),
+    ("３", Route('chapter', (3,))),
+    ("第1章", Route('chapter', (1,))),
+    ("第7章", Route('chapter', (7,))),
+    (" 第 2 章 ", Route('chapter', (2,))),
+    # 快速導航
+    ("n", Route('navigate', ('next',))),
+    ("Next", Route('navigate', ('next',))),
+    ("下", Route('navigate', ('next',))),
+    ("下一段", Route('navigate', ('next',))),
+    ("下一", Route('navigate', ('next',))),
+    ("b", Route('navigate', ('prev',))),
+    ("back", Route('navigate', ('prev',))),
+    ("prev", Route('navigate', ('prev',))),
+    ("上", Route('navigate', ('prev',))),
+    ("上一段", Route('navigate', ('prev',))),
+    ("上一", Route('navigate', ('prev',))),
+    # 跳轉
+    ("跳到第2章第3段", Route('jump', (2, 3))),
+    ("跳轉 3章 12段", Route('jump', (3, 12))),
+    # 搜尋 (優先於查詢內容中的其他關鍵字)
+    ("搜尋 according to", Route('search', ('according to',))),
+    ("搜索：不可數名詞", Route('search', ('不可數名詞',))),
+    ("搜尋 test", Route('search', ('test',))),
+    ("搜尋", Route('search', ('',))),
+    # 關鍵字出現在句子中
+    ("我想看我的書籤", Route('bookmarks', ())),
+    ("please help me", Route('help', ())),
+    ("我想開始閱讀第三章", Route('start_reading', ())),
+]
+
+UNKNOWN = ["", "hello", "0", "8", "第8章", "第10章", "跳到哪裡", "nn", "上上"]
+
+
+@pytest.fixture(scope="module")
+def router():
+    return build_default_router()
+
+
+@pytest.mark.parametrize("text, expected", ROUTES)
+def test_routes(router, text, expected):
+    assert router.route(text) == expected
+
+
+@pytest.mark.parametrize("text", UNKNOWN)
+def test_unknown(router, text):
+    assert router.route(text) is None
+
+
+def test_priority_overrides_registration_order():
+    router = CommandRouter()
+    router.add_keywords('low', ['ab'], 1)
+    router.add_keywords('high', ['b'], 10)
+    router.compile()
+    assert router.route("xab") == Route('high', ())
+
+
+def test_automaton_reports_overlapping_matches():
+    automaton = AhoCorasick()
+    for word in ['he', 'she', 'his', 'hers']:
+        automaton.add(word, word)
+    found = sorted((end, keyword) for end, keyword, _ in automaton.search("ushers"))
+    assert found == [(3, 'he'), (3, 'she'), (5, 'hers')]
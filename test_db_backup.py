@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試線上備份：分段複製的結果完整、備份期間的寫入會觸發重新開始但仍能完成、
+壓縮輸出、驗證失敗時不留下備份檔，以及舊備份的輪替
+"""
+import gzip
+import os
+import sqlite3
+import time
+
+import pytest
+
+from utils.db_backup import BackupError, online_backup, rotate_backups, verify_backup
+from utils.db_pool import SQLitePool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLitePool(str(tmp_path / "live.db"))
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE items (name TEXT)")
+        conn.executemany("INSERT INTO items VALUES (?)", [('x' * 200,)] * 2000)
+    return pool
+
+
+def _count(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_paged_backup(pool, tmp_path):
+    target = str(tmp_path / "backup.db")
+    stats = online_backup(pool.database, target, pages=10, sleep=0)
+    assert stats['steps'] > 1
+    assert stats['restarts'] == 0
+    assert stats['integrity'] == 'ok'
+    assert _count(target) == 2000
+    assert sorted(os.listdir(tmp_path)) == ['backup.db', 'live.db', 'live.db-shm', 'live.db-wal']
+
+
+def test_writes_during_backup_restart_then_finish(pool, tmp_path, monkeypatch):
+    target = str(tmp_path / "backup.db")
+    sleep = time.sleep
+
+    def write_between_steps(seconds):
+        with pool.connection() as conn:
+            conn.execute("INSERT INTO items VALUES ('during')")
+        sleep(0)
+
+    monkeypatch.setattr(time, 'sleep', write_between_steps)
+    stats = online_backup(pool.database, target, pages=10, sleep=0.001, max_restarts=2)
+    assert stats['restarts'] == 3
+    assert stats['integrity'] == 'ok'
+    assert 2000 < _count(target) <= 2003
+
+
+def test_compressed_backup(pool, tmp_path):
+    target = str(tmp_path / "backup.db.gz")
+    stats = online_backup(pool.database, target, compress=True)
+    assert stats['output_bytes'] < stats['bytes']
+    with gzip.open(target, 'rb') as packed:
+        (tmp_path / "restored.db").write_bytes(packed.read())
+    assert verify_backup(str(tmp_path / "restored.db")) == 'ok'
+    assert _count(str(tmp_path / "restored.db")) == 2000
+    assert not os.path.exists(target + '.tmp')
+
+
+def test_failed_verification_leaves_no_backup(tmp_path):
+    source = tmp_path / "broken.db"
+    source.write_bytes(b'not a database' * 100)
+    with pytest.raises(BackupError):
+        online_backup(str(source), str(tmp_path / "backup.db"))
+    assert sorted(os.listdir(tmp_path)) == ['broken.db']
+
+
+def test_rotate_keeps_newest(tmp_path):
+    for index in range(5):
+        path = tmp_path / f"live.db.backup_{index}"
+        path.write_bytes(b'')
+        os.utime(path, (1000 + index, 1000 + index))
+    (tmp_path / "live.db.backup_9.tmp").write_bytes(b'')
+    removed = rotate_backups(str(tmp_path / "live.db.backup_*"), keep=2)
+    assert sorted(os.path.basename(path) for path in removed) == [f"live.db.backup_{index}" for index in range(3)]
+    assert sorted(os.listdir(tmp_path)) == ['live.db.backup_3', 'live.db.backup_4', 'live.db.backup_9.tmp']
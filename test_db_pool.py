@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試 SQLite 連線池的 PRAGMA 設定、讀寫分離與 commit 行為
+"""
+import sqlite3
+import threading
+import pytest
+from utils.db_pool import SQLitePool, PoolTimeoutError
+
+def make_pool(tmp_path, **kwargs):
+    pool = SQLitePool(str(tmp_path / "test.db"), **kwargs)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE items (name TEXT)")
+    return pool
+
+def test_wal_and_pragmas(tmp_path):
+    pool = make_pool(tmp_path)
+    with pool.connection(readonly=True) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 20000
+        assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2
+
+def test_commit_only_after_write(tmp_path):
+    pool = make_pool(tmp_path)
+    with pool.connection() as conn:
+        conn.execute("SELECT COUNT(*) FROM items").fetchone()
+    assert pool.stats()["commits"] == 0
+    with pool.connection() as conn:
+        conn.execute("INSERT INTO items VALUES ('a')")
+    assert pool.stats()["commits"] == 1
+
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            conn.execute("INSERT INTO items VALUES ('b')")
+            raise RuntimeError("boom")
+    with pool.connection(readonly=True) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 1
+    assert pool.stats()["rollbacks"] == 1
+
+def test_readonly_connections_reject_writes(tmp_path):
+    pool = make_pool(tmp_path)
+    with pytest.raises(sqlite3.OperationalError):
+        with pool.connection(readonly=True) as conn:
+            conn.execute("INSERT INTO items VALUES ('a')")
+
+def test_pool_is_bounded(tmp_path):
+    pool = make_pool(tmp_path, write_size=1, checkout_timeout=0.05)
+    with pool.connection():
+        with pytest.raises(PoolTimeoutError):
+            with pool.connection():
+                pass
+    stats = pool.stats()["write"]
+    assert stats["created"] == 1 and stats["in_use"] == 0 and stats["idle"] == 1
+
+def test_cooperative_mode_waits_for_write_lock(tmp_path):
+    pool = make_pool(tmp_path, cooperative=True, timeout=2.0)
+    with pool.connection(readonly=True) as conn:
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 50
+    # 另一個連線 (模擬其他 worker) 持有寫入鎖一段時間
+    other = sqlite3.connect(str(tmp_path / "test.db"), isolation_level=None, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    releaser = threading.Timer(0.2, other.execute, args=("COMMIT",))
+    releaser.start()
+    with pool.connection() as conn:
+        assert conn.in_transaction
+        conn.execute("INSERT INTO items VALUES ('a')")
+    releaser.join()
+    assert pool.stats()["lock_waits"] > 0
+    with pool.connection(readonly=True) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 1
+
+def test_cooperative_mode_gives_up_after_timeout(tmp_path):
+    pool = make_pool(tmp_path, cooperative=True, timeout=0.1)
+    other = sqlite3.connect(str(tmp_path / "test.db"), isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    with pytest.raises(sqlite3.OperationalError):
+        with pool.connection() as conn:
+            pass
+    other.execute("ROLLBACK")
+    stats = pool.stats()["write"]
+    assert stats["in_use"] == 0
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試重複操作過濾器與操作次數統計
+"""
+import os
+from utils.dedup import ActionDeduplicator, SharedActionDeduplicator, ActionCounter
+
+def check_cooldown(dedup):
+    assert not dedup.is_duplicate("U1", "action=navigate", now=100.0)
+    assert dedup.is_duplicate("U1", "action=navigate", now=101.0)
+    assert not dedup.is_duplicate("U2", "action=navigate", now=101.0)
+    assert not dedup.is_duplicate("U1", "action=chapter_quiz", now=101.0)
+    assert not dedup.is_duplicate("U1", "action=navigate", now=102.5)
+
+def test_memory_cooldown():
+    check_cooldown(ActionDeduplicator(cooldown=2.0))
+
+def test_shared_cooldown():
+    check_cooldown(SharedActionDeduplicator(cooldown=2.0, buckets=16))
+
+def test_memory_is_bounded():
+    dedup = ActionDeduplicator(cooldown=100.0, max_entries=50)
+    for i in range(200):
+        dedup.is_duplicate(f"U{i}", "x", now=float(i))
+    assert len(dedup) == 50
+    # 過期的紀錄會被移除
+    dedup.is_duplicate("U_last", "x", now=1000.0)
+    assert len(dedup) == 1
+
+def test_shared_across_fork():
+    dedup = SharedActionDeduplicator(cooldown=60.0, buckets=16)
+    pid = os.fork()
+    if pid == 0:
+        dedup.is_duplicate("U1", "action=navigate")
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert dedup.is_duplicate("U1", "action=navigate")
+
+def test_action_counter_window():
+    counter = ActionCounter(window=10)
+    for t in range(3):
+        counter.record("U1", now=float(t))
+    assert counter.count("U1", now=5.0) == 3
+    assert counter.count("U1", now=20.0) == 0
+    counter.record("U1", now=20.0)
+    assert counter.count("U1", now=20.0) == 1
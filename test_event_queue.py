@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試 webhook 事件佇列的順序保證與滿載時的拒絕行為
+"""
+import threading
+import time
+import pytest
+from utils.event_queue import EventQueue, QueueFullError
+
+class FakeEvent:
+    def __init__(self, user_id, seq):
+        self.user_id = user_id
+        self.seq = seq
+
+def test_per_user_order():
+    seen = {}
+    lock = threading.Lock()
+
+    def dispatch(event, destination):
+        time.sleep(0.001)
+        with lock:
+            seen.setdefault(event.user_id, []).append(event.seq)
+
+    events = [FakeEvent(f"U{i % 5}", i) for i in range(100)]
+    event_queue = EventQueue(dispatch, lambda e: e.user_id, workers=3, maxsize=300)
+    for start in range(0, 100, 10):
+        event_queue.submit(events[start:start + 10])
+    event_queue.shutdown()
+
+    assert event_queue.stats()["processed"] == 100
+    for user_id, seqs in seen.items():
+        assert seqs == sorted(seqs)
+
+def test_rejects_when_full():
+    release = threading.Event()
+    event_queue = EventQueue(lambda e, d: release.wait(), lambda e: e.user_id, workers=1, maxsize=2)
+    event_queue.submit([FakeEvent("U1", 0)])
+    time.sleep(0.05)
+    event_queue.submit([FakeEvent("U1", 1), FakeEvent("U1", 2)])
+    with pytest.raises(QueueFullError):
+        event_queue.submit([FakeEvent("U1", 3)])
+    assert event_queue.stats()["dropped"] == 1
+    release.set()
+    event_queue.shutdown()
+    assert event_queue.stats()["processed"] == 3
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試 webhookEventId 重複事件過濾
+"""
+import os
+
+import pytest
+
+from utils.idempotency import RotatingBloomFilter, EventIdempotencyGuard
+
+def test_bloom_rotation():
+    bloom = RotatingBloomFilter(capacity=100, error_rate=0.01, generations=2)
+    for i in range(100):
+        bloom.add(f"E{i}")
+    assert all(f"E{i}" in bloom for i in range(100))
+    # 寫滿兩代後最舊的一代被清空
+    for i in range(100, 300):
+        bloom.add(f"E{i}")
+    assert sum(f"E{i}" in bloom for i in range(100)) < 10
+    assert all(f"E{i}" in bloom for i in range(200, 300))
+
+def test_guard_skips_seen_events():
+    guard = EventIdempotencyGuard(capacity=1000, recent_size=10)
+    assert not guard.check_and_mark("E1")
+    assert guard.check_and_mark("E1")
+    for i in range(2, 20):
+        guard.check_and_mark(f"E{i}")
+    # 已離開精確集合的 ID 只在重新傳送時以 Bloom filter 判斷
+    assert not guard.check_and_mark("E1", is_redelivery=False)
+    assert guard.check_and_mark("E2", is_redelivery=True)
+    assert not guard.check_and_mark(None)
+    assert guard.stats()["skipped"] == 2
+
+def test_redelivery_seen_by_other_worker():
+    guard = EventIdempotencyGuard(capacity=1000)
+    pid = os.fork()
+    if pid == 0:
+        guard.check_and_mark("E_forked")
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert guard.check_and_mark("E_forked", is_redelivery=True)
+
+def test_failed_handler_does_not_mark_event():
+    from utils.webhook_dispatch import DispatchingWebhookHandler
+    from linebot.v3.webhooks import FollowEvent
+
+    guard = EventIdempotencyGuard(capacity=1000)
+    handler = DispatchingWebhookHandler('secret', idempotency_guard=guard)
+    calls = []
+
+    @handler.add(FollowEvent)
+    def on_follow(event):
+        calls.append(event.delivery_context.is_redelivery)
+        if len(calls) == 1:
+            raise RuntimeError("temporary failure")
+
+    def follow_event(is_redelivery):
+        return FollowEvent.from_dict({
+            'type': 'follow', 'mode': 'active', 'timestamp': 0, 'webhookEventId': 'E_retry',
+            'deliveryContext': {'isRedelivery': is_redelivery}, 'replyToken': 'r',
+            'source': {'type': 'user', 'userId': 'U1'}, 'follow': {'isUnblocked': False},
+        })
+
+    with pytest.raises(RuntimeError):
+        handler.dispatch(follow_event(False))
+    # 第一次處理失敗，重新傳送的事件仍會處理
+    handler.dispatch(follow_event(True))
+    assert calls == [False, True]
+    # 處理成功後的重新傳送才略過
+    handler.dispatch(follow_event(True))
+    assert calls == [False, True]
+    assert guard.stats()["skipped"] == 1
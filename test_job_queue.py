@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試背景工作佇列：批次執行、重試退避、無法重試的錯誤與中斷後重新領取
+"""
+import time
+
+import pytest
+
+from init_db import ensure_job_table
+from utils.db_pool import SQLitePool
+from utils.job_queue import JobQueue, PermanentJobError
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLitePool(str(tmp_path / "jobs.db"))
+    with pool.connection() as conn:
+        ensure_job_table(conn)
+    return pool
+
+
+def make_queue(pool, **kwargs):
+    kwargs.setdefault('base_delay', 0.0)
+    kwargs.setdefault('autostart', False)
+    return JobQueue(pool.connection, **kwargs)
+
+
+def job_rows(pool):
+    with pool.connection(readonly=True) as conn:
+        return [tuple(row) for row in conn.execute(
+            "SELECT payload, status, attempts, last_error FROM jobs ORDER BY id")]
+
+
+def test_batch_handler_receives_payloads_in_chunks(pool):
+    queue = make_queue(pool)
+    batches = []
+    queue.register('link', batches.append, batch_size=2)
+    with pool.connection() as conn:
+        for user_id in ['U1', 'U2', 'U3']:
+            queue.enqueue('link', user_id, conn=conn)
+    assert queue.run_pending() == 3
+    assert batches == [['U1', 'U2'], ['U3']]
+    assert [row[1] for row in job_rows(pool)] == ['done'] * 3
+    assert queue.run_pending() == 0
+
+
+def test_failures_retry_with_backoff_until_max_attempts(pool):
+    queue = make_queue(pool, max_attempts=3)
+    calls = []
+
+    def flaky(payload):
+        calls.append(payload)
+        raise RuntimeError("timeout")
+
+    queue.register('profile', flaky)
+    queue.enqueue('profile', 'U1')
+    for _ in range(3):
+        queue.run_pending()
+    assert len(calls) == 3
+    assert job_rows(pool) == [('U1', 'failed', 3, 'timeout')]
+    assert (queue.retried, queue.failed) == (2, 1)
+
+
+def test_retry_waits_for_backoff(pool):
+    queue = make_queue(pool, base_delay=60.0)
+    queue.register('profile', lambda payload: 1 / 0)
+    queue.enqueue('profile', 'U1')
+    assert queue.run_pending() == 1
+    # 下次執行時間在 30~60 秒後
+    assert queue.run_pending() == 0
+    assert job_rows(pool)[0][1] == 'pending'
+    assert 30 <= queue.retry_delay(1) <= 60
+    assert queue.retry_delay(20) <= queue.max_delay
+
+
+def test_permanent_error_is_not_retried(pool):
+    queue = make_queue(pool)
+
+    def missing(payload):
+        raise PermanentJobError("LINE API 404 Not Found")
+
+    queue.register('profile', missing)
+    queue.enqueue('profile', 'U1')
+    queue.run_pending()
+    assert job_rows(pool) == [('U1', 'failed', 1, 'LINE API 404 Not Found')]
+
+
+def test_abandoned_running_jobs_are_reclaimed(pool):
+    queue = make_queue(pool, lease=0.05)
+    done = []
+    queue.register('profile', done.append)
+    queue.enqueue('profile', 'U1')
+    # 模擬 worker 領取後中斷
+    assert len(queue._claim(10)) == 1
+    assert queue.run_pending() == 0
+    time.sleep(0.1)
+    assert queue.run_pending() == 1
+    assert done == ['U1']
+    assert job_rows(pool) == [('U1', 'done', 2, None)]
+
+
+def test_two_queues_never_claim_the_same_job(pool):
+    first, second = make_queue(pool), make_queue(pool)
+    for queue in (first, second):
+        queue.register('profile', lambda payload: None)
+    for i in range(10):
+        first.enqueue('profile', f'U{i}')
+    claimed = first._claim(6) + second._claim(6)
+    assert sorted(job.payload for job in claimed) == sorted(f'U{i}' for i in range(10))
+
+
+def test_unknown_kind_rejected(pool):
+    queue = make_queue(pool)
+    with pytest.raises(ValueError):
+        queue.enqueue('missing', 'U1')
+
+
+def test_single_jobs_run_concurrently(pool):
+    queue = make_queue(pool, concurrency=4)
+    queue.register('profile', lambda payload: time.sleep(0.1))
+    with pool.connection() as conn:
+        for i in range(4):
+            queue.enqueue('profile', f'U{i}', conn=conn)
+    started = time.perf_counter()
+    assert queue.run_pending() == 4
+    assert time.perf_counter() - started < 0.3
+    assert [row[1] for row in job_rows(pool)] == ['done'] * 4
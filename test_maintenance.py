@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試資料庫例行維護：過期資料分批刪除、批次大小依持有鎖的時間調整、
+只在離峰時段以 incremental_vacuum 歸還空頁
+"""
+import pytest
+
+from utils.db_pool import SQLitePool
+from utils.maintenance import CleanupRule, MaintenanceScheduler
+
+NOW = 1_700_000_000.0
+RULES = [CleanupRule('user_actions', 'user_actions', 'timestamp', lambda now: now - 3600)]
+
+
+def make_pool(tmp_path, rows=1000, **kwargs):
+    pool = SQLitePool(str(tmp_path / "maintenance.db"), **kwargs)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE user_actions (line_user_id TEXT, action_data TEXT, timestamp REAL NOT NULL)")
+        conn.execute("CREATE INDEX idx_user_actions_timestamp ON user_actions(timestamp)")
+        conn.executemany(
+            "INSERT INTO user_actions VALUES ('U1', ?, ?)",
+            [('x' * 500, NOW - 7200 if index % 4 else NOW) for index in range(rows)]
+        )
+    return pool
+
+
+def make_scheduler(pool, **kwargs):
+    options = dict(batch_size=100, pause=0, quiet_after=30.0, autostart=False)
+    options.update(kwargs)
+    return MaintenanceScheduler(pool.connection, RULES, **options)
+
+
+def test_deletes_expired_rows_in_batches(tmp_path):
+    pool = make_pool(tmp_path)
+    scheduler = make_scheduler(pool, max_lock_ms=1000)
+    assert scheduler.delete_expired(RULES[0], NOW) == 750
+    with pool.connection(readonly=True) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM user_actions").fetchone()[0] == 250
+        assert conn.execute("SELECT MIN(timestamp) FROM user_actions").fetchone()[0] == NOW
+    assert scheduler.batches > 1
+    # 每批都遠低於上限，批次逐步加大
+    assert scheduler.stats()["batch_sizes"]["user_actions"] > 100
+    assert scheduler.delete_expired(RULES[0], NOW) == 0
+
+
+def test_batch_shrinks_when_lock_budget_exceeded(tmp_path):
+    pool = make_pool(tmp_path)
+    scheduler = make_scheduler(pool, max_lock_ms=0.000001)
+    assert scheduler.delete_expired(RULES[0], NOW) == 750
+    stats = scheduler.stats()
+    assert stats["batch_sizes"]["user_actions"] < 100
+    assert stats["max_lock_observed_ms"] > stats["max_lock_ms"]
+    assert stats["deleted"] == {"user_actions": 750}
+
+
+def test_vacuum_only_when_quiet(tmp_path):
+    pool = make_pool(tmp_path, rows=2000)
+    scheduler = make_scheduler(pool, vacuum_pages=50, max_lock_ms=1000)
+    scheduler.delete_expired(RULES[0], NOW)
+    free = scheduler.stats()["freelist_pages"]
+    assert scheduler.stats()["auto_vacuum"] == 2
+    assert free > 50
+
+    scheduler.touch()
+    assert not scheduler.is_quiet()
+    assert scheduler.vacuum() == 0
+
+    scheduler.quiet_after = 0
+    assert scheduler.vacuum() == free
+    assert scheduler.stats()["freelist_pages"] == 0
+    assert scheduler.batches > 2
+
+
+def test_vacuum_skipped_without_incremental_auto_vacuum(tmp_path):
+    pool = make_pool(tmp_path, auto_vacuum=None)
+    scheduler = make_scheduler(pool, quiet_after=0)
+    report = scheduler.run_once(NOW)
+    assert report == {'user_actions': 750, 'vacuumed_pages': 0}
+    assert scheduler.stats()["freelist_pages"] > 0
+
+
+@pytest.mark.parametrize("force", [True, False])
+def test_run_once_force_vacuum(tmp_path, force):
+    pool = make_pool(tmp_path)
+    scheduler = make_scheduler(pool)
+    scheduler.touch()
+    report = scheduler.run_once(NOW, force_vacuum=force)
+    assert report['user_actions'] == 750
+    assert (report['vacuumed_pages'] > 0) == force
+    assert scheduler.runs == 1
+
+
+def test_where_limits_deleted_rows(tmp_path):
+    pool = make_pool(tmp_path, rows=0)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE jobs (status TEXT, updated_at REAL)")
+        conn.executemany("INSERT INTO jobs VALUES (?, ?)",
+                         [('failed', NOW - 7200), ('pending', NOW - 7200), ('failed', NOW)])
+    rule = CleanupRule('failed_jobs', 'jobs', 'updated_at', lambda now: now - 3600, where="status = 'failed'")
+    scheduler = MaintenanceScheduler(pool.connection, [rule], pause=0, autostart=False)
+    assert scheduler.delete_expired(rule, NOW) == 1
+    with pool.connection(readonly=True) as conn:
+        rows = conn.execute("SELECT status, updated_at FROM jobs ORDER BY rowid").fetchall()
+    assert [tuple(row) for row in rows] == [('pending', NOW - 7200), ('failed', NOW)]
+
+
+def test_cascade_deletes_dependent_rows_in_same_batch(tmp_path):
+    from init_db import CLEANUP_RULES, REVIEW_SCHEDULE_SCHEMA, USER_QUESTION_STATS_SCHEMA, USER_STATS_SCHEMA
+
+    pool = make_pool(tmp_path, rows=0)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE users (line_user_id TEXT UNIQUE, last_active TIMESTAMP)")
+        conn.execute("CREATE TABLE bookmarks (line_user_id TEXT, chapter_id INTEGER, section_id INTEGER)")
+        for schema in (USER_STATS_SCHEMA, USER_QUESTION_STATS_SCHEMA, REVIEW_SCHEDULE_SCHEMA):
+            conn.execute(schema)
+        users = [(f"U{index}", '2020-01-01 00:00:00' if index % 2 else '2099-01-01 00:00:00')
+                 for index in range(10)]
+        conn.executemany("INSERT INTO users VALUES (?, ?)", users)
+        for user_id, _ in users:
+            conn.execute("INSERT INTO bookmarks VALUES (?, 1, 1)", (user_id,))
+            conn.execute("INSERT INTO user_stats (line_user_id) VALUES (?)", (user_id,))
+            conn.execute("INSERT INTO user_question_stats (line_user_id, chapter_id, section_id) VALUES (?, 1, 1)",
+                         (user_id,))
+            conn.execute("INSERT INTO review_schedule (line_user_id, chapter_id, section_id, due_at) VALUES (?, 1, 1, 0)",
+                         (user_id,))
+    rule = [rule for rule in CLEANUP_RULES if rule.name == 'users'][0]
+    scheduler = MaintenanceScheduler(pool.connection, [rule], batch_size=2, pause=0, autostart=False)
+    assert scheduler.delete_expired(rule, NOW) == 5
+    assert scheduler.batches > 1
+    active = [f"U{index}" for index in range(0, 10, 2)]
+    with pool.connection(readonly=True) as conn:
+        for table in ('users', 'bookmarks', 'user_stats', 'user_question_stats', 'review_schedule'):
+            rows = conn.execute(f"SELECT line_user_id FROM {table} ORDER BY line_user_id").fetchall()
+            assert [row[0] for row in rows] == active, table
+
+
+def test_abandoned_push_runs_deleted_by_created_at(tmp_path):
+    from init_db import MAINTENANCE_RULES, PUSH_ABANDONED_DAYS, ensure_job_table, ensure_push_tables
+
+    pool = make_pool(tmp_path, rows=0)
+    old = NOW - (PUSH_ABANDONED_DAYS + 1) * 86400
+    with pool.connection() as conn:
+        ensure_job_table(conn)
+        ensure_push_tables(conn)
+        # 中斷的舊推播、仍在續傳的新推播、剛完成的舊推播
+        runs = [('crashed', old, None), ('sending', NOW - 60, None), ('done', old, NOW - 60)]
+        for run_key, created_at, finished_at in runs:
+            run_id = conn.execute("INSERT INTO push_runs (run_key, created_at, finished_at) VALUES (?, ?, ?)",
+                                  (run_key, created_at, finished_at)).lastrowid
+            conn.execute("INSERT INTO push_batches (run_id, retry_key, messages, user_ids, recipients) "
+                         "VALUES (?, 'k', '[]', '[]', 1)", (run_id,))
+        plan = " ".join(row[3] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT rowid FROM push_runs WHERE created_at < ? AND (finished_at IS NULL)", (NOW,)))
+        assert 'USING INDEX idx_push_runs_finished_at' in plan
+    scheduler = MaintenanceScheduler(pool.connection, MAINTENANCE_RULES, pause=0, autostart=False)
+    report = scheduler.run_once(now=NOW)
+    assert report['abandoned_push_runs'] == 1
+    assert report['push_runs'] == 0
+    with pool.connection(readonly=True) as conn:
+        rows = conn.execute("SELECT run_key FROM push_runs ORDER BY id").fetchall()
+        assert [row[0] for row in rows] == ['sending', 'done']
+        assert conn.execute("SELECT COUNT(*) FROM push_batches").fetchone()[0] == 2
+
+
+def test_user_actions_older_than_one_day_deleted(tmp_path):
+    from init_db import MAINTENANCE_RULES
+
+    pool = make_pool(tmp_path)
+    with pool.connection() as conn:
+        conn.execute("UPDATE user_actions SET timestamp = ? WHERE timestamp < ?", (NOW - 2 * 86400, NOW))
+    rule = [rule for rule in MAINTENANCE_RULES if rule.name == 'user_actions'][0]
+    scheduler = MaintenanceScheduler(pool.connection, [rule], pause=0, autostart=False)
+    assert scheduler.delete_expired(rule, NOW) == 750
+    with pool.connection(readonly=True) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM user_actions").fetchone()[0] == 250
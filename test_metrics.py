@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試延遲直方圖、錯誤計數與跨行程彙總
+"""
+import os
+
+import pytest
+
+from utils.line_client import endpoint_label
+from utils.metrics import MetricsRegistry, mark_error
+
+
+def test_histogram_buckets_and_errors():
+    registry = MetricsRegistry(buckets=(0.01, 0.1))
+    latency = registry.histogram('demo_duration_seconds', 'demo', ['handler'])
+    latency.observe(0.005, handler='a')
+    latency.observe(0.05, handler='a')
+    latency.observe(0.5, handler='a', error=True)
+    text = registry.render()
+    assert 'demo_duration_seconds_bucket{handler="a",le="0.01"} 1' in text
+    assert 'demo_duration_seconds_bucket{handler="a",le="0.1"} 2' in text
+    assert 'demo_duration_seconds_bucket{handler="a",le="+Inf"} 3' in text
+    assert 'demo_duration_seconds_count{handler="a"} 3' in text
+    assert 'demo_duration_seconds_sum{handler="a"} 0.555000' in text
+    assert '# TYPE demo_errors_total counter' in text
+    assert 'demo_errors_total{handler="a"} 1' in text
+
+
+def test_timed_records_raised_and_marked_errors():
+    registry = MetricsRegistry()
+    latency = registry.histogram('demo_duration_seconds', 'demo', ['handler'])
+
+    @latency.timed(handler='ok')
+    def ok():
+        return 1
+
+    @latency.timed(handler='caught')
+    def caught():
+        try:
+            raise RuntimeError("boom")
+        except RuntimeError:
+            mark_error()
+
+    @latency.timed(handler='raised')
+    def raised():
+        raise RuntimeError("boom")
+
+    assert ok() == 1
+    caught()
+    with pytest.raises(RuntimeError):
+        raised()
+    series, _ = registry.collect()
+    assert series['demo_duration_seconds|handler="ok"'][:2] == (1, 0)
+    assert series['demo_duration_seconds|handler="caught"'][:2] == (1, 1)
+    assert series['demo_duration_seconds|handler="raised"'][:2] == (1, 1)
+
+
+def test_nested_span_error_marks_innermost():
+    registry = MetricsRegistry()
+    latency = registry.histogram('demo_duration_seconds', 'demo', ['handler'])
+    with latency.time(handler='outer'):
+        with latency.time(handler='inner'):
+            mark_error()
+    series, _ = registry.collect()
+    assert series['demo_duration_seconds|handler="outer"'][1] == 0
+    assert series['demo_duration_seconds|handler="inner"'][1] == 1
+
+
+def test_workers_share_series():
+    registry = MetricsRegistry()
+    latency = registry.histogram('demo_duration_seconds', 'demo', ['handler'])
+    latency.observe(0.001, handler='shared')
+    pid = os.fork()
+    if pid == 0:
+        latency.observe(0.001, handler='shared')
+        latency.observe(0.001, handler='child_only')
+        os._exit(0)
+    os.waitpid(pid, 0)
+    series, _ = registry.collect()
+    assert series['demo_duration_seconds|handler="shared"'][0] == 2
+    assert series['demo_duration_seconds|handler="child_only"'][0] == 1
+
+
+def test_series_limit_counts_dropped():
+    registry = MetricsRegistry(max_series=1)
+    latency = registry.histogram('demo_duration_seconds', 'demo', ['handler'])
+    latency.observe(0.001, handler='a')
+    latency.observe(0.001, handler='b')
+    assert 'linebot_metrics_dropped_total 1' in registry.render()
+
+
+def test_label_validation_and_escaping():
+    registry = MetricsRegistry()
+    latency = registry.histogram('demo_duration_seconds', 'demo', ['handler'])
+    with pytest.raises(ValueError):
+        latency.observe(0.001, other='x')
+    latency.observe(0.001, handler='say "hi"')
+    assert 'handler="say \\"hi\\""' in registry.render()
+
+
+def test_endpoint_label_hides_ids():
+    user_id = 'U' + '0' * 32
+    assert endpoint_label(f'https://api.line.me/v2/bot/profile/{user_id}') == '/v2/bot/profile/{id}'
+    assert endpoint_label(f'/v2/bot/user/{user_id}/richmenu/richmenu-abc123') == \
+        '/v2/bot/user/{id}/richmenu/{id}'
+    assert endpoint_label('https://api.line.me/v2/bot/message/reply') == '/v2/bot/message/reply'
+
+
+def test_dispatch_calls_timed_handler_with_original_arity():
+    from utils.webhook_dispatch import DispatchingWebhookHandler
+    from linebot.v3.webhooks import FollowEvent
+
+    registry = MetricsRegistry()
+    latency = registry.histogram('demo_duration_seconds', 'demo', ['handler'])
+    handler = DispatchingWebhookHandler('secret')
+    received = []
+
+    @handler.add(FollowEvent)
+    @latency.timed(handler='follow')
+    def on_follow(event):
+        received.append(event)
+
+    event = FollowEvent.from_dict({
+        'type': 'follow', 'mode': 'active', 'timestamp': 0, 'webhookEventId': 'E1',
+        'deliveryContext': {'isRedelivery': False}, 'replyToken': 'r',
+        'source': {'type': 'user', 'userId': 'U1'}, 'follow': {'isUnblocked': False},
+    })
+    handler.dispatch(event, 'dest')
+    assert received == [event]
+    series, _ = registry.collect()
+    assert series['demo_duration_seconds|handler="follow"'][0] == 1
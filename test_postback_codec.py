@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試 postback 編碼：新格式可還原，舊的 action=... 格式仍能解碼
+"""
+import pytest
+
+from utils.postback_codec import ACTIONS, Postback, decode_postback, encode_postback
+
+ROUND_TRIPS = [
+    ('read_content', ()),
+    ('show_chapter_menu', ()),
+    ('view_bookmarks', ()),
+    ('continue_reading', ()),
+    ('chapter_quiz', ()),
+    ('view_analytics', ()),
+    ('navigate', (3, 12)),
+    ('add_bookmark', (2, 0)),
+    ('submit_answer', (1, 45, 'C')),
+    ('select_chapter', (7,)),
+    ('review', ()),
+]
+
+LEGACY = [
+    ("action=read_content", Postback('read_content', ())),
+    ("action=show_chapter_menu", Postback('show_chapter_menu', ())),
+    ("action=view_bookmarks", Postback('view_bookmarks', ())),
+    ("action=continue_reading", Postback('continue_reading', ())),
+    ("action=chapter_quiz", Postback('chapter_quiz', ())),
+    ("action=view_analytics", Postback('view_analytics', ())),
+    ("action=navigate&chapter_id=3&section_id=12", Postback('navigate', (3, 12))),
+    ("action=navigate", Postback('navigate', (1, 1))),
+    ("action=add_bookmark&chapter_id=2&section_id=0", Postback('add_bookmark', (2, 0))),
+    ("action=submit_answer&chapter_id=1&section_id=45&answer=C", Postback('submit_answer', (1, 45, 'C'))),
+    ("action=select_chapter&chapter_id=7", Postback('select_chapter', (7,))),
+    ("5", Postback('select_chapter', (5,))),
+]
+
+
+@pytest.mark.parametrize("action, args", ROUND_TRIPS)
+def test_round_trip(action, args):
+    data = encode_postback(action, *args)
+    assert decode_postback(data) == Postback(action, args)
+
+
+def test_compact_format():
+    assert encode_postback('navigate', 3, 12) == 'n:3:12'
+    assert encode_postback('view_analytics') == 'a'
+    codes = [code for code, _ in ACTIONS.values()]
+    assert len(codes) == len(set(codes))
+
+
+@pytest.mark.parametrize("data, expected", LEGACY)
+def test_legacy_payloads(data, expected):
+    assert decode_postback(data) == expected
+
+
+@pytest.mark.parametrize("data", ["", "x:1", "action=unknown", "hello"])
+def test_unknown(data):
+    assert decode_postback(data) is None
+
+
+@pytest.mark.parametrize("data", ["n:3", "n:x:1", "action=navigate&chapter_id=x"])
+def test_malformed(data):
+    with pytest.raises(ValueError):
+        decode_postback(data)
+
+
+def test_wrong_argument_count():
+    with pytest.raises(ValueError):
+        encode_postback('navigate', 1)
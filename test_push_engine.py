@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試 multicast 推播：批次規劃、限速、重試、中斷後續送不重複推播，
+以及學習提醒的收件者查詢 (對本機模擬的 LINE API 執行)
+"""
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from benchmarks.line_stub import LineStubServer
+from init_db import ensure_push_tables, USERS_REMINDER_INDEX
+from models.book_index import BookIndex
+from send_reminders import build_groups, select_recipients
+from utils.db_pool import SQLitePool
+from utils.line_client import LineClient
+from utils.push_engine import MULTICAST_PATH, PushEngine, TokenBucket
+
+MESSAGES = [{"type": "text", "text": "提醒"}]
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLitePool(str(tmp_path / "push.db"))
+    with pool.connection() as conn:
+        conn.execute('''
+            CREATE TABLE users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                line_user_id TEXT UNIQUE NOT NULL,
+                display_name TEXT,
+                current_chapter_id INTEGER,
+                current_section_id INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute(USERS_REMINDER_INDEX)
+        ensure_push_tables(conn)
+    return pool
+
+
+@pytest.fixture
+def stub():
+    stub = LineStubServer().start()
+    yield stub
+    stub.stop()
+
+
+def make_engine(pool, stub, **kwargs):
+    kwargs.setdefault('rate', 1000)
+    kwargs.setdefault('base_delay', 0.0)
+    return PushEngine(pool.connection, LineClient('token', host=stub.url), **kwargs)
+
+
+def users(count, prefix='U'):
+    return [f"{prefix}{index:05d}" for index in range(count)]
+
+
+def delivered(stub):
+    """回傳每位收件者被推播的次數"""
+    counts = {}
+    for method, path, body in stub.requests:
+        assert (method, path) == ('POST', MULTICAST_PATH)
+        for user_id in json.loads(body)['to']:
+            counts[user_id] = counts.get(user_id, 0) + 1
+    return counts
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=200, burst=1)
+    started = time.perf_counter()
+    for _ in range(21):
+        bucket.acquire()
+    assert time.perf_counter() - started >= 0.09
+    assert bucket.waited > 0
+
+
+def test_plan_splits_groups_and_is_idempotent(pool, stub):
+    engine = make_engine(pool, stub)
+    run_id = engine.plan('r1', [(MESSAGES, users(1200)), (MESSAGES, users(3, 'V') * 2)])
+    assert engine.plan('r1', [(MESSAGES, users(50, 'W'))]) == run_id
+
+    with pool.connection(readonly=True) as conn:
+        sizes = [row[0] for row in conn.execute(
+            "SELECT recipients FROM push_batches WHERE run_id = ? ORDER BY id", (run_id,))]
+    assert sizes == [500, 500, 200, 3]
+    assert engine.stats(run_id)['recipients'] == 1203
+
+
+def test_send_delivers_each_recipient_once(pool, stub):
+    engine = make_engine(pool, stub)
+    run_id = engine.plan('r1', [(MESSAGES, users(1200)), ([{"type": "text", "text": "B"}], users(300, 'V'))])
+    report = engine.send(run_id)
+
+    assert report['sent'] == 4
+    assert report['recipients'] == 1500
+    assert report['requests_per_second'] > 0
+    counts = delivered(stub)
+    assert len(counts) == 1500 and set(counts.values()) == {1}
+    assert json.loads(stub.requests[0][2])['messages'] == MESSAGES
+    assert engine.stats(run_id)['status'] == 'done'
+
+    # 再次執行沒有待送的批次
+    assert engine.send(run_id)['requests'] == 0
+    assert len(stub.requests) == 4
+
+
+def test_retries_transient_errors_and_fails_on_client_errors(pool, stub):
+    engine = make_engine(pool, stub, concurrency=1)
+    stub.fail_next(2, status=500)
+    report = engine.send(engine.plan('r1', [(MESSAGES, users(10))]))
+    assert (report['sent'], report['retries'], report['failed']) == (1, 2, 0)
+
+    stub.fail_next(1, status=400)
+    run_id = engine.plan('r2', [(MESSAGES, users(10, 'V'))])
+    report = engine.send(run_id)
+    assert (report['sent'], report['retries'], report['failed']) == (0, 0, 1)
+    stats = engine.stats(run_id)
+    assert stats['by_status'] == {'failed': 1}
+    assert stats['status'] == 'done'
+
+
+def test_resume_after_crash_does_not_double_send(pool, stub):
+    engine = make_engine(pool, stub, concurrency=1)
+    run_id = engine.plan('r1', [(MESSAGES, users(1500))])
+
+    # 第二批送出後、記錄完成前中斷
+    finish = engine._finish
+    calls = []
+
+    def crash(batch_id, status, attempts, error=None):
+        calls.append(batch_id)
+        if len(calls) == 2:
+            raise RuntimeError("worker killed")
+        finish(batch_id, status, attempts, error)
+
+    engine._finish = crash
+    with pytest.raises(RuntimeError):
+        engine.send(run_id)
+    assert len(stub.requests) == 2
+
+    report = make_engine(pool, stub).send(run_id)
+    assert (report['sent'], report['duplicates'], report['failed']) == (1, 1, 0)
+    counts = delivered(stub)
+    assert len(counts) == 1500 and set(counts.values()) == {1}
+    assert engine.stats(run_id)['by_status'] == {'sent': 3}
+
+
+def test_select_recipients_uses_activity_window(pool):
+    now = datetime(2026, 5, 10, 12, 0, tzinfo=timezone.utc)
+
+    def ago(**delta):
+        return (now - timedelta(**delta)).strftime('%Y-%m-%d %H:%M:%S')
+
+    rows = [
+        ('Urecent', 1, ago(hours=2)),
+        ('Uidle1', 1, ago(days=2)),
+        ('Uidle2', 2, ago(days=3)),
+        ('Unochapter', None, ago(days=2)),
+        ('Ugone', 1, ago(days=30)),
+        ('Uremoved', 99, ago(days=2)),
+    ]
+    with pool.connection() as conn:
+        conn.executemany(
+            "INSERT INTO users (line_user_id, current_chapter_id, last_active) VALUES (?, ?, ?)", rows)
+        plan = ' '.join(row[-1] for row in conn.execute('''
+            EXPLAIN QUERY PLAN SELECT current_chapter_id, line_user_id FROM users
+            WHERE last_active >= ? AND last_active < ? AND current_chapter_id IS NOT NULL
+        ''', ('a', 'b')))
+    assert 'COVERING INDEX idx_users_reminder' in plan
+
+    with pool.connection(readonly=True) as conn:
+        recipients = select_recipients(conn, now, inactive_hours=24, max_idle_days=14)
+    assert recipients == {1: ['Uidle1'], 2: ['Uidle2'], 99: ['Uremoved']}
+
+    book = BookIndex({"chapters": [
+        {"chapter_id": 1, "title": "名詞", "sections": []},
+        {"chapter_id": 2, "title": "動詞", "sections": []},
+    ]})
+    groups = build_groups(recipients, book)
+    assert [recipients for _, recipients in groups] == [['Uidle1'], ['Uidle2']]
+    assert '動詞' in groups[1][0][0]['text']
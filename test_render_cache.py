@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試導覽回覆訊息快取
+"""
+import json
+from models.book_index import BookIndex
+from utils.render_cache import RenderCache, build_reply_body
+from test_book_index import SAMPLE_BOOK
+
+def test_payloads_are_serialized_messages():
+    cache = RenderCache(BookIndex(SAMPLE_BOOK))
+    image = json.loads(cache.get(1, 0))
+    assert [m['type'] for m in image] == ['image', 'text']
+
+    content = json.loads(cache.get(1, 2))
+    assert content[0]['text'] == "second"
+    assert content[1]['text'].startswith("📖 第 3/3 段")
+    labels = [item['action']['label'] for item in content[1]['quickReply']['items']]
+    assert labels == ["⬅️ 上一段", "📝 開始測驗", "🔖 標記"]
+
+    quiz = json.loads(cache.get(1, 4))
+    assert quiz[0]['text'].startswith("📝 測驗 2/2")
+
+def test_missing_targets():
+    cache = RenderCache(BookIndex(SAMPLE_BOOK))
+    assert cache.get(9, 1) is None
+    # 不存在的段落共用同一個章節完成畫面
+    assert cache.get(1, 99) is cache.get(1, 100)
+    assert json.loads(cache.get(2, 0))[0]['type'] == 'template'
+
+def test_warm_and_reply_body():
+    cache = RenderCache(BookIndex(SAMPLE_BOOK))
+    assert cache.warm() == len(cache) == 8
+    body = json.loads(build_reply_body("token", cache.get(2, 1)))
+    assert body['replyToken'] == "token"
+    assert body['messages'][0]['text'] == "only"
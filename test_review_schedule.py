@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試間隔重複複習排程：SM-2 間隔計算、作答時的增量更新、到期查詢使用索引，
+以及由 quiz_attempts 重建的排程與逐題更新的結果相同；複習時略過並刪除書中已刪除的題目
+"""
+import os
+
+import pytest
+
+from init_db import REVIEW_SCHEDULE_SCHEMA, REVIEW_SCHEDULE_INDEX
+from models.review_schedule import (
+    DAY, NEW_STATE, RELEARN_DELAY, due_count, due_items, load_state, next_due_at,
+    next_state, rebuild_review_schedule, record_answer, remove_items
+)
+from utils.db_pool import SQLitePool
+
+NOW = 1_700_000_000.0
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLitePool(str(tmp_path / "review.db"))
+    with pool.connection() as conn:
+        conn.execute('''
+            CREATE TABLE quiz_attempts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                line_user_id TEXT NOT NULL,
+                chapter_id INTEGER NOT NULL,
+                section_id INTEGER NOT NULL,
+                user_answer TEXT NOT NULL,
+                is_correct BOOLEAN NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute(REVIEW_SCHEDULE_SCHEMA)
+        conn.execute(REVIEW_SCHEDULE_INDEX)
+    return pool
+
+
+def test_intervals_grow_with_correct_answers():
+    state = NEW_STATE
+    intervals = []
+    now = NOW
+    for _ in range(4):
+        state = next_state(state, True, now)
+        intervals.append(state.interval_days)
+        now = state.due_at
+    assert intervals == [1.0, 6.0, 15.0, 37.5]
+    assert state.ease == 2.5
+
+
+def test_wrong_answer_resets_and_lowers_ease():
+    state = next_state(next_state(NEW_STATE, True, NOW), True, NOW + DAY)
+    state = next_state(state, False, NOW + 7 * DAY)
+    assert state.repetitions == 0
+    assert state.lapses == 1
+    assert state.ease < 2.5
+    assert state.due_at == NOW + 7 * DAY + RELEARN_DELAY
+
+
+def test_correct_answer_before_due_keeps_schedule():
+    state = next_state(NEW_STATE, True, NOW)
+    assert next_state(state, True, NOW + 3600) == state
+
+
+def test_due_queries(pool):
+    with pool.connection() as conn:
+        record_answer(conn, 'U1', 1, 5, False, NOW)
+        record_answer(conn, 'U1', 1, 6, True, NOW)
+        record_answer(conn, 'U1', 2, 3, False, NOW + 60)
+        record_answer(conn, 'U2', 1, 5, False, NOW)
+
+    with pool.connection(readonly=True) as conn:
+        later = NOW + RELEARN_DELAY + 60
+        assert [tuple(row[:2]) for row in due_items(conn, 'U1', later, limit=5)] == [(1, 5), (2, 3)]
+        assert due_count(conn, 'U1', later) == 2
+        assert due_count(conn, 'U1', NOW) == 0
+        assert due_count(conn, 'U3', later) == 0
+        assert next_due_at(conn, 'U1') == NOW + RELEARN_DELAY
+        assert next_due_at(conn, 'U3') is None
+
+        for sql in ("SELECT chapter_id, section_id, due_at FROM review_schedule "
+                    "WHERE line_user_id = ? AND due_at <= ? ORDER BY due_at LIMIT 1",
+                    "SELECT COUNT(*) FROM review_schedule WHERE line_user_id = ? AND due_at <= ?"):
+            plan = ' '.join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", ('U1', NOW)))
+            assert 'idx_review_schedule_due' in plan
+            assert 'TEMP B-TREE' not in plan
+
+
+def test_rebuild_matches_incremental_updates(pool):
+    answers = [
+        ('U1', 1, 5, False, '2024-01-01 10:00:00'),
+        ('U1', 1, 5, True, '2024-01-01 10:20:00'),
+        ('U1', 1, 5, True, '2024-01-03 09:00:00'),
+        ('U1', 2, 1, True, '2024-01-02 08:00:00'),
+        ('U2', 1, 5, False, '2024-01-05 12:00:00'),
+    ]
+    with pool.connection() as conn:
+        conn.executemany(
+            "INSERT INTO quiz_attempts (line_user_id, chapter_id, section_id, user_answer, is_correct, created_at) "
+            "VALUES (?, ?, ?, 'A', ?, ?)", answers
+        )
+        timestamps = dict(conn.execute(
+            "SELECT id, CAST(strftime('%s', created_at) AS REAL) FROM quiz_attempts").fetchall())
+        for attempt_id, (user_id, chapter_id, section_id, correct, _) in enumerate(answers, 1):
+            record_answer(conn, user_id, chapter_id, section_id, correct, timestamps[attempt_id])
+        incremental = conn.execute("SELECT * FROM review_schedule ORDER BY 1, 2, 3").fetchall()
+
+        assert rebuild_review_schedule(conn, batch_size=1) == 3
+        rebuilt = conn.execute("SELECT * FROM review_schedule ORDER BY 1, 2, 3").fetchall()
+        assert [tuple(row) for row in rebuilt] == [tuple(row) for row in incremental]
+        assert load_state(conn, 'U1', 1, 5).repetitions == 2
+
+
+def test_review_removes_deleted_sections(pool, monkeypatch):
+    os.environ.setdefault('CHANNEL_SECRET', 'test_secret_12345678901234567890123456789012')
+    os.environ.setdefault('CHANNEL_ACCESS_TOKEN', 'test_token')
+    os.environ.setdefault('MAIN_RICH_MENU_ID', 'richmenu-test123456789012345')
+    import app
+
+    monkeypatch.setattr(app, 'db_pool', pool)
+    app.init_database()
+    replies = []
+    line_api = type('LineApi', (), {'reply_message': lambda self, request: replies.append(request)})()
+    with pool.connection() as conn:
+        # 書中不存在的題目比實際的題目更早到期，且超過一批
+        stale = [(99, section_id) for section_id in range(app.REVIEW_BATCH_SIZE + 2)]
+        for index, (chapter_id, section_id) in enumerate(stale):
+            record_answer(conn, 'U1', chapter_id, section_id, False, NOW + index)
+        record_answer(conn, 'U1', 1, 31, False, NOW + 100)
+        record_answer(conn, 'U2', 99, 0, False, NOW)
+
+    app.handle_review('U1', 'r1', line_api)
+    assert replies[0].messages[0].text.startswith("🔁 複習模式 (待複習 1 題)\n\n第1章第31段")
+    with pool.connection(readonly=True) as conn:
+        assert [tuple(row[:2]) for row in due_items(conn, 'U1', limit=10)] == [(1, 31)]
+
+    app.handle_review('U2', 'r2', line_api)
+    assert replies[1].messages[0].text.startswith("尚未有需要複習的題目")
+    with pool.connection() as conn:
+        assert due_count(conn, 'U2') == 0
+        remove_items(conn, 'U1', [(1, 31)])
+        assert next_due_at(conn, 'U1') is None
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試全文檢索：斷詞、BM25 排序，以及提前結束的查詢結果與完整計分一致
+"""
+import json
+
+import pytest
+
+from models.book_index import BookIndex
+from models.search_index import SearchIndex, snippet, tokenize
+
+BOOK = {
+    "chapters": [
+        {
+            "chapter_id": 1,
+            "title": "CH 1",
+            "sections": [
+                {"section_id": 1, "type": "content", "content": "使用according to時的常見錯誤"},
+                {"section_id": 2, "type": "content", "content": "age 與 old 的用法, at the age of 18"},
+                {"section_id": 3, "type": "quiz", "content": {"question": "according to?", "options": {"A": "a", "B": "b"}, "answer": "A"}},
+            ]
+        },
+        {
+            "chapter_id": 2,
+            "title": "CH 2",
+            "sections": [
+                {"section_id": 1, "type": "content", "content": "不可數名詞的數量: a piece of paper, according to the news"},
+            ]
+        }
+    ]
+}
+
+
+def test_tokenize_words_and_bigrams():
+    assert tokenize("According to 不可數名詞, it's 紙") == [
+        'according', 'to', '不可', '可數', '數名', '名詞', "it's", '紙'
+    ]
+
+
+def test_search_ranks_and_skips_quiz_sections():
+    index = SearchIndex(BookIndex(BOOK))
+    assert len(index) == 3
+    hits = index.search("according to")
+    assert [(hit.chapter_id, hit.section_id) for hit in hits] == [(1, 1), (2, 1)]
+    assert hits[0].score > hits[1].score
+    assert [(hit.chapter_id, hit.section_id) for hit in index.search("名詞")] == [(2, 1)]
+    assert index.search("xyzzy") == []
+    assert index.search("") == []
+
+
+def test_sections_without_terms():
+    book = {"chapters": [{"chapter_id": 1, "title": "CH 1", "sections": [
+        {"section_id": 1, "type": "content", "content": "!!!"},
+        {"section_id": 2, "type": "content", "content": ""},
+    ]}]}
+    index = SearchIndex(BookIndex(book))
+    assert len(index) == 2
+    assert index.search("according") == []
+
+
+def exhaustive(index, query, limit):
+    scores = {}
+    for term in set(tokenize(query)):
+        for doc, weight in index.postings.get(term, {}).items():
+            scores[doc] = scores.get(doc, 0.0) + weight
+    return sorted(scores.values(), reverse=True)[:limit]
+
+
+@pytest.mark.parametrize("query", [
+    "according to", "age", "a piece of", "不可數名詞", "現在完成式", "the", "的用法", "be going to",
+])
+def test_early_termination_matches_exhaustive_scores(query):
+    with open('book.json', encoding='utf-8') as f:
+        index = SearchIndex(BookIndex(json.load(f)))
+    hits = index.search(query, limit=5)
+    assert [hit.score for hit in hits] == pytest.approx(exhaustive(index, query, 5))
+
+
+def test_snippet_centers_on_match():
+    text = "x" * 50 + "according to the rules" + "y" * 50
+    assert "according" in snippet(text, "according to")
+    assert snippet("short", "missing") == "short"
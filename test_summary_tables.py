@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試統計表：作答與加入書籤時的增量更新、第一次建立時的回填與 reconcile 重建，
+結果都與直接掃描 quiz_attempts、bookmarks 相同；錯誤分析的排行與原本逐筆彙總作答紀錄的結果相同
+"""
+import os
+import random
+
+import pytest
+
+os.environ.setdefault('CHANNEL_SECRET', 'test_secret_12345678901234567890123456789012')
+os.environ.setdefault('CHANNEL_ACCESS_TOKEN', 'test_token')
+os.environ.setdefault('MAIN_RICH_MENU_ID', 'richmenu-test123456789012345')
+
+import app
+from init_db import SUMMARY_TABLES, ensure_summary_tables, rebuild_user_stats
+from utils.db_pool import SQLitePool
+
+USERS = [f"U{index}" for index in range(6)]
+QUIZZES = [(1, 31), (1, 32), (1, 33), (2, 45), (2, 46), (3, 32)]
+
+
+class RecordingLineApi:
+    def __init__(self):
+        self.replies = []
+
+    def reply_message(self, request):
+        self.replies.append(request)
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    pool = SQLitePool(str(tmp_path / "summary.db"))
+    monkeypatch.setattr(app, 'db_pool', pool)
+    app.init_database()
+    return pool
+
+
+def answer_randomly(seed=7, answers=300):
+    rng = random.Random(seed)
+    line_api = RecordingLineApi()
+    book_index = app.book_content.current.index
+    for _ in range(answers):
+        chapter_id, section_id = rng.choice(QUIZZES)
+        content = book_index.get_section(chapter_id, section_id)['content']
+        option = content['answer'] if rng.random() < 0.6 else rng.choice(sorted(content['options']))
+        app.handle_answer(rng.choice(USERS), chapter_id, section_id, option, 'r', line_api)
+    for user_id in USERS[:4]:
+        for chapter_id, section_id in rng.sample(QUIZZES, 3):
+            app.handle_add_bookmark(user_id, chapter_id, section_id, 'r', line_api)
+            # 重複加入不增加計數
+            app.handle_add_bookmark(user_id, chapter_id, section_id, 'r', line_api)
+    return line_api
+
+
+def scan_user_stats(conn):
+    """不經統計表，直接由原始資料計算 {user: (書籤數, 作答數, 答對數)}"""
+    stats = {}
+    for user_id, count in conn.execute("SELECT line_user_id, COUNT(*) FROM bookmarks GROUP BY line_user_id"):
+        stats[user_id] = (count, 0, 0)
+    for user_id, attempts, correct in conn.execute(
+            "SELECT line_user_id, COUNT(*), SUM(is_correct) FROM quiz_attempts GROUP BY line_user_id"):
+        stats[user_id] = (stats.get(user_id, (0,))[0], attempts, correct)
+    return stats
+
+
+def scan_question_stats(conn):
+    return {
+        (user_id, chapter_id, section_id): (attempts, wrong)
+        for user_id, chapter_id, section_id, attempts, wrong in conn.execute(
+            """SELECT line_user_id, chapter_id, section_id, COUNT(*), SUM(is_correct = 0)
+               FROM quiz_attempts GROUP BY line_user_id, chapter_id, section_id""")
+    }
+
+
+def user_stats(conn):
+    return {
+        row[0]: tuple(row[1:])
+        for row in conn.execute("SELECT line_user_id, bookmark_count, attempt_count, correct_count FROM user_stats")
+    }
+
+
+def question_stats(conn):
+    return {
+        tuple(row[:3]): tuple(row[3:])
+        for row in conn.execute("SELECT line_user_id, chapter_id, section_id, attempts, wrong FROM user_question_stats")
+    }
+
+
+def test_incremental_updates_match_scan(pool):
+    line_api = answer_randomly()
+    assert len(line_api.replies) == 300 + 24
+    with pool.connection(readonly=True) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM quiz_attempts").fetchone()[0] == 300
+        assert user_stats(conn) == scan_user_stats(conn)
+        assert question_stats(conn) == scan_question_stats(conn)
+        assert app.get_user_stats(conn, 'U_unknown') == {'bookmark_count': 0, 'attempt_count': 0, 'correct_count': 0}
+
+
+def test_backfill_on_first_create_matches_scan(pool):
+    answer_randomly(seed=11)
+    with pool.connection() as conn:
+        expected = (scan_user_stats(conn), scan_question_stats(conn))
+        for table_name, _, _ in SUMMARY_TABLES:
+            conn.execute(f"DROP TABLE {table_name}")
+    with pool.connection() as conn:
+        ensure_summary_tables(conn)
+    with pool.connection(readonly=True) as conn:
+        assert (user_stats(conn), question_stats(conn)) == expected
+    # 已存在的統計表不會再回填
+    with pool.connection() as conn:
+        conn.execute("UPDATE user_stats SET attempt_count = attempt_count + 1")
+        ensure_summary_tables(conn)
+        assert user_stats(conn) != expected[0]
+
+
+def test_reconcile_repairs_drift(pool):
+    answer_randomly(seed=23)
+    with pool.connection() as conn:
+        expected = scan_user_stats(conn)
+        conn.execute("UPDATE user_stats SET attempt_count = 0 WHERE line_user_id = 'U1'")
+        conn.execute("DELETE FROM user_stats WHERE line_user_id = 'U2'")
+        conn.execute("INSERT INTO user_stats (line_user_id, attempt_count) VALUES ('U_gone', 5)")
+        assert rebuild_user_stats(conn) == len(expected)
+    with pool.connection(readonly=True) as conn:
+        assert user_stats(conn) == expected
+
+
+# 改用 user_question_stats 前的查詢；原本同分時的順序未定義，這裡補上章節順序比較
+PER_ATTEMPT_TOP_ERRORS = """
+    SELECT chapter_id, section_id, COUNT(*) as error_count,
+           COUNT(*) * 100.0 / (SELECT COUNT(*) FROM quiz_attempts qa2
+                               WHERE qa2.line_user_id = qa.line_user_id
+                               AND qa2.chapter_id = qa.chapter_id
+                               AND qa2.section_id = qa.section_id) as error_rate
+    FROM quiz_attempts qa
+    WHERE line_user_id = ? AND is_correct = 0
+    GROUP BY chapter_id, section_id
+    ORDER BY error_count DESC, error_rate DESC, chapter_id, section_id
+    LIMIT 5
+"""
+
+
+def test_error_analytics_matches_per_attempt_aggregation(pool):
+    answer_randomly(seed=31, answers=600)
+    line_api = RecordingLineApi()
+    for user_id in USERS:
+        app.handle_error_analytics(user_id, 'r', line_api)
+    with pool.connection(readonly=True) as conn:
+        for user_id, reply in zip(USERS, line_api.replies):
+            expected = [tuple(row) for row in conn.execute(PER_ATTEMPT_TOP_ERRORS, (user_id,))]
+            assert expected
+            text = reply.messages[0].text
+            lines = [f"{rank}. 第{chapter_id}章第{section_id}段 (錯{error_count}次)"
+                     for rank, (chapter_id, section_id, error_count, _) in enumerate(expected, 1)]
+            assert "❌ 最需要加強的題目：\n" + "\n".join(lines) + "\n" in text
+            wrong = conn.execute(
+                "SELECT COUNT(*) FROM quiz_attempts WHERE line_user_id = ? AND is_correct = 0", (user_id,)
+            ).fetchone()[0]
+            assert f"答錯次數：{wrong} 次" in text
+            labels = [item.action.label for item in reply.messages[0].quick_reply.items]
+            assert labels == [f"複習 第{chapter_id}章第{section_id}段" for chapter_id, section_id, _, _ in expected[:3]]
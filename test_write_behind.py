@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試使用者更新的延遲批次寫入
+"""
+import sqlite3
+from contextlib import contextmanager
+from utils.write_behind import UserWriteBuffer
+
+def make_buffer(batch_size=100):
+    db = sqlite3.connect(':memory:', check_same_thread=False)
+    db.row_factory = sqlite3.Row
+    db.execute("CREATE TABLE users (line_user_id TEXT UNIQUE, current_chapter_id INTEGER, current_section_id INTEGER, last_active TIMESTAMP)")
+    db.executemany("INSERT INTO users (line_user_id) VALUES (?)", [("U1",), ("U2",)])
+
+    @contextmanager
+    def connection():
+        yield db
+        db.commit()
+
+    return db, UserWriteBuffer(connection, interval=3600, batch_size=batch_size)
+
+def test_updates_are_merged_per_user():
+    db, buffer = make_buffer()
+    buffer.touch("U1")
+    buffer.touch("U1")
+    buffer.touch("U2")
+    assert buffer.stats()["pending"] == 2
+
+    assert buffer.flush() == 2
+    rows = {r['line_user_id']: r for r in db.execute("SELECT * FROM users")}
+    assert rows["U1"]['last_active'] is not None
+    assert rows["U2"]['last_active'] is not None
+    assert buffer.stats()["last_batch_size"] == 2
+    assert buffer.flush() == 0
+
+def test_position_is_written_through():
+    db, buffer = make_buffer()
+    buffer.set_position("U1", 4, 0)
+    # 不等 flush，其他 worker 直接從資料庫讀到新位置
+    row = db.execute("SELECT current_chapter_id, current_section_id FROM users WHERE line_user_id = 'U1'").fetchone()
+    assert (row['current_chapter_id'], row['current_section_id']) == (4, 0)
+    assert buffer.stats()["pending"] == 0
+
+def test_older_flush_does_not_overwrite_newer_activity():
+    db, newer = make_buffer()
+    older = UserWriteBuffer(newer.connection_factory, interval=3600)
+    older._pending = {"U1": '2024-01-01 00:00:00'}
+    newer._pending = {"U1": '2024-01-01 00:00:05'}
+    # 兩個 worker 的批次以相反順序寫入
+    newer.flush()
+    older.flush()
+    assert db.execute("SELECT last_active FROM users WHERE line_user_id = 'U1'").fetchone()[0] == '2024-01-01 00:00:05'
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+async_line_client.py - 事件迴圈中使用的 LINE Messaging API 客戶端
+以 AsyncMessagingApi (aiohttp) 送出請求；LoopBoundLineApi 讓原本同步的處理函式
+在執行緒中執行時把 API 呼叫交給事件迴圈送出並等待結果
+"""
+import asyncio
+import concurrent.futures
+import time
+
+import aiohttp
+from linebot.v3.messaging import AsyncApiClient, AsyncMessagingApi, ApiException, Configuration
+from linebot.v3.messaging.async_rest import RESTClientObject
+
+from utils.line_client import endpoint_label
+
+
+class PooledAsyncRESTClient(RESTClientObject):
+    """固定連線數並套用預設逾時的 aiohttp 客戶端"""
+
+    def __init__(self, configuration, pool_size, timeout, latency=None):
+        super().__init__(configuration, maxsize=pool_size)
+        self.default_timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        self.latency = latency
+
+    async def request(self, method, url, query_params=None, headers=None,
+                      body=None, post_params=None, _preload_content=True,
+                      _request_timeout=None):
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = await super().request(
+                method, url, query_params=query_params, headers=headers,
+                body=body, post_params=post_params, _preload_content=_preload_content,
+                _request_timeout=_request_timeout or self.default_timeout
+            )
+            failed = False
+            return response
+        finally:
+            if self.latency is not None:
+                self.latency.observe(time.perf_counter() - started, failed,
+                                     method=method, endpoint=endpoint_label(url))
+
+
+class AsyncLineClient:
+    """連線池需在事件迴圈中建立，於 start() 時建立、close() 時關閉"""
+
+    def __init__(self, access_token, host='https://api.line.me', pool_size=100,
+                 connect_timeout=3.0, read_timeout=10.0, latency=None):
+        self.access_token = access_token
+        self.host = host.rstrip('/')
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.latency = latency
+        self.api_client = None
+        self.api = None
+        self.errors = 0
+
+    async def start(self):
+        configuration = Configuration(access_token=self.access_token, host=self.host)
+        api_client = AsyncApiClient(configuration)
+        # 取代 AsyncApiClient 預設建立的連線池
+        await api_client.rest_client.close()
+        api_client.rest_client = PooledAsyncRESTClient(
+            configuration, self.pool_size, self.timeout, latency=self.latency
+        )
+        self.api_client = api_client
+        self.api = AsyncMessagingApi(api_client)
+        return self
+
+    async def close(self):
+        if self.api_client is not None:
+            await self.api_client.close()
+            self.api_client = None
+            self.api = None
+
+    async def post(self, path, body=None, content_type='application/json', headers=None):
+        """直接送出已序列化的請求內容 (例如預先建立的回覆)"""
+        rest_client = self.api_client.rest_client
+        request_headers = dict(self.api_client.default_headers)
+        if body is not None:
+            request_headers['Content-Type'] = content_type
+        if headers:
+            request_headers.update(headers)
+        started = time.perf_counter()
+        failed = True
+        try:
+            async with rest_client.pool_manager.request(
+                'POST', f"{self.host}{path}", data=body, headers=request_headers,
+                timeout=rest_client.default_timeout
+            ) as response:
+                await response.read()
+                if not 200 <= response.status < 300:
+                    raise ApiException(status=response.status, reason=response.reason)
+            failed = False
+        finally:
+            if self.latency is not None:
+                self.latency.observe(time.perf_counter() - started, failed,
+                                     method='POST', endpoint=endpoint_label(path))
+
+    async def call(self, kind, args):
+        """送出 LoopBoundLineApi 的呼叫；失敗時記錄次數並拋出例外"""
+        try:
+            if kind == 'reply':
+                return await self.api.reply_message(*args)
+            return await self.post(*args)
+        except Exception:
+            self.errors += 1
+            raise
+
+
+class LoopBoundLineApi:
+    """在執行緒中取代 MessagingApi：呼叫交給事件迴圈執行，執行緒等待結果，
+    送出失敗時與同步的 MessagingApi 一樣在處理函式中拋出例外"""
+
+    def __init__(self, client, loop):
+        self.client = client
+        self.loop = loop
+        self.timeout = sum(client.timeout)
+
+    def _run(self, coroutine):
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        try:
+            return future.result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def reply_message(self, reply_message_request, **kwargs):
+        return self._run(self.client.call('reply', (reply_message_request,)))
+
+    def post(self, path, body=None, content_type='application/json', headers=None):
+        return self._run(self.client.call('post', (path, body, content_type, headers)))
+
+    def __getattr__(self, name):
+        method = getattr(self.client.api, name)
+
+        def call(*args, **kwargs):
+            return self._run(method(*args, **kwargs))
+        return call
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+attempt_archive.py - quiz_attempts 的冷熱分層
+最近 hot_days 天的作答紀錄留在主資料庫，較舊的依月份搬到封存目錄中的 quiz_attempts_YYYY-MM.db；
+每個封存檔涵蓋的時間範圍記錄在主資料庫的 attempt_archives 表，查詢範圍涵蓋較舊的月份時才開啟對應的封存檔，
+主資料表的大小與查詢時間不會隨歷史資料成長。
+封存檔以獨立的唯讀連線開啟 (不使用 ATTACH)，不受同時附加資料庫數量的限制，也能在交易中逐檔讀取
+"""
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# 封存檔保留原本的 id，重複搬移同一筆時以 INSERT OR IGNORE 略過
+ARCHIVE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS quiz_attempts (
+        id INTEGER PRIMARY KEY,
+        line_user_id TEXT NOT NULL,
+        chapter_id INTEGER NOT NULL,
+        section_id INTEGER NOT NULL,
+        user_answer TEXT NOT NULL,
+        is_correct BOOLEAN NOT NULL,
+        created_at TIMESTAMP
+    )
+'''
+
+ARCHIVE_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_quiz_attempts_user_id ON quiz_attempts(line_user_id)',
+    'CREATE INDEX IF NOT EXISTS idx_quiz_attempts_created_at ON quiz_attempts(created_at)',
+]
+
+COLUMNS = 'id, line_user_id, chapter_id, section_id, user_answer, is_correct, created_at'
+
+
+def default_archive_dir(database_name):
+    """linebot.db 的封存目錄預設為 linebot_archive/"""
+    return os.path.splitext(database_name)[0] + '_archive'
+
+
+def _timestamp(value):
+    """datetime 或 'YYYY-MM-DD[ HH:MM:SS]' 轉成 created_at 的格式 (UTC)"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime(TIMESTAMP_FORMAT)
+
+
+def _attempts_in_range(since, until):
+    conditions = []
+    if since is not None:
+        conditions.append(f"created_at >= '{_timestamp(since)}'")
+    if until is not None:
+        conditions.append(f"created_at < '{_timestamp(until)}'")
+    if not conditions:
+        return 'quiz_attempts'
+    return f"(SELECT * FROM quiz_attempts WHERE {' AND '.join(conditions)})"
+
+
+def _next_month(month):
+    year, number = int(month[:4]), int(month[5:7])
+    return f"{year + number // 12:04d}-{number % 12 + 1:02d}"
+
+
+class AttemptArchive:
+
+    def __init__(self, directory, hot_days=90):
+        self.directory = directory
+        self.hot_days = hot_days
+
+    def path(self, month):
+        return os.path.join(self.directory, f"quiz_attempts_{month}.db")
+
+    def cutoff(self, now=None):
+        """早於此時間的作答紀錄會被封存"""
+        now = now or datetime.now(timezone.utc)
+        return _timestamp(now - timedelta(days=self.hot_days))
+
+    def months(self, conn, since=None, until=None):
+        """與 [since, until) 有重疊的封存月份，由舊到新"""
+        sql = "SELECT month FROM attempt_archives WHERE rows > 0"
+        params = []
+        if since is not None:
+            sql += " AND last_at >= ?"
+            params.append(_timestamp(since))
+        if until is not None:
+            sql += " AND first_at < ?"
+            params.append(_timestamp(until))
+        return [row[0] for row in conn.execute(sql + " ORDER BY month", params)]
+
+    def sources(self, conn, since=None, until=None):
+        """依時間順序產生涵蓋範圍的連線：各封存檔的唯讀連線，最後是主資料庫的 conn；
+        每個連線中的作答紀錄表都叫 quiz_attempts"""
+        for month in self.months(conn, since, until):
+            source = sqlite3.connect(f"file:{self.path(month)}?mode=ro", uri=True)
+            try:
+                yield source
+            finally:
+                source.close()
+        yield conn
+
+    def query(self, conn, sql, params=(), since=None, until=None):
+        """在範圍內的每個來源執行 sql 並依序回傳各來源的結果；
+        sql 以 {attempts} 代表已套用時間範圍的作答紀錄，彙總查詢需由呼叫端合併各來源的結果"""
+        statement = sql.format(attempts=_attempts_in_range(since, until))
+        for source in self.sources(conn, since, until):
+            yield from source.execute(statement, params)
+
+    def archive(self, conn, now=None, batch_size=10000):
+        """把早於 cutoff 的作答紀錄依月份搬到封存檔，回傳 {month: 搬移筆數}；
+        每批先寫入封存檔並 commit，再從主資料庫刪除並更新 attempt_archives，
+        中斷後重新執行會略過已寫入封存檔的紀錄。conn 需為獨立的寫入連線 (會自行 commit)"""
+        cutoff = self.cutoff(now)
+        months = [row[0] for row in conn.execute(
+            "SELECT DISTINCT substr(created_at, 1, 7) FROM quiz_attempts WHERE created_at < ?", (cutoff,)
+        )]
+        if not months:
+            return {}
+        os.makedirs(self.directory, exist_ok=True)
+        moved = {}
+        for month in months:
+            upper = min(cutoff, _next_month(month))
+            archive_conn = sqlite3.connect(self.path(month))
+            try:
+                archive_conn.execute(ARCHIVE_SCHEMA)
+                for statement in ARCHIVE_INDEXES:
+                    archive_conn.execute(statement)
+                archive_conn.commit()
+                # 以封存檔實際的筆數為準，包含上次中斷前已寫入封存檔、但主資料庫尚未刪除的紀錄
+                archived = archive_conn.execute("SELECT COUNT(*) FROM quiz_attempts").fetchone()[0]
+                moved[month] = 0
+                while True:
+                    rows = conn.execute(
+                        f"""SELECT {COLUMNS} FROM quiz_attempts
+                            WHERE created_at >= ? AND created_at < ?
+                            ORDER BY created_at LIMIT ?""",
+                        (month, upper, batch_size)
+                    ).fetchall()
+                    if not rows:
+                        break
+                    before = archive_conn.total_changes
+                    archive_conn.executemany(
+                        f"INSERT OR IGNORE INTO quiz_attempts ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+                    )
+                    archive_conn.commit()
+                    archived += archive_conn.total_changes - before
+                    conn.executemany("DELETE FROM quiz_attempts WHERE id = ?", [(row[0],) for row in rows])
+                    conn.execute(
+                        """INSERT INTO attempt_archives (month, rows, first_at, last_at, archived_at)
+                           VALUES (?, ?, ?, ?, ?)
+                           ON CONFLICT(month) DO UPDATE SET
+                               rows = excluded.rows,
+                               first_at = MIN(first_at, excluded.first_at),
+                               last_at = MAX(last_at, excluded.last_at),
+                               archived_at = excluded.archived_at""",
+                        (month, archived, rows[0][6], rows[-1][6], time.time())
+                    )
+                    conn.commit()
+                    moved[month] += len(rows)
+            finally:
+                archive_conn.close()
+        return moved
+
+    def compact(self):
+        """重整所有封存檔並更新查詢統計，回傳 {month: 檔案大小}"""
+        sizes = {}
+        if not os.path.isdir(self.directory):
+            return sizes
+        for name in sorted(os.listdir(self.directory)):
+            if not (name.startswith('quiz_attempts_') and name.endswith('.db')):
+                continue
+            path = os.path.join(self.directory, name)
+            archive_conn = sqlite3.connect(path)
+            try:
+                archive_conn.execute("VACUUM")
+                archive_conn.execute("ANALYZE")
+                archive_conn.commit()
+            finally:
+                archive_conn.close()
+            sizes[name[len('quiz_attempts_'):-len('.db')]] = os.path.getsize(path)
+        return sizes
+
+
+def attempt_sources(conn, archive=None, since=None, until=None):
+    """含封存檔在內的所有作答紀錄來源；沒有設定封存時只有 conn"""
+    if archive is None:
+        return iter([conn])
+    return archive.sources(conn, since, until)
+
+
+def attempt_totals(conn, archive=None, since=None, until=None):
+    """範圍內的 (作答次數, 答對次數)，只在範圍涵蓋封存月份時才開啟封存檔"""
+    statement = f"SELECT COUNT(*), TOTAL(is_correct) FROM {_attempts_in_range(since, until)}"
+    attempts = correct = 0
+    for source in attempt_sources(conn, archive, since, until):
+        count, total = source.execute(statement).fetchone()
+        attempts += count
+        correct += int(total)
+    return attempts, correct
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+command_router.py - 文字指令路由
+所有關鍵字編譯成一個 Aho-Corasick 自動機，只需掃描訊息一次；
+多個指令同時命中時依明確的優先順序決定，不再依賴 if/elif 的排列順序
+"""
+import re
+from collections import deque, namedtuple
+
+Route = namedtuple('Route', ['command', 'args'])
+
+# 全形數字轉半形，讓「３」、「第３章」與原本 int() 的行為一致
+_FULLWIDTH_DIGITS = str.maketrans('０１２３４５６７８９', '0123456789')
+
+
+def normalize_text(text):
+    return text.strip().replace(' ', '').lower().translate(_FULLWIDTH_DIGITS)
+
+
+class AhoCorasick:
+    """多關鍵字比對自動機，search() 一次掃描即可找出所有出現的關鍵字；
+    指定 key 時 best_match() 直接回傳 key 最大的命中結果"""
+
+    def __init__(self, key=None):
+        self.key = key
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self._best = [None]
+        self._built = False
+
+    def add(self, keyword, value):
+        if not keyword:
+            raise ValueError("keyword must not be empty")
+        node = 0
+        for char in keyword:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        self._output[node].append((keyword, value))
+        self._built = False
+
+    def build(self):
+        # 以 BFS 建立失敗連結，並把失敗節點的輸出併入目前節點
+        self._fail = [0] * len(self._goto)
+        pending = deque(self._goto[0].values())
+        while pending:
+            node = pending.popleft()
+            for char, child in self._goto[node].items():
+                pending.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+        # 預先算好每個節點 key 最大的輸出，比對時不需逐一比較
+        if self.key is not None:
+            self._best = [max(output, key=lambda item: self.key(item[1])) if output else None
+                          for output in self._output]
+        self._built = True
+
+    def search(self, text):
+        """依出現位置回傳 (結束位置, 關鍵字, 值)"""
+        if not self._built:
+            self.build()
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for keyword, value in output[node]:
+                yield index, keyword, value
+
+    def best_match(self, text):
+        """回傳 key 最大的 (關鍵字, 值)；同分時取最先出現者，沒有命中回傳 None"""
+        if not self._built:
+            self.build()
+        goto, fail, best, key = self._goto, self._fail, self._best, self.key
+        node = 0
+        found = None
+        found_key = None
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            candidate = best[node]
+            if candidate is not None:
+                candidate_key = key(candidate[1])
+                if found is None or candidate_key > found_key:
+                    found, found_key = candidate, candidate_key
+        return found
+
+
+class CommandRouter:
+
+    def __init__(self):
+        self._automaton = AhoCorasick(key=lambda value: value[0])
+        self._exact = {}
+        self._parsers = {}
+
+    def add_keywords(self, command, keywords, priority, parse=None):
+        """訊息中包含任一關鍵字即命中；parse(text) 回傳參數，回傳 None 表示格式不符"""
+        for keyword in keywords:
+            self._automaton.add(normalize_text(keyword), (priority, command))
+        if parse is not None:
+            self._parsers[command] = parse
+
+    def add_exact(self, command, phrases, args=()):
+        """整則訊息 (正規化後) 完全相同才命中，優先於關鍵字比對"""
+        for phrase in phrases:
+            self._exact[normalize_text(phrase)] = Route(command, tuple(args))
+
+    def compile(self):
+        self._automaton.build()
+        return self
+
+    def route(self, text):
+        """回傳 Route(command, args)；無法辨識時回傳 None"""
+        normalized = normalize_text(text)
+        exact = self._exact.get(normalized)
+        if exact is not None:
+            return exact
+
+        best = self._automaton.best_match(normalized)
+        if best is None:
+            return None
+
+        command = best[1][1]
+        parse = self._parsers.get(command)
+        if parse is None:
+            return Route(command, ())
+        args = parse(text)
+        if args is None:
+            return None
+        return Route(command, tuple(args))
+
+
+_JUMP_PATTERN = re.compile(r'第?(\d+)章.*?第?(\d+)段')
+
+
+def parse_jump(text):
+    """「跳到第2章第3段」→ (2, 3)"""
+    match = _JUMP_PATTERN.search(text.translate(_FULLWIDTH_DIGITS))
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+SEARCH_KEYWORDS = ['搜尋', '搜索']
+
+
+def parse_search(text):
+    """「搜尋 according to」→ ('according to',)；沒有關鍵字時回傳空字串"""
+    for keyword in SEARCH_KEYWORDS:
+        position = text.find(keyword)
+        if position >= 0:
+            return (text[position + len(keyword):].strip(' :：'),)
+    return ('',)
+
+
+# (指令, 優先順序, 關鍵字)；數字越大越優先
+KEYWORD_COMMANDS = [
+    # 「繼續閱讀」包含「閱讀」，需高於開始閱讀
+    ('resume', 110, ['繼續閱讀']),
+    ('start_reading', 100, ['閱讀內容', '開始閱讀', '閱讀', 'read', 'start']),
+    ('chapter_carousel', 90, ['章節選擇', '選擇章節', 'chapter', 'chapters']),
+    ('bookmarks', 80, ['我的書籤', '書籤', 'bookmark', 'bookmarks']),
+    # 「學習進度」、「我的進度」包含「進度」，需高於上次進度
+    ('progress', 75, ['學習進度', '我的進度', 'progress']),
+    ('resume', 70, ['上次進度', '進度', 'continue', 'resume']),
+    ('review', 65, ['複習', 'review']),
+    ('quiz', 60, ['本章測驗', '測驗題', '測驗', 'quiz', 'test']),
+    ('analytics', 50, ['錯誤分析', '分析', 'analytics', 'analysis']),
+    ('status', 30, ['狀態', '資訊', 'status', 'info']),
+    ('help', 20, ['幫助', '說明', '指令', 'help', 'command']),
+]
+
+NEXT_PHRASES = ['n', 'next', '下', '下一段', '下一']
+PREV_PHRASES = ['b', 'back', 'prev', '上', '上一段', '上一']
+
+
+def build_default_router(max_chapter=7):
+    router = CommandRouter()
+    for command, priority, keywords in KEYWORD_COMMANDS:
+        router.add_keywords(command, keywords, priority)
+    router.add_keywords('jump', ['跳到', '跳轉'], 40, parse=parse_jump)
+    # 搜尋的內容可能包含其他指令的關鍵字，需最優先
+    router.add_keywords('search', SEARCH_KEYWORDS, 120, parse=parse_search)
+    for number in range(1, max_chapter + 1):
+        router.add_exact('chapter', [str(number), f'第{number}章'], args=(number,))
+    router.add_exact('navigate', NEXT_PHRASES, args=('next',))
+    router.add_exact('navigate', PREV_PHRASES, args=('prev',))
+    return router.compile()
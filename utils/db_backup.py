@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+db_backup.py - 以 SQLite backup API 線上備份資料庫
+每次只複製 pages 頁，之間暫停 sleep 秒讓寫入連線取得 I/O 與鎖；
+備份期間其他連線寫入時 SQLite 會從頭重新複製，重新開始超過 max_restarts 次就改為一次複製剩下的內容
+(WAL 模式下只是一個讀取交易，不會擋住寫入)。
+先寫到暫存檔並以 PRAGMA integrity_check 驗證，通過後才改名 (或以串流壓縮) 成正式的備份檔，
+不會留下不完整的備份；最後只保留最新的 keep 份
+"""
+import glob
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+
+
+class BackupError(Exception):
+    pass
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def verify_backup(path):
+    """回傳 PRAGMA integrity_check 的結果，'ok' 表示檔案完整"""
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    except sqlite3.Error as e:
+        return str(e)
+    try:
+        return '; '.join(row[0] for row in conn.execute("PRAGMA integrity_check"))
+    except sqlite3.Error as e:
+        return str(e)
+    finally:
+        conn.close()
+
+
+def rotate_backups(pattern, keep):
+    """依修改時間只保留最新的 keep 個符合 pattern 的備份，回傳刪除的檔案"""
+    if keep is None or keep <= 0:
+        return []
+    backups = sorted((path for path in glob.glob(pattern) if not path.endswith(('.tmp', '.part'))),
+                     key=os.path.getmtime, reverse=True)
+    for path in backups[keep:]:
+        os.remove(path)
+    return backups[keep:]
+
+
+def online_backup(source_path, target_path, pages=256, sleep=0.01, max_restarts=3,
+                  compress=False, verify=True, chunk_size=1048576):
+    """備份 source_path 到 target_path (compress 時為 gzip 檔)，回傳備份統計"""
+    temp_path = f"{target_path}.tmp"
+    started = time.perf_counter()
+    stats = {'pages': 0, 'steps': 0, 'restarts': 0, 'sleep_seconds': 0.0}
+    last_remaining = [None]
+
+    def progress(status, remaining, total):
+        stats['pages'] = total
+        stats['steps'] += 1
+        if last_remaining[0] is not None and remaining >= last_remaining[0]:
+            stats['restarts'] += 1
+            if stats['restarts'] > max_restarts:
+                raise _TooManyRestarts()
+        last_remaining[0] = remaining
+        if remaining and sleep:
+            time.sleep(sleep)
+            stats['sleep_seconds'] += sleep
+
+    source = sqlite3.connect(source_path)
+    try:
+        dest = sqlite3.connect(temp_path)
+        try:
+            try:
+                source.backup(dest, pages=pages, progress=progress)
+            except _TooManyRestarts:
+                source.backup(dest, pages=-1)
+                stats['steps'] += 1
+            # 備份檔不需要 WAL，改回單一檔案，驗證與搬移時不會產生 -wal/-shm
+            dest.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            dest.close()
+    except sqlite3.Error as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise BackupError(f"backup failed: {e}")
+    finally:
+        source.close()
+    stats['copy_seconds'] = time.perf_counter() - started
+    stats['bytes'] = os.path.getsize(temp_path)
+
+    if verify:
+        result = verify_backup(temp_path)
+        stats['integrity'] = result
+        if result != 'ok':
+            os.remove(temp_path)
+            raise BackupError(f"integrity check failed: {result}")
+
+    if compress:
+        with open(temp_path, 'rb') as raw, gzip.open(f"{target_path}.part", 'wb', compresslevel=6) as packed:
+            shutil.copyfileobj(raw, packed, chunk_size)
+        os.replace(f"{target_path}.part", target_path)
+        os.remove(temp_path)
+    else:
+        os.replace(temp_path, target_path)
+    stats['path'] = target_path
+    stats['output_bytes'] = os.path.getsize(target_path)
+    stats['seconds'] = time.perf_counter() - started
+    stats['mb_per_second'] = round(stats['bytes'] / 1048576 / stats['seconds'], 1) if stats['seconds'] else 0.0
+    return stats
+
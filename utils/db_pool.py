@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+db_pool.py - SQLite 連線池
+連線以 WAL 模式開啟並套用調校過的 PRAGMA，讀取與寫入使用不同的連線池；
+只有實際發生寫入時才 commit，並在取出閒置過久的連線時檢查連線狀態；
+cooperative 模式 (gevent) 下寫入連線取出時即以 BEGIN IMMEDIATE 取得寫入鎖，
+等待其他行程釋放鎖時以 time.sleep 重試，不在 SQLite 內部忙碌等待而卡住整個 worker
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,           # 約 16MB
+    'mmap_size': 134217728,         # 128MB
+    'temp_store': 'MEMORY',
+    'busy_timeout': 20000,
+}
+
+# cooperative 模式下 SQLite 內部的等待上限 (毫秒)，較長的等待改由 _begin_immediate 重試
+COOPERATIVE_BUSY_TIMEOUT = 50
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+class _ConnectionPool:
+    """單一類型 (讀取或寫入) 的連線池"""
+
+    def __init__(self, factory, size, checkout_timeout, health_check_after):
+        self.factory = factory
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_after = health_check_after
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.in_use = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_ms = 0.0
+        self.replaced = 0
+
+    def acquire(self):
+        try:
+            conn, idle_since = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if self.created < self.size:
+                    self.created += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn, idle_since = self.factory(), time.monotonic()
+                except Exception:
+                    with self._lock:
+                        self.created -= 1
+                    raise
+            else:
+                started = time.monotonic()
+                try:
+                    conn, idle_since = self._idle.get(timeout=self.checkout_timeout)
+                except queue.Empty:
+                    raise PoolTimeoutError("no database connection available")
+                finally:
+                    with self._lock:
+                        self.waits += 1
+                        self.wait_ms += (time.monotonic() - started) * 1000
+
+        if time.monotonic() - idle_since > self.health_check_after:
+            conn = self._check(conn)
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+        return conn
+
+    def _check(self, conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return conn
+        except sqlite3.Error:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            with self._lock:
+                self.replaced += 1
+            return self.factory()
+
+    def release(self, conn, broken=False):
+        with self._lock:
+            self.in_use -= 1
+        if broken:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            with self._lock:
+                self.created -= 1
+            return
+        self._idle.put((conn, time.monotonic()))
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self.created -= 1
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "created": self.created,
+            "in_use": self.in_use,
+            "idle": self._idle.qsize(),
+            "checkouts": self.checkouts,
+            "waits": self.waits,
+            "wait_ms": round(self.wait_ms, 2),
+            "replaced": self.replaced,
+        }
+
+
+class SQLitePool:
+
+    def __init__(self, database, write_size=4, read_size=8, timeout=20.0,
+                 checkout_timeout=30.0, health_check_after=60.0, pragmas=None,
+                 cooperative=False, auto_vacuum='INCREMENTAL'):
+        self.database = database
+        # 只對新建立的資料庫有效 (必須在建立第一個表格與切換 WAL 之前設定)；
+        # INCREMENTAL 讓刪除後的空頁可以用 PRAGMA incremental_vacuum 分段歸還，不需要整個 VACUUM
+        self.auto_vacuum = auto_vacuum
+        self.cooperative = cooperative
+        self.write_size = write_size
+        self.read_size = read_size
+        self.timeout = timeout
+        self.checkout_timeout = checkout_timeout
+        self.health_check_after = health_check_after
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._pools = {}
+        self.commits = 0
+        self.rollbacks = 0
+        self.lock_waits = 0
+        self._wal_enabled = False
+
+    def _connect(self, readonly):
+        conn = sqlite3.connect(self.database, timeout=self.timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        if not self._wal_enabled:
+            if self.auto_vacuum:
+                conn.execute(f"PRAGMA auto_vacuum={self.auto_vacuum}")
+            # journal_mode 會寫入資料庫檔案，只需設定一次
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._wal_enabled = True
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        if self.cooperative:
+            conn.execute(f"PRAGMA busy_timeout={COOPERATIVE_BUSY_TIMEOUT}")
+        if readonly:
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def _pool(self, readonly):
+        # 連線不可跨 fork 共用，每個 worker 行程建立自己的連線池
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pools = {
+                        False: _ConnectionPool(lambda: self._connect(False), self.write_size,
+                                               self.checkout_timeout, self.health_check_after),
+                        True: _ConnectionPool(lambda: self._connect(True), self.read_size,
+                                              self.checkout_timeout, self.health_check_after),
+                    }
+                    self.commits = 0
+                    self.rollbacks = 0
+                    self.lock_waits = 0
+                    self._pid = os.getpid()
+        return self._pools[readonly]
+
+    @contextmanager
+    def connection(self, readonly=False):
+        pool = self._pool(readonly)
+        conn = pool.acquire()
+        broken = False
+        try:
+            if self.cooperative and not readonly:
+                self._begin_immediate(conn)
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+                self.commits += 1
+        except Exception:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+                    self.rollbacks += 1
+            except sqlite3.Error:
+                broken = True
+            raise
+        finally:
+            pool.release(conn, broken=broken)
+
+    def _begin_immediate(self, conn):
+        deadline = time.monotonic() + self.timeout
+        delay = 0.001
+        while True:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                return
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e) or time.monotonic() >= deadline:
+                    raise
+            self.lock_waits += 1
+            # gevent 替換後的 time.sleep 會讓出執行權給其他協程
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+    def close(self):
+        if self._pid == os.getpid():
+            for pool in self._pools.values():
+                pool.close()
+
+    def stats(self):
+        if self._pid != os.getpid():
+            return {"write": {}, "read": {}, "commits": 0, "rollbacks": 0, "lock_waits": 0}
+        return {
+            "write": self._pools[False].stats(),
+            "read": self._pools[True].stats(),
+            "commits": self.commits,
+            "rollbacks": self.rollbacks,
+            "lock_waits": self.lock_waits,
+        }
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+dedup.py - 重複操作過濾
+以 (使用者, 操作內容) 為鍵，在冷卻時間內重複的 postback 直接忽略。
+memory: 行程內 LRU + TTL；shared: 在 fork 前建立的共享記憶體雜湊表，
+讓 gunicorn preload_app 下的所有 worker 共用同一份紀錄
+"""
+import hashlib
+import mmap
+import multiprocessing
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+
+def _now():
+    # 共享表需要跨行程比較時間，使用 monotonic 時鐘 (同一台機器上一致)
+    return time.monotonic()
+
+
+class ActionDeduplicator:
+    """行程內的滑動視窗過濾器，O(1) 查詢且最多保存 max_entries 筆"""
+
+    def __init__(self, cooldown=2.0, max_entries=10000):
+        self.cooldown = cooldown
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_duplicate(self, user_id, action_data, now=None):
+        now = _now() if now is None else now
+        key = (user_id, action_data)
+        with self._lock:
+            last = self._entries.get(key)
+            if last is not None and now - last < self.cooldown:
+                return True
+            self._entries[key] = now
+            self._entries.move_to_end(key)
+            self._evict(now)
+            return False
+
+    def _evict(self, now):
+        entries = self._entries
+        while entries:
+            key, last = next(iter(entries.items()))
+            if now - last < self.cooldown and len(entries) <= self.max_entries:
+                break
+            entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedActionDeduplicator:
+    """固定大小的共享記憶體雜湊表 (buckets x ways)，每格保存 8 bytes 雜湊與 8 bytes 時間"""
+
+    SLOT = struct.Struct('Qd')
+
+    def __init__(self, cooldown=2.0, buckets=4096, ways=4):
+        self.cooldown = cooldown
+        self.buckets = buckets
+        self.ways = ways
+        self._table = mmap.mmap(-1, buckets * ways * self.SLOT.size)
+        self._lock = multiprocessing.Lock()
+
+    @staticmethod
+    def _hash(user_id, action_data):
+        digest = hashlib.blake2b(f"{user_id}\x00{action_data}".encode('utf-8'), digest_size=8).digest()
+        # 0 保留給空格
+        return int.from_bytes(digest, 'little') or 1
+
+    def is_duplicate(self, user_id, action_data, now=None):
+        now = _now() if now is None else now
+        key_hash = self._hash(user_id, action_data)
+        base = (key_hash % self.buckets) * self.ways * self.SLOT.size
+        slot_size = self.SLOT.size
+        with self._lock:
+            victim = base
+            victim_time = None
+            for offset in range(base, base + self.ways * slot_size, slot_size):
+                stored_hash, stored_time = self.SLOT.unpack_from(self._table, offset)
+                if stored_hash == key_hash:
+                    if now - stored_time < self.cooldown:
+                        return True
+                    victim = offset
+                    break
+                if victim_time is None or stored_time < victim_time:
+                    victim, victim_time = offset, stored_time
+            self.SLOT.pack_into(self._table, victim, key_hash, now)
+            return False
+
+    def __len__(self):
+        now = _now()
+        count = 0
+        for offset in range(0, len(self._table), self.SLOT.size):
+            stored_hash, stored_time = self.SLOT.unpack_from(self._table, offset)
+            if stored_hash and now - stored_time < self.cooldown:
+                count += 1
+        return count
+
+
+class ActionCounter:
+    """記錄每位使用者在時間視窗內的操作次數，用於新手提示"""
+
+    def __init__(self, window=3600, max_users=10000):
+        self.window = window
+        self.max_users = max_users
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, user_id, now=None):
+        now = _now() if now is None else now
+        with self._lock:
+            count, started = self._counts.pop(user_id, (0, now))
+            if now - started >= self.window:
+                count, started = 0, now
+            self._counts[user_id] = (count + 1, started)
+            if len(self._counts) > self.max_users:
+                self._counts.popitem(last=False)
+
+    def count(self, user_id, now=None):
+        now = _now() if now is None else now
+        with self._lock:
+            count, started = self._counts.get(user_id, (0, now))
+        return count if now - started < self.window else 0
+
+
+def create_deduplicator(backend='memory', cooldown=2.0, max_entries=10000):
+    if backend == 'shared':
+        return SharedActionDeduplicator(cooldown=cooldown, buckets=max(1, max_entries // 4))
+    return ActionDeduplicator(cooldown=cooldown, max_entries=max_entries)
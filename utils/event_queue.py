@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+event_queue.py - 行程內的 webhook 事件工作佇列
+/callback 驗證簽章後將事件放入有上限的佇列並立即回應 200，
+由背景執行緒依序處理；同一使用者的事件固定分配到同一個執行緒以保持順序
+"""
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+_STOP = object()
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class EventQueue:
+
+    def __init__(self, dispatch, key_func, workers=4, maxsize=1000, latency_window=1000):
+        self.dispatch = dispatch
+        self.key_func = key_func
+        self.workers = max(1, workers)
+        self.shard_size = max(1, maxsize // self.workers)
+        self.maxsize = self.shard_size * self.workers
+        self._lock = threading.Lock()
+        self._pid = None
+        self._shards = []
+        self._threads = []
+        self._latencies = deque(maxlen=latency_window)
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def _ensure_started(self):
+        # 執行緒不會跟著 fork 複製，每個 worker 行程需各自啟動
+        if self._pid == os.getpid():
+            return
+        self._shards = [queue.Queue(maxsize=self.shard_size) for _ in range(self.workers)]
+        self._threads = []
+        for index, shard in enumerate(self._shards):
+            thread = threading.Thread(target=self._worker, args=(shard,), name=f"event-worker-{index}")
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        self._pid = os.getpid()
+
+    def _shard_for(self, event):
+        return self._shards[hash(self.key_func(event)) % self.workers]
+
+    def submit(self, events, destination=None):
+        """將一次 webhook 的所有事件放入佇列；任一分片已滿時整批拒絕並拋出 QueueFullError"""
+        with self._lock:
+            self._ensure_started()
+            needed = {}
+            for event in events:
+                shard = self._shard_for(event)
+                needed[id(shard)] = needed.get(id(shard), 0) + 1
+                if shard.qsize() + needed[id(shard)] > self.shard_size:
+                    self.dropped += len(events)
+                    raise QueueFullError("event queue is full")
+            enqueued_at = time.monotonic()
+            for event in events:
+                self._shard_for(event).put_nowait((event, destination, enqueued_at))
+            self.submitted += len(events)
+
+    def _worker(self, shard):
+        while True:
+            item = shard.get()
+            try:
+                if item is _STOP:
+                    return
+                event, destination, enqueued_at = item
+                try:
+                    self.dispatch(event, destination)
+                except Exception as e:
+                    with self._lock:
+                        self.errors += 1
+                    print(f"Event worker error: {e}")
+                with self._lock:
+                    self.processed += 1
+                    self._latencies.append(time.monotonic() - enqueued_at)
+            finally:
+                shard.task_done()
+
+    def depth(self):
+        return sum(shard.qsize() for shard in self._shards) if self._pid == os.getpid() else 0
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+        stats = {
+            "workers": self.workers,
+            "capacity": self.maxsize,
+            "depth": self.depth(),
+            "submitted": self.submitted,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+        if latencies:
+            stats["latency_avg_ms"] = round(sum(latencies) / len(latencies) * 1000, 2)
+            stats["latency_p95_ms"] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2)
+            stats["latency_max_ms"] = round(latencies[-1] * 1000, 2)
+        return stats
+
+    def shutdown(self, timeout=10.0):
+        """處理完佇列中剩餘的事件後停止背景執行緒"""
+        if self._pid != os.getpid():
+            return
+        for shard in self._shards:
+            shard.put(_STOP)
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._pid = None
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+idempotency.py - 以 webhookEventId 過濾重複傳送的事件
+最近處理過的事件 ID 保存在行程內的集合中 (精確比對)，
+較舊的 ID 則寫入共享記憶體中的輪替式 Bloom filter，讓重新傳送到其他 worker 的事件也能被過濾
+"""
+import hashlib
+import math
+import mmap
+import multiprocessing
+import struct
+import threading
+from collections import OrderedDict
+
+
+class RotatingBloomFilter:
+    """多代 Bloom filter，目前這一代寫滿 capacity 筆後清空最舊的一代重新使用"""
+
+    HEADER = struct.Struct('Q')
+    COUNT = struct.Struct('Q')
+
+    def __init__(self, capacity=100000, error_rate=0.001, generations=2):
+        self.capacity = capacity
+        self.generations = generations
+        bits = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_bytes = (bits + 7) // 8
+        self.num_bits = self.num_bytes * 8
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self._bits_offset = self.HEADER.size + self.COUNT.size * generations
+        # 匿名 mmap 在 fork 後仍由父子行程共用
+        self._table = mmap.mmap(-1, self._bits_offset + self.num_bytes * generations)
+        self._lock = multiprocessing.Lock()
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def _generation_offset(self, generation):
+        return self._bits_offset + generation * self.num_bytes
+
+    def _count_offset(self, generation):
+        return self.HEADER.size + generation * self.COUNT.size
+
+    def add(self, key):
+        positions = self._positions(key)
+        with self._lock:
+            current = self.HEADER.unpack_from(self._table, 0)[0]
+            count = self.COUNT.unpack_from(self._table, self._count_offset(current))[0]
+            if count >= self.capacity:
+                current = (current + 1) % self.generations
+                start = self._generation_offset(current)
+                self._table[start:start + self.num_bytes] = bytes(self.num_bytes)
+                self.HEADER.pack_into(self._table, 0, current)
+                count = 0
+            base = self._generation_offset(current)
+            for pos in positions:
+                index = base + (pos >> 3)
+                self._table[index] = self._table[index] | (1 << (pos & 7))
+            self.COUNT.pack_into(self._table, self._count_offset(current), count + 1)
+
+    def __contains__(self, key):
+        positions = self._positions(key)
+        with self._lock:
+            for generation in range(self.generations):
+                base = self._generation_offset(generation)
+                if all(self._table[base + (pos >> 3)] & (1 << (pos & 7)) for pos in positions):
+                    return True
+        return False
+
+
+class EventIdempotencyGuard:
+    """判斷事件是否已處理過，並記錄新事件"""
+
+    def __init__(self, capacity=100000, error_rate=0.001, recent_size=5000):
+        self.bloom = RotatingBloomFilter(capacity=capacity, error_rate=error_rate)
+        self.recent_size = recent_size
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+        self.skipped = 0
+
+    def check(self, event_id, is_redelivery=False):
+        """已處理過或正在處理回傳 True；否則記錄為處理中並回傳 False，
+        處理完成後需呼叫 mark_done，處理失敗時呼叫 release 讓重新傳送的事件可以再處理"""
+        if not event_id:
+            return False
+        with self._lock:
+            seen = event_id in self._recent
+            # Bloom filter 可能誤判，只用於 LINE 標示為重新傳送的事件
+            if not seen and is_redelivery:
+                seen = event_id in self.bloom
+            if seen:
+                self.skipped += 1
+                return True
+            self._recent[event_id] = True
+            if len(self._recent) > self.recent_size:
+                self._recent.popitem(last=False)
+        return False
+
+    def mark_done(self, event_id):
+        # Bloom filter 無法刪除，只在處理成功後寫入
+        if event_id:
+            self.bloom.add(event_id)
+
+    def release(self, event_id):
+        if event_id:
+            with self._lock:
+                self._recent.pop(event_id, None)
+
+    def check_and_mark(self, event_id, is_redelivery=False):
+        """已處理過回傳 True；否則記錄並回傳 False"""
+        if self.check(event_id, is_redelivery):
+            return True
+        self.mark_done(event_id)
+        return False
+
+    @staticmethod
+    def event_key(event):
+        """回傳 (webhookEventId, 是否為重新傳送)"""
+        event_id = getattr(event, 'webhook_event_id', None)
+        delivery_context = getattr(event, 'delivery_context', None)
+        return event_id, bool(getattr(delivery_context, 'is_redelivery', False))
+
+    def seen_event(self, event):
+        return self.check_and_mark(*self.event_key(event))
+
+    def stats(self):
+        return {"skipped": self.skipped, "recent": len(self._recent)}
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+job_queue.py - 以 SQLite jobs 表為佇列的背景工作
+工作寫入資料表後由各 worker 的背景執行緒領取 (UPDATE ... RETURNING，跨行程不會重複領取)，
+失敗時以指數退避重試，超過次數或無法重試的錯誤標記為 failed；
+執行結果保留在 jobs 表中，worker 中斷時逾時未完成的工作會重新排入佇列
+"""
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+Job = namedtuple('Job', ['id', 'kind', 'payload', 'attempts'])
+
+
+class PermanentJobError(Exception):
+    """重試也不會成功的錯誤 (例如使用者不存在)"""
+    pass
+
+
+class JobQueue:
+
+    def __init__(self, connection_factory, poll_interval=5.0, batch_window=0.5, max_attempts=5,
+                 base_delay=2.0, max_delay=300.0, lease=300.0, retention=7 * 86400, latency=None,
+                 concurrency=4, autostart=True):
+        self.connection_factory = connection_factory
+        # autostart: 加入工作時自動啟動背景執行緒；關閉時需自行呼叫 start() 或 run_pending()
+        self.autostart = autostart
+        self.poll_interval = poll_interval
+        # 被喚醒後稍等一下再領取，讓短時間內大量加入的工作合併成同一批
+        self.batch_window = batch_window
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease = lease
+        self.retention = retention
+        self.latency = latency
+        # 同一輪領取的工作 (或批次) 最多同時執行 concurrency 個
+        self.concurrency = concurrency
+        self._executor = None
+        self._executor_pid = None
+        self._handlers = {}
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self._last_purge = 0.0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def register(self, kind, func, batch_size=1):
+        """batch_size 為 1 時 func(payload)；大於 1 時 func([payload, ...]) 一次處理多個工作"""
+        self._handlers[kind] = (func, batch_size)
+
+    def enqueue(self, kind, payload, conn=None, delay=0.0):
+        """加入工作；指定 conn 時與呼叫端的資料庫操作在同一個交易中寫入"""
+        if kind not in self._handlers:
+            raise ValueError(f"unknown job kind: {kind}")
+        now = time.time()
+        row = (kind, payload, now + delay, now, now)
+        sql = "INSERT INTO jobs (kind, payload, run_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?)"
+        if conn is None:
+            with self.connection_factory() as conn:
+                conn.execute(sql, row)
+        else:
+            conn.execute(sql, row)
+        if self.autostart:
+            self.start()
+        self._wakeup.set()
+
+    def start(self):
+        # 背景執行緒不會跟著 fork 複製，每個 worker 各自啟動
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._thread = threading.Thread(target=self._run, name="job-queue", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            if self._wakeup.wait(self.poll_interval):
+                self._wakeup.clear()
+                time.sleep(self.batch_window)
+            try:
+                while self.run_pending():
+                    pass
+                self._purge()
+            except Exception as e:
+                print(f"Job queue error: {e}")
+
+    def run_pending(self, limit=500):
+        """領取並執行到期的工作，回傳處理的工作數"""
+        jobs = self._claim(limit)
+        if not jobs:
+            return 0
+        by_kind = {}
+        for job in jobs:
+            by_kind.setdefault(job.kind, []).append(job)
+        tasks = []
+        for kind, kind_jobs in by_kind.items():
+            func, batch_size = self._handlers.get(kind, (None, 1))
+            for start in range(0, len(kind_jobs), batch_size):
+                tasks.append((kind, func, kind_jobs[start:start + batch_size], batch_size))
+        if self.concurrency > 1 and len(tasks) > 1:
+            errors = list(self._pool().map(lambda task: self._execute(*task), tasks))
+        else:
+            errors = [self._execute(*task) for task in tasks]
+        outcomes = []
+        for (_, _, batch, _), error in zip(tasks, errors):
+            outcomes.extend((job, error) for job in batch)
+        self._finish(outcomes)
+        return len(jobs)
+
+    def _pool(self):
+        if self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="job")
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def _claim(self, limit):
+        now = time.time()
+        with self.connection_factory() as conn:
+            # 領取後超過 lease 仍未完成 (worker 中斷) 的工作重新排入佇列
+            conn.execute(
+                "UPDATE jobs SET status = 'pending' WHERE status = 'running' AND updated_at < ?",
+                (now - self.lease,)
+            )
+            rows = conn.execute('''
+                UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ?
+                WHERE id IN (
+                    SELECT id FROM jobs WHERE status = 'pending' AND run_at <= ?
+                    ORDER BY run_at, id LIMIT ?
+                )
+                RETURNING id, kind, payload, attempts
+            ''', (now, now, limit)).fetchall()
+        return sorted(Job(*row) for row in rows)
+
+    def _execute(self, kind, func, batch, batch_size):
+        if func is None:
+            return PermanentJobError(f"unknown job kind: {kind}")
+        started = time.perf_counter()
+        error = None
+        try:
+            if batch_size > 1:
+                func([job.payload for job in batch])
+            else:
+                func(batch[0].payload)
+        except Exception as e:
+            error = e
+        if self.latency is not None:
+            self.latency.observe(time.perf_counter() - started, error is not None, kind=kind)
+        return error
+
+    def retry_delay(self, attempts):
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _finish(self, outcomes):
+        now = time.time()
+        done, retry, failed = [], [], []
+        for job, error in outcomes:
+            if error is None:
+                done.append((now, job.id))
+            elif isinstance(error, PermanentJobError) or job.attempts >= self.max_attempts:
+                failed.append((str(error)[:500], now, job.id))
+            else:
+                retry.append((now + self.retry_delay(job.attempts), str(error)[:500], now, job.id))
+        with self.connection_factory() as conn:
+            conn.executemany(
+                "UPDATE jobs SET status = 'done', last_error = NULL, updated_at = ? WHERE id = ?", done
+            )
+            conn.executemany(
+                "UPDATE jobs SET status = 'pending', run_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                retry
+            )
+            conn.executemany(
+                "UPDATE jobs SET status = 'failed', last_error = ?, updated_at = ? WHERE id = ?", failed
+            )
+        self.completed += len(done)
+        self.retried += len(retry)
+        self.failed += len(failed)
+        for error, _, job_id in failed:
+            print(f"Job {job_id} failed: {error}")
+
+    def _purge(self):
+        # 完成的工作保留 retention 秒，失敗的工作保留供查詢
+        now = time.time()
+        if now - self._last_purge < 3600:
+            return
+        self._last_purge = now
+        with self.connection_factory() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE status = 'done' AND updated_at < ?", (now - self.retention,)
+            )
+
+    def stats(self):
+        stats = {"completed": self.completed, "retried": self.retried, "failed": self.failed}
+        try:
+            with self.connection_factory(readonly=True) as conn:
+                counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        except Exception as e:
+            counts = {"error": str(e)}
+        stats["by_status"] = counts
+        return stats
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+line_client.py - 共用的 LINE Messaging API 客戶端
+每個行程只建立一組 keep-alive 連線池，所有執行緒共用，
+避免每個事件重新建立 ApiClient 與 TLS 連線
+"""
+import contextvars
+import os
+import re
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import urllib3
+from linebot.v3.messaging import Configuration, ApiClient, MessagingApi, ApiException
+from linebot.v3.messaging.rest import RESTClientObject
+
+# 使用者、圖文選單等 ID 以 {id} 取代，避免每個 ID 產生一個時間序列
+_ID_SEGMENT = re.compile(r'/(?:U[0-9a-f]{32}|richmenu-[0-9a-zA-Z]+|[0-9]+)(?=/|$)')
+
+
+# ASGI 進入點在資料庫執行緒中執行處理函式時，以此取代實際的 API 呼叫
+_deferred_api = contextvars.ContextVar('line_deferred_api', default=None)
+
+
+def endpoint_label(url):
+    """'https://api.line.me/v2/bot/profile/U0123...' → '/v2/bot/profile/{id}'"""
+    return _ID_SEGMENT.sub('/{id}', urlsplit(url).path)
+
+
+class PooledRESTClient(RESTClientObject):
+    """固定大小連線池並套用預設逾時的 REST 客戶端"""
+
+    def __init__(self, configuration, pool_size, timeout, latency=None):
+        super().__init__(configuration, pools_size=2, maxsize=pool_size)
+        self.default_timeout = timeout
+        self.latency = latency
+
+    def request(self, method, url, query_params=None, headers=None,
+                body=None, post_params=None, _preload_content=True,
+                _request_timeout=None):
+        if self.latency is None:
+            return self._request(method, url, query_params, headers, body, post_params,
+                                 _preload_content, _request_timeout)
+        with self.latency.time(method=method, endpoint=endpoint_label(url)):
+            return self._request(method, url, query_params, headers, body, post_params,
+                                 _preload_content, _request_timeout)
+
+    def _request(self, method, url, query_params, headers, body, post_params,
+                 _preload_content, _request_timeout):
+        return super().request(
+            method, url, query_params=query_params, headers=headers,
+            body=body, post_params=post_params, _preload_content=_preload_content,
+            _request_timeout=_request_timeout or self.default_timeout
+        )
+
+
+class LineClient:
+    """行程內共用的 MessagingApi，fork 後於各 worker 中重新建立；
+    指定 latency (metrics.Histogram，標籤 method、endpoint) 時記錄每次 API 呼叫"""
+
+    def __init__(self, access_token, host='https://api.line.me', pool_size=10,
+                 connect_timeout=3.0, read_timeout=10.0, latency=None):
+        self.access_token = access_token
+        self.latency = latency
+        self.host = host.rstrip('/')
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._api_client = None
+        self._api = None
+
+    def _ensure(self):
+        # gunicorn preload_app 會在 fork 前匯入模組，連線不可跨行程共用
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            configuration = Configuration(access_token=self.access_token, host=self.host)
+            api_client = ApiClient(configuration)
+            api_client.rest_client = PooledRESTClient(
+                configuration, self.pool_size, self.timeout, latency=self.latency
+            )
+            self._api_client = api_client
+            self._api = MessagingApi(api_client)
+            self._pid = os.getpid()
+
+    @property
+    def api(self):
+        deferred = _deferred_api.get()
+        if deferred is not None:
+            return deferred
+        self._ensure()
+        return self._api
+
+    @contextmanager
+    def deferred(self, api):
+        """區塊內的 api 與 post() 改由 api (例如 async_line_client.LoopBoundLineApi) 處理"""
+        token = _deferred_api.set(api)
+        try:
+            yield api
+        finally:
+            _deferred_api.reset(token)
+
+    @property
+    def api_client(self):
+        self._ensure()
+        return self._api_client
+
+    def post(self, path, body=None, content_type='application/json', headers=None):
+        """以共用連線池直接送出已序列化的請求內容；headers 為額外的標頭 (例如 X-Line-Retry-Key)"""
+        deferred = _deferred_api.get()
+        if deferred is not None:
+            return deferred.post(path, body, content_type, headers)
+        if self.latency is None:
+            return self._post(path, body, content_type, headers)
+        with self.latency.time(method='POST', endpoint=endpoint_label(path)):
+            return self._post(path, body, content_type, headers)
+
+    def _post(self, path, body, content_type, extra_headers):
+        api_client = self.api_client
+        headers = dict(api_client.default_headers)
+        if body is not None:
+            headers['Content-Type'] = content_type
+        if extra_headers:
+            headers.update(extra_headers)
+        response = api_client.rest_client.pool_manager.request(
+            'POST', f"{self.host}{path}", body=body, headers=headers,
+            timeout=urllib3.Timeout(connect=self.timeout[0], read=self.timeout[1])
+        )
+        if not 200 <= response.status < 300:
+            raise ApiException(status=response.status, reason=response.reason)
+        return response
+
+    def stats(self):
+        if self._api_client is None or self._pid != os.getpid():
+            return {"pools": 0, "pool_size": self.pool_size}
+        pools = self._api_client.rest_client.pool_manager.pools
+        return {"pools": len(pools), "pool_size": self.pool_size}
+
+    def close(self):
+        with self._lock:
+            if self._api_client is not None and self._pid == os.getpid():
+                self._api_client.rest_client.pool_manager.clear()
+            self._api_client = None
+            self._api = None
+            self._pid = None
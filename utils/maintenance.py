@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+maintenance.py - 資料庫例行維護 (刪除過期資料、歸還空頁)
+過期資料依有索引的欄位分批刪除，每批一個短交易，批次大小依實際持有寫入鎖的時間自動調整，
+讓單批不超過 max_lock_ms；刪除後的空頁在一段時間沒有 webhook 事件時以
+PRAGMA incremental_vacuum 分段歸還 (需 auto_vacuum=INCREMENTAL)，不再執行鎖住整個資料庫的 VACUUM
+"""
+import os
+import threading
+import time
+from collections import namedtuple
+
+# 刪除 table 中 column < cutoff(now) 的資料；column 需有索引。
+# where: 額外的 SQL 條件；cascade: ((子表格, 欄位), ...)，刪除的資料列的 key 欄位值
+# 在子表格中對應的資料列於同一批次 (同一交易) 一起刪除
+CleanupRule = namedtuple('CleanupRule', ['name', 'table', 'column', 'cutoff', 'where', 'key', 'cascade'],
+                         defaults=(None, None, ()))
+
+
+class MaintenanceScheduler:
+
+    def __init__(self, connection_factory, rules, interval=300.0, batch_size=500, max_batch_size=5000,
+                 max_lock_ms=50.0, pause=0.05, vacuum_pages=200, max_vacuum_pages=2000, quiet_after=30.0,
+                 autostart=True):
+        self.connection_factory = connection_factory
+        self.rules = list(rules)
+        self.interval = interval
+        self.max_batch_size = max_batch_size
+        # 每批 (刪除或歸還空頁) 持有寫入鎖的目標上限，超過時縮小下一批
+        self.max_lock_ms = max_lock_ms
+        # 批次之間暫停，讓其他寫入取得鎖
+        self.pause = pause
+        # 超過 quiet_after 秒沒有 touch() 才歸還空頁
+        self.quiet_after = quiet_after
+        self.autostart = autostart
+        self._batch_sizes = {rule.name: batch_size for rule in self.rules}
+        self._vacuum_pages = vacuum_pages
+        self.max_vacuum_pages = max_vacuum_pages
+        self._last_activity = 0.0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self.runs = 0
+        self.deleted = {rule.name: 0 for rule in self.rules}
+        self.batches = 0
+        self.vacuumed_pages = 0
+        self.max_lock_observed_ms = 0.0
+        self.last_run = None
+
+    def touch(self):
+        """有請求進來時呼叫，用來判斷是否為離峰時段"""
+        self._last_activity = time.monotonic()
+        if self.autostart:
+            self.start()
+
+    def is_quiet(self):
+        return time.monotonic() - self._last_activity >= self.quiet_after
+
+    def start(self):
+        # 背景執行緒不會跟著 fork 複製，每個 worker 各自啟動
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._thread = threading.Thread(target=self._run, name="maintenance", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Maintenance error: {e}")
+
+    def _record_hold(self, elapsed_ms):
+        self.batches += 1
+        self.max_lock_observed_ms = max(self.max_lock_observed_ms, elapsed_ms)
+
+    def _adjust(self, size, elapsed_ms, limit):
+        if elapsed_ms > self.max_lock_ms and size > 1:
+            return max(1, size // 2)
+        if elapsed_ms < self.max_lock_ms / 4:
+            return min(limit, size * 2)
+        return size
+
+    def delete_expired(self, rule, now=None):
+        """分批刪除一條規則的過期資料，回傳刪除筆數"""
+        cutoff = rule.cutoff(time.time() if now is None else now)
+        condition = f"{rule.column} < ?" + (f" AND ({rule.where})" if rule.where else "")
+        sql = (f"DELETE FROM {rule.table} WHERE rowid IN "
+               f"(SELECT rowid FROM {rule.table} WHERE {condition} LIMIT ?)")
+        if rule.cascade:
+            sql += f" RETURNING {rule.key}"
+        total = 0
+        while True:
+            size = self._batch_sizes[rule.name]
+            started = time.perf_counter()
+            with self.connection_factory() as conn:
+                cursor = conn.execute(sql, (cutoff, size))
+                if rule.cascade:
+                    keys = [row[0] for row in cursor.fetchall()]
+                    deleted = len(keys)
+                    self._delete_children(conn, rule, keys)
+                else:
+                    deleted = cursor.rowcount
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._record_hold(elapsed_ms)
+            total += deleted
+            self.deleted[rule.name] += deleted
+            self._batch_sizes[rule.name] = self._adjust(size, elapsed_ms, self.max_batch_size)
+            if deleted < size:
+                return total
+            if self.pause:
+                time.sleep(self.pause)
+
+    @staticmethod
+    def _delete_children(conn, rule, keys):
+        if not keys:
+            return
+        placeholders = ",".join("?" * len(keys))
+        for table, column in rule.cascade:
+            conn.execute(f"DELETE FROM {table} WHERE {column} IN ({placeholders})", keys)
+
+    def vacuum(self, force=False):
+        """在離峰時段分段歸還空頁，回傳歸還的頁數；資料庫不是 auto_vacuum=INCREMENTAL 時不做任何事"""
+        released = 0
+        while force or self.is_quiet():
+            with self.connection_factory() as conn:
+                if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                    return released
+                free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if not free:
+                    return released
+                pages = min(free, self._vacuum_pages)
+                started = time.perf_counter()
+                # incremental_vacuum 需要執行到結束才會歸還全部 pages 頁，executescript 會執行到底
+                conn.executescript(f"PRAGMA incremental_vacuum({pages})")
+                elapsed_ms = (time.perf_counter() - started) * 1000
+            self._record_hold(elapsed_ms)
+            released += pages
+            self.vacuumed_pages += pages
+            self._vacuum_pages = self._adjust(self._vacuum_pages, elapsed_ms, self.max_vacuum_pages)
+            if self.pause:
+                time.sleep(self.pause)
+        return released
+
+    def run_once(self, now=None, force_vacuum=False):
+        """執行一輪維護，回傳 {規則名稱: 刪除筆數, 'vacuumed_pages': 歸還頁數}"""
+        report = {rule.name: self.delete_expired(rule, now) for rule in self.rules}
+        report['vacuumed_pages'] = self.vacuum(force=force_vacuum)
+        self.runs += 1
+        self.last_run = time.time()
+        return report
+
+    def stats(self):
+        stats = {
+            "runs": self.runs,
+            "last_run": self.last_run,
+            "deleted": dict(self.deleted),
+            "batches": self.batches,
+            "vacuumed_pages": self.vacuumed_pages,
+            "max_lock_ms": self.max_lock_ms,
+            "max_lock_observed_ms": round(self.max_lock_observed_ms, 2),
+            "batch_sizes": dict(self._batch_sizes),
+        }
+        try:
+            with self.connection_factory(readonly=True) as conn:
+                stats["auto_vacuum"] = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+                stats["freelist_pages"] = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        except Exception as e:
+            stats["error"] = str(e)
+        return stats
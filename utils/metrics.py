@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+metrics.py - 延遲直方圖與錯誤計數
+每個時間序列 (指標名稱 + 標籤) 佔用共享記憶體中的一格，在 fork 前建立，
+所有 gunicorn worker 直接累加到同一份數據，/metrics 由任一 worker 回應即為全體的合計；
+輸出格式為 Prometheus text exposition format
+"""
+import mmap
+import multiprocessing
+import struct
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_local = threading.local()
+
+
+def mark_error():
+    """將目前執行緒最內層的計時區段標記為失敗 (用於自行捕捉例外的處理函式)"""
+    stack = getattr(_local, 'spans', None)
+    if stack:
+        stack[-1].error = True
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class MetricsRegistry:
+    """共享記憶體中的時間序列表；每格依序保存鍵、次數、錯誤數、總時間 (微秒) 與各區間次數"""
+
+    HEADER = struct.Struct('QQ')
+    FIELD = struct.Struct('Q')
+    KEY_SIZE = 160
+
+    def __init__(self, max_series=256, buckets=DEFAULT_BUCKETS):
+        self.max_series = max_series
+        self.buckets = tuple(buckets)
+        self._values = struct.Struct(f'{3 + len(self.buckets)}Q')
+        self.slot_size = self.KEY_SIZE + self._values.size
+        self._table = mmap.mmap(-1, self.HEADER.size + max_series * self.slot_size)
+        self._lock = multiprocessing.Lock()
+        # 鍵 → 位移；各行程自行快取，位移在所有行程中相同
+        self._offsets = {}
+        self._families = {}
+
+    def histogram(self, name, help_text, label_names=()):
+        family = Histogram(self, name, help_text, tuple(label_names))
+        self._families[name] = family
+        return family
+
+    def _offset(self, key):
+        offset = self._offsets.get(key)
+        if offset is not None:
+            return offset
+        encoded = key.encode('utf-8')
+        if len(encoded) > self.KEY_SIZE:
+            raise ValueError(f"metric key too long: {key}")
+        padded = encoded.ljust(self.KEY_SIZE, b'\0')
+        with self._lock:
+            used, dropped = self.HEADER.unpack_from(self._table, 0)
+            # 其他 worker 可能已建立同一個時間序列
+            for index in range(used):
+                start = self.HEADER.size + index * self.slot_size
+                if self._table[start:start + self.KEY_SIZE] == padded:
+                    offset = start
+                    break
+            else:
+                if used >= self.max_series:
+                    self.HEADER.pack_into(self._table, 0, used, dropped + 1)
+                    return None
+                offset = self.HEADER.size + used * self.slot_size
+                self._table[offset:offset + self.KEY_SIZE] = padded
+                self.HEADER.pack_into(self._table, 0, used + 1, dropped)
+        self._offsets[key] = offset
+        return offset
+
+    def observe(self, key, seconds, error=False):
+        offset = self._offset(key)
+        if offset is None:
+            return
+        field = self.FIELD
+        base = offset + self.KEY_SIZE
+        bucket = bisect_left(self.buckets, seconds)
+        with self._lock:
+            table = self._table
+            field.pack_into(table, base, field.unpack_from(table, base)[0] + 1)
+            if error:
+                position = base + field.size
+                field.pack_into(table, position, field.unpack_from(table, position)[0] + 1)
+            position = base + 2 * field.size
+            field.pack_into(table, position, field.unpack_from(table, position)[0] + int(seconds * 1e6))
+            if bucket < len(self.buckets):
+                position = base + (3 + bucket) * field.size
+                field.pack_into(table, position, field.unpack_from(table, position)[0] + 1)
+
+    def collect(self):
+        """回傳 {鍵: (次數, 錯誤數, 總秒數, [各區間次數])}"""
+        with self._lock:
+            used, dropped = self.HEADER.unpack_from(self._table, 0)
+            snapshot = self._table[self.HEADER.size:self.HEADER.size + used * self.slot_size]
+        series = {}
+        for index in range(used):
+            start = index * self.slot_size
+            key = snapshot[start:start + self.KEY_SIZE].rstrip(b'\0').decode('utf-8')
+            values = self._values.unpack_from(snapshot, start + self.KEY_SIZE)
+            series[key] = (values[0], values[1], values[2] / 1e6, list(values[3:]))
+        return series, dropped
+
+    def render(self):
+        series, dropped = self.collect()
+        grouped = {}
+        for key, values in series.items():
+            name, _, labels = key.partition('|')
+            grouped.setdefault(name, []).append((labels, values))
+
+        lines = []
+        for name, family in self._families.items():
+            entries = sorted(grouped.get(name, []))
+            lines.append(f"# HELP {name} {family.help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, (count, _, total, buckets) in entries:
+                prefix = labels + ',' if labels else ''
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, buckets):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{{{prefix}le="{_format_number(bound)}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {count}')
+                selector = f'{{{labels}}}' if labels else ''
+                lines.append(f"{name}_sum{selector} {total:.6f}")
+                lines.append(f"{name}_count{selector} {count}")
+            lines.append(f"# HELP {family.errors_name} {family.help_text} (失敗次數)")
+            lines.append(f"# TYPE {family.errors_name} counter")
+            for labels, (_, errors, _, _) in entries:
+                selector = f'{{{labels}}}' if labels else ''
+                lines.append(f"{family.errors_name}{selector} {errors}")
+        lines.append("# HELP linebot_metrics_dropped_total 時間序列數量超過上限而未記錄的次數")
+        lines.append("# TYPE linebot_metrics_dropped_total counter")
+        lines.append(f"linebot_metrics_dropped_total {dropped}")
+        return "\n".join(lines) + "\n"
+
+
+class _Span:
+    __slots__ = ('registry', 'key', 'started', 'error')
+
+    def __init__(self, registry, key):
+        self.registry = registry
+        self.key = key
+        self.error = False
+
+    def __enter__(self):
+        stack = getattr(_local, 'spans', None)
+        if stack is None:
+            stack = _local.spans = []
+        stack.append(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        _local.spans.pop()
+        self.registry.observe(self.key, elapsed, error=self.error or exc_type is not None)
+        return False
+
+
+class Histogram:
+    """延遲直方圖，另外輸出 <名稱>_errors_total 計數"""
+
+    def __init__(self, registry, name, help_text, label_names):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        base = name[:-len('_duration_seconds')] if name.endswith('_duration_seconds') else name
+        self.errors_name = f"{base}_errors_total"
+
+    def key(self, **labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}")
+        rendered = ','.join(f'{label}="{_escape(labels[label])}"' for label in self.label_names)
+        return f"{self.name}|{rendered}"
+
+    def observe(self, seconds, error=False, **labels):
+        self.registry.observe(self.key(**labels), seconds, error)
+
+    def time(self, **labels):
+        """with histogram.time(...)：區塊拋出例外或呼叫 mark_error() 時計為失敗"""
+        return _Span(self.registry, self.key(**labels))
+
+    def timed(self, **labels):
+        key = self.key(**labels)
+        registry = self.registry
+
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with _Span(registry, key):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
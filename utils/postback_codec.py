@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+postback_codec.py - Postback 資料編碼
+新格式為「代碼:欄位:欄位」(例如 n:3:12)，解碼只需一次 split；
+舊的 action=...&chapter_id=... 格式仍可解碼，已建立的圖文選單不需重建
+"""
+from collections import namedtuple
+from urllib.parse import parse_qs
+
+Postback = namedtuple('Postback', ['action', 'args'])
+
+SEPARATOR = ':'
+
+
+def _legacy_int(params, name):
+    return int(params.get(name, [1])[0])
+
+
+def _legacy_str(params, name):
+    return params.get(name, [None])[0]
+
+
+# 動作名稱: (代碼, [(舊格式欄位, 轉換函式, 舊格式讀取函式)])
+ACTIONS = {
+    'read_content': ('r', []),
+    'show_chapter_menu': ('m', []),
+    'view_bookmarks': ('k', []),
+    'continue_reading': ('c', []),
+    'chapter_quiz': ('q', []),
+    'view_analytics': ('a', []),
+    'navigate': ('n', [('chapter_id', int, _legacy_int), ('section_id', int, _legacy_int)]),
+    'add_bookmark': ('b', [('chapter_id', int, _legacy_int), ('section_id', int, _legacy_int)]),
+    'submit_answer': ('s', [('chapter_id', int, _legacy_int), ('section_id', int, _legacy_int),
+                            ('answer', str, _legacy_str)]),
+    'select_chapter': ('h', [('chapter_id', int, _legacy_int)]),
+    'review': ('v', []),
+}
+
+# 代碼: (動作名稱, 轉換函式, 欄位數)
+_DECODERS = {
+    code: (action, [convert for _, convert, _ in fields], len(fields))
+    for action, (code, fields) in ACTIONS.items()
+}
+
+
+def encode_postback(action, *args):
+    """encode_postback('navigate', 3, 12) → 'n:3:12'"""
+    code, fields = ACTIONS[action]
+    if len(args) != len(fields):
+        raise ValueError(f"{action} expects {len(fields)} arguments, got {len(args)}")
+    if not args:
+        return code
+    return code + SEPARATOR + SEPARATOR.join(str(arg) for arg in args)
+
+
+def _decode_legacy(data):
+    params = parse_qs(data)
+    action = params.get('action', [None])[0]
+    spec = ACTIONS.get(action)
+    if spec is None:
+        return None
+    return Postback(action, tuple(read(params, name) for name, _, read in spec[1]))
+
+
+def decode_postback(data):
+    """回傳 Postback(action, args)；無法辨識的動作回傳 None，欄位格式錯誤拋出 ValueError"""
+    if data.isdigit():
+        # 早期版本直接以章節號碼作為 postback
+        return Postback('select_chapter', (int(data),))
+
+    code, _, rest = data.partition(SEPARATOR)
+    decoder = _DECODERS.get(code)
+    if decoder is None:
+        return _decode_legacy(data) if '=' in data else None
+
+    action, converters, count = decoder
+    if not count:
+        return Postback(action, ())
+    values = rest.split(SEPARATOR, count - 1)
+    if len(values) != count:
+        raise ValueError(f"malformed postback data: {data}")
+    return Postback(action, tuple(convert(value) for convert, value in zip(converters, values)))
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+push_engine.py - 批次、限速的 multicast 推播
+推播先規劃成批次寫入 push_batches 表 (同一批訊息相同、最多 500 位收件者)，
+再以 token bucket 限制每秒請求數送出，暫時性錯誤以指數退避重試。
+每批固定一個 X-Line-Retry-Key，送出成功後才標記 sent；中斷後重新執行時，
+LINE 會以 409 回應已接受過的 retry key，同一批不會重複推播
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from linebot.v3.messaging import ApiException
+
+MULTICAST_PATH = '/v2/bot/message/multicast'
+MULTICAST_MAX_RECIPIENTS = 500
+# LINE 只在 24 小時內辨識重複的 retry key
+RETRY_KEY_TTL = 24 * 3600
+
+
+class TokenBucket:
+    """每秒補充 rate 個 token，最多累積 burst 個；acquire() 在 token 不足時等待"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        # 預設只累積 0.1 秒的量，閒置後的第一秒也不會超過上限太多
+        self.capacity = float(burst) if burst else max(1.0, self.rate / 10)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+                self.waited += wait
+            time.sleep(wait)
+
+
+class PushEngine:
+
+    def __init__(self, connection_factory, line_client, rate=100.0, burst=None, concurrency=16,
+                 max_attempts=5, base_delay=1.0, max_delay=60.0):
+        self.connection_factory = connection_factory
+        self.line_client = line_client
+        # LINE multicast 的上限為每秒 200 個請求，預設保留一半給其他推播
+        self.bucket = TokenBucket(rate, burst)
+        # 同時送出的請求數；等待 API 回應時其他批次繼續送出
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def plan(self, run_key, groups):
+        """groups 為 [(messages, user_ids), ...]，messages 是可直接序列化的訊息 dict 列表；
+        同一個 run_key 已規劃過時直接回傳原本的 run id，不會重新排入收件者"""
+        now = time.time()
+        with self.connection_factory() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO push_runs (run_key, created_at) VALUES (?, ?)", (run_key, now)
+            )
+            if cursor.rowcount == 0:
+                return conn.execute("SELECT id FROM push_runs WHERE run_key = ?", (run_key,)).fetchone()[0]
+            run_id = cursor.lastrowid
+            batches = []
+            for messages, user_ids in groups:
+                payload = json.dumps(messages, ensure_ascii=False, separators=(',', ':'))
+                user_ids = list(dict.fromkeys(user_ids))
+                for start in range(0, len(user_ids), MULTICAST_MAX_RECIPIENTS):
+                    chunk = user_ids[start:start + MULTICAST_MAX_RECIPIENTS]
+                    batches.append((run_id, str(uuid.uuid4()), payload, json.dumps(chunk), len(chunk)))
+            conn.executemany(
+                "INSERT INTO push_batches (run_id, retry_key, messages, user_ids, recipients) VALUES (?, ?, ?, ?, ?)",
+                batches
+            )
+            conn.execute(
+                "UPDATE push_runs SET batches = ?, recipients = ? WHERE id = ?",
+                (len(batches), sum(batch[4] for batch in batches), run_id)
+            )
+        return run_id
+
+    def send(self, run_id):
+        """送出尚未完成的批次，回傳本次執行的統計"""
+        with self.connection_factory(readonly=True) as conn:
+            rows = conn.execute('''
+                SELECT id, retry_key, messages, user_ids, recipients, attempts, first_attempt_at
+                FROM push_batches WHERE run_id = ? AND status = 'pending' ORDER BY id
+            ''', (run_id,)).fetchall()
+        self._counts = {"sent": 0, "duplicates": 0, "failed": 0, "requests": 0, "retries": 0, "recipients": 0}
+        started = time.perf_counter()
+        if self.concurrency > 1 and len(rows) > 1:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="push") as pool:
+                list(pool.map(self._send_batch, rows))
+        else:
+            for row in rows:
+                self._send_batch(row)
+        elapsed = time.perf_counter() - started
+
+        with self.connection_factory() as conn:
+            conn.execute('''
+                UPDATE push_runs SET status = 'done', finished_at = ?
+                WHERE id = ? AND NOT EXISTS (
+                    SELECT 1 FROM push_batches WHERE run_id = ? AND status = 'pending'
+                )
+            ''', (time.time(), run_id, run_id))
+        report = dict(self._counts, run_id=run_id, batches=len(rows), elapsed=round(elapsed, 3))
+        report["requests_per_second"] = round(report["requests"] / elapsed, 1) if elapsed else 0.0
+        report["recipients_per_second"] = round(report["recipients"] / elapsed, 1) if elapsed else 0.0
+        report["rate_limited_seconds"] = round(self.bucket.waited, 3)
+        return report
+
+    def retry_delay(self, attempts):
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _count(self, **values):
+        with self._lock:
+            for name, value in values.items():
+                self._counts[name] += value
+
+    def _send_batch(self, row):
+        batch_id, retry_key, messages, user_ids, recipients, attempts, first_attempt_at = row
+        if first_attempt_at is not None and time.time() - first_attempt_at > RETRY_KEY_TTL:
+            # retry key 已失效，無法確認先前的請求是否送達，不冒重複推播的風險
+            self._finish(batch_id, 'failed', attempts, "retry key expired")
+            self._count(failed=1)
+            return
+        body = ('{"to":%s,"messages":%s}' % (user_ids, messages)).encode('utf-8')
+        headers = {'X-Line-Retry-Key': retry_key}
+        while True:
+            attempts += 1
+            self._record_attempt(batch_id, attempts)
+            self.bucket.acquire()
+            self._count(requests=1)
+            duplicate = False
+            try:
+                self.line_client.post(MULTICAST_PATH, body, headers=headers)
+                error = None
+            except ApiException as e:
+                # 409: 先前的執行已送出此批，只是來不及記錄
+                duplicate = e.status == 409
+                error = f"LINE API {e.status} {e.reason}"
+                retryable = e.status is None or e.status == 429 or e.status >= 500
+            except Exception as e:
+                error = str(e)
+                retryable = True
+            if error is None or duplicate:
+                self._finish(batch_id, 'sent', attempts)
+                if duplicate:
+                    self._count(duplicates=1)
+                else:
+                    self._count(sent=1, recipients=recipients)
+                return
+            if not retryable or attempts >= self.max_attempts:
+                print(f"Push batch {batch_id} failed: {error}")
+                self._finish(batch_id, 'failed', attempts, error)
+                self._count(failed=1)
+                return
+            self._count(retries=1)
+            time.sleep(self.retry_delay(attempts))
+
+    def _record_attempt(self, batch_id, attempts):
+        # 送出前先記錄，中斷後可判斷此批是否可能已送出
+        with self.connection_factory() as conn:
+            conn.execute(
+                "UPDATE push_batches SET attempts = ?, first_attempt_at = COALESCE(first_attempt_at, ?) WHERE id = ?",
+                (attempts, time.time(), batch_id)
+            )
+
+    def _finish(self, batch_id, status, attempts, error=None):
+        with self.connection_factory() as conn:
+            conn.execute(
+                "UPDATE push_batches SET status = ?, attempts = ?, last_error = ?, sent_at = ? WHERE id = ?",
+                (status, attempts, error[:500] if error else None,
+                 time.time() if status == 'sent' else None, batch_id)
+            )
+
+    def stats(self, run_id):
+        with self.connection_factory(readonly=True) as conn:
+            run = conn.execute(
+                "SELECT run_key, status, batches, recipients FROM push_runs WHERE id = ?", (run_id,)
+            ).fetchone()
+            counts = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM push_batches WHERE run_id = ? GROUP BY status", (run_id,)
+            ).fetchall())
+        if run is None:
+            return None
+        return {"run_key": run[0], "status": run[1], "batches": run[2],
+                "recipients": run[3], "by_status": counts}
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+render_cache.py - 導覽頁面回覆訊息快取
+每個 (章節, 段落) 的回覆內容對所有使用者都相同，
+因此只建立一次並以序列化後的 JSON 保存，回覆時只需補上 reply token
+"""
+import json
+import threading
+from linebot.v3.messaging import (
+    TextMessage, ImageMessage, PostbackAction, TemplateMessage,
+    ButtonsTemplate, QuickReply, QuickReplyItem
+)
+from utils.postback_codec import encode_postback
+
+CONTENT_MAX_LENGTH = 1000
+COMPLETE_KEY = 'complete'
+
+
+def _navigate_item(label, chapter_id, section_id):
+    return QuickReplyItem(
+        action=PostbackAction(
+            label=label,
+            data=encode_postback('navigate', chapter_id, section_id)
+        )
+    )
+
+
+def _bookmark_item(chapter_id, section_id):
+    return QuickReplyItem(
+        action=PostbackAction(
+            label="🔖 標記",
+            data=encode_postback('add_bookmark', chapter_id, section_id)
+        )
+    )
+
+
+def build_image_messages(chapter):
+    chapter_id = chapter.chapter_id
+    quick_items = []
+    if chapter.content_ids:
+        quick_items.append(_navigate_item("➡️ 下一段", chapter_id, chapter.content_ids[0]))
+    quick_items.append(_bookmark_item(chapter_id, 0))
+
+    progress_text = f"📖 {chapter.title}\n\n第 1/{chapter.total_display} 段 (章節圖片)\n\n💡 輸入 n=下一段"
+    return [
+        ImageMessage(
+            original_content_url=chapter.image_url,
+            preview_image_url=chapter.image_url
+        ),
+        TextMessage(text=progress_text, quick_reply=QuickReply(items=quick_items))
+    ]
+
+
+def build_complete_messages(chapter):
+    template = ButtonsTemplate(
+        title="🎉 章節完成",
+        text=f"完成 {chapter.title}\n\n已閱讀 {chapter.total_display} 段內容\n恭喜完成本章節！",
+        actions=[
+            PostbackAction(label="📊 查看分析", data=encode_postback('view_analytics')),
+            PostbackAction(label="📖 選擇章節", data=encode_postback('show_chapter_menu'))
+        ]
+    )
+    return [TemplateMessage(alt_text="章節完成", template=template)]
+
+
+def build_content_messages(chapter, section):
+    chapter_id = chapter.chapter_id
+    section_id = section['section_id']
+
+    content = section['content']
+    if len(content) > CONTENT_MAX_LENGTH:
+        content = content[:CONTENT_MAX_LENGTH] + "\n\n...(內容較長，請點擊下一段繼續)"
+
+    quick_items = []
+    prev_section_id, next_section_id = chapter.content_links(section_id)
+    if prev_section_id is not None:
+        quick_items.append(_navigate_item("⬅️ 上一段", chapter_id, prev_section_id))
+    if next_section_id is not None:
+        quick_items.append(_navigate_item("➡️ 下一段", chapter_id, next_section_id))
+    elif chapter.first_quiz_id is not None:
+        quick_items.append(_navigate_item("📝 開始測驗", chapter_id, chapter.first_quiz_id))
+    quick_items.append(_bookmark_item(chapter_id, section_id))
+
+    progress_text = f"📖 第 {chapter.display_position(section_id)}/{chapter.total_display} 段\n\n💡 輸入 n=下一段 b=上一段"
+    return [
+        TextMessage(text=content),
+        TextMessage(text=progress_text, quick_reply=QuickReply(items=quick_items))
+    ]
+
+
+def build_quiz_messages(chapter, section):
+    chapter_id = chapter.chapter_id
+    section_id = section['section_id']
+    quiz = section['content']
+
+    quick_items = []
+    for key, text in quiz['options'].items():
+        label = f"{key}. {text}"
+        if len(label) > 20:
+            label = label[:17] + "..."
+        quick_items.append(
+            QuickReplyItem(
+                action=PostbackAction(
+                    label=label,
+                    display_text=f"選 {key}",
+                    data=encode_postback('submit_answer', chapter_id, section_id, key)
+                )
+            )
+        )
+
+    quiz_text = f"📝 測驗 {chapter.quiz_position(section_id)}/{len(chapter.quiz_ids)}\n\n{quiz['question']}"
+    return [TextMessage(text=quiz_text, quick_reply=QuickReply(items=quick_items))]
+
+
+def build_section_messages(chapter, section_id):
+    """建立導覽到指定段落時的回覆訊息"""
+    if section_id == 0 and chapter.has_image:
+        return build_image_messages(chapter)
+    section = chapter.get_section(section_id)
+    if not section:
+        return build_complete_messages(chapter)
+    if section['type'] == 'content':
+        return build_content_messages(chapter, section)
+    if section['type'] == 'quiz':
+        return build_quiz_messages(chapter, section)
+    return []
+
+
+def serialize_messages(messages):
+    return json.dumps([m.to_dict() for m in messages[:5]], ensure_ascii=False, separators=(',', ':'))
+
+
+class RenderCache:
+    """以 (chapter_id, 段落鍵) 保存序列化後的回覆訊息"""
+
+    def __init__(self, book_index):
+        self.book_index = book_index
+        self._payloads = {}
+        self._lock = threading.Lock()
+
+    def _key(self, chapter, section_id):
+        if section_id == 0 and chapter.has_image:
+            return 0
+        if section_id in chapter.sections:
+            return section_id
+        # 所有不存在的段落都顯示同一個章節完成畫面
+        return COMPLETE_KEY
+
+    def get(self, chapter_id, section_id):
+        """取得序列化後的 messages 陣列，章節不存在時回傳 None"""
+        chapter = self.book_index.get_chapter(chapter_id)
+        if chapter is None:
+            return None
+        key = (chapter_id, self._key(chapter, section_id))
+        payload = self._payloads.get(key)
+        if payload is None:
+            payload = serialize_messages(build_section_messages(chapter, section_id))
+            with self._lock:
+                self._payloads.setdefault(key, payload)
+        return payload
+
+    def warm(self):
+        """預先建立所有段落的回覆內容"""
+        for chapter in self.book_index.chapter_list:
+            for section_id in [0] + list(chapter.sections) + [None]:
+                self.get(chapter.chapter_id, section_id)
+        return len(self._payloads)
+
+    def __len__(self):
+        return len(self._payloads)
+
+
+def build_reply_body(reply_token, payload):
+    """將 reply token 與預先序列化的 messages 組成回覆 API 的請求內容"""
+    return ('{"replyToken":%s,"messages":%s}' % (json.dumps(reply_token), payload)).encode('utf-8')
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+webhook_dispatch.py - 將 WebhookHandler 拆成「解析」與「分派」兩個步驟
+讓 /callback 可以先驗證簽章，再決定同步處理或交給背景佇列
+"""
+import inspect
+from linebot.v3 import WebhookHandler
+from linebot.v3.webhooks import MessageEvent
+
+
+class DispatchingWebhookHandler(WebhookHandler):
+
+    def __init__(self, channel_secret, idempotency_guard=None):
+        super().__init__(channel_secret)
+        self.idempotency_guard = idempotency_guard
+
+    def parse(self, body, signature):
+        """驗證簽章並解析事件，簽章錯誤時拋出 InvalidSignatureError"""
+        return self.parser.parse(body, signature, as_payload=True)
+
+    def find_handler(self, event):
+        func = None
+        if isinstance(event, MessageEvent):
+            func = self._handlers.get(event.__class__.__name__ + '_' + event.message.__class__.__name__)
+        if func is None:
+            func = self._handlers.get(event.__class__.__name__)
+        if func is None:
+            func = self._default
+        return func
+
+    def dispatch(self, event, destination=None):
+        guard = self.idempotency_guard
+        event_id = None
+        if guard is not None:
+            # 已處理過的事件 (LINE 重新傳送) 在任何資料庫或 API 操作前略過
+            event_id, is_redelivery = guard.event_key(event)
+            if guard.check(event_id, is_redelivery):
+                return
+        func = self.find_handler(event)
+        try:
+            if func is not None:
+                self._call(func, event, destination)
+        except Exception:
+            # 處理失敗時不記錄，LINE 重新傳送的事件才會再處理一次
+            if guard is not None:
+                guard.release(event_id)
+            raise
+        if guard is not None:
+            guard.mark_done(event_id)
+
+    @staticmethod
+    def _call(func, event, destination):
+        # 以 functools.wraps 包裝的處理函式 (例如計時) 依原始函式的參數決定呼叫方式
+        arg_spec = inspect.getfullargspec(inspect.unwrap(func))
+        if arg_spec.varargs is not None or len(arg_spec.args) == 2:
+            func(event, destination)
+        elif len(arg_spec.args) == 1:
+            func(event)
+        else:
+            func()
+
+    def handle(self, body, signature):
+        payload = self.parse(body, signature)
+        for event in payload.events:
+            self.dispatch(event, payload.destination)
+
+
+def event_user_key(event):
+    """取得事件來源的使用者/群組 ID，用於維持同一來源的處理順序"""
+    source = getattr(event, 'source', None)
+    if source is None:
+        return ''
+    for attr in ('user_id', 'group_id', 'room_id'):
+        value = getattr(source, attr, None)
+        if value:
+            return value
+    return ''
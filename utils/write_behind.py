@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+write_behind.py - 使用者活動時間的延遲批次寫入
+同一使用者在一個批次內的多次更新只保留最後一次，
+由背景執行緒定時 (或累積到 batch_size 時) 以單一交易寫入資料庫；
+各 worker 各自緩衝，寫入時只在時間較新時更新，較晚寫入的舊批次不會覆蓋較新的時間。
+閱讀位置會影響其他 worker 接著處理的請求，不經過緩衝直接寫入
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+
+class UserWriteBuffer:
+
+    def __init__(self, connection_factory, interval=1.0, batch_size=100):
+        self.connection_factory = connection_factory
+        self.interval = interval
+        self.batch_size = batch_size
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+        self._thread = None
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failures = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def _ensure_started(self):
+        # 背景執行緒不會跟著 fork 複製，每個 worker 各自啟動
+        if self._pid == os.getpid():
+            return
+        self._pending = {}
+        self._thread = threading.Thread(target=self._run, name="user-write-buffer")
+        self._thread.daemon = True
+        self._thread.start()
+        self._pid = os.getpid()
+
+    def touch(self, user_id):
+        """記錄使用者最後活動時間 (格式與 SQLite CURRENT_TIMESTAMP 相同)"""
+        now = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock:
+            self._ensure_started()
+            self._pending[user_id] = now
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def set_position(self, user_id, chapter_id, section_id):
+        with self.connection_factory() as conn:
+            conn.execute(
+                "UPDATE users SET current_chapter_id = ?, current_section_id = ? WHERE line_user_id = ?",
+                (chapter_id, section_id, user_id)
+            )
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Write buffer flush error: {e}")
+
+    def flush(self):
+        """將目前累積的更新以單一交易寫入，回傳寫入的使用者數"""
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending
+                self._pending = {}
+            if not batch:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                with self.connection_factory() as conn:
+                    # 其他 worker 可能已寫入較新的時間
+                    conn.executemany(
+                        "UPDATE users SET last_active = ? "
+                        "WHERE line_user_id = ? AND (last_active IS NULL OR last_active < ?)",
+                        [(last_active, user_id, last_active) for user_id, last_active in batch.items()]
+                    )
+            except Exception:
+                self.failures += 1
+                self._requeue(batch)
+                raise
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.flushes += 1
+            self.flushed_rows += len(batch)
+            self.last_batch_size = len(batch)
+            self.max_batch_size = max(self.max_batch_size, len(batch))
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self.total_flush_ms += elapsed_ms
+            return len(batch)
+
+    def _requeue(self, batch):
+        # 寫入失敗時放回緩衝區，較新的更新優先
+        with self._lock:
+            for user_id, last_active in batch.items():
+                self._pending.setdefault(user_id, last_active)
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "failures": self.failures,
+            "last_batch_size": self.last_batch_size,
+            "max_batch_size": self.max_batch_size,
+            "avg_batch_size": round(self.flushed_rows / self.flushes, 2) if self.flushes else 0,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "avg_flush_ms": round(self.total_flush_ms / self.flushes, 2) if self.flushes else 0,
+        }
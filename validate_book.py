@@ -183,6 +183,9 @@ class BookValidator:
             self.errors.append(f"Error reading file: {e}")
             return False
         
+        return self.validate_data(data)
+    
+    def validate_data(self, data):
         if not self.validate_book_structure(data):
             return False
         